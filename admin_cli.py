@@ -0,0 +1,360 @@
+"""Headless admin commands for scripts and cron jobs.
+
+Usage: python -m admin_cli <command> [options]; see --help. Reuses the
+Database and shard routing without importing tkinter, so it starts fast
+and runs where there is no display. Results stream to stdout as CSV.
+"""
+import argparse
+import csv
+import sys
+from datetime import date, timedelta
+from database import Database, BOOKING_LISTS, count_bookings_by_day
+from sharding import ShardRouter
+from utils.backup import open_snapshot
+from utils.constants import ASSIGN_RESULT, OTHER_CITY, STORAGE_PRAGMAS, TUNER
+from utils.messages import REJECT_REASONS
+from utils.timestamps import to_pickup_ts, day_bounds, from_pickup_ts, prefix_range
+
+# Rows fetched per query when listing, and ids or rows per transaction
+BATCH_SIZE = 1000
+
+# Column headings of every booking list, for --sort and --filter
+HEADINGS = sorted({heading for spec in BOOKING_LISTS.values() for heading in spec['columns']})
+
+
+def read_ids(values):
+    """Booking ids from the arguments, or from stdin when given '-'"""
+    if values == ['-']:
+        values = sys.stdin.read().split()
+    return [int(value) for value in values]
+
+
+def chunks(items, size=BATCH_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def list_filter(text):
+    """argparse type for --filter HEADING=PREFIX; returns (heading, prefix)"""
+    heading, equals, value = text.partition('=')
+    if not equals or not value:
+        raise argparse.ArgumentTypeError(f"expected HEADING=PREFIX, got {text!r}")
+    if heading not in HEADINGS:
+        raise argparse.ArgumentTypeError(f"unknown heading {heading!r} (choose from {', '.join(HEADINGS)})")
+    if heading == 'ID' and not value.isdigit():
+        raise argparse.ArgumentTypeError(f"ID must be a number, got {value!r}")
+    return heading, value
+
+
+def print_results(updated, rejected):
+    """One 'id,result' line per booking; returns the exit status"""
+    writer = csv.writer(sys.stdout)
+    for booking_id in updated:
+        writer.writerow([booking_id, ASSIGN_RESULT['OK']])
+    for booking_id, reason in rejected.items():
+        writer.writerow([booking_id, REJECT_REASONS.get(reason, reason)])
+    print(f"{len(updated)} updated, {len(rejected)} skipped", file=sys.stderr)
+    return 1 if rejected else 0
+
+
+def cmd_list(shards, args):
+    filters = dict(args.filter)
+    writer = csv.writer(sys.stdout)
+    columns = list(BOOKING_LISTS[args.view]['columns'])
+    writer.writerow(columns + (['City'] if shards.enabled else []))
+    offset, written = 0, 0
+    while args.limit is None or written < args.limit:
+        size = BATCH_SIZE if args.limit is None else min(BATCH_SIZE, args.limit - written)
+        if shards.enabled:
+            rows = shards.list_bookings(args.view, args.owner, args.sort, args.desc, filters,
+                                        size, offset, [args.city] if args.city else None)
+        else:
+            rows = shards.directory.list_bookings(args.view, args.owner, args.sort, args.desc,
+                                                  filters, size, offset)
+        # Extra columns are for the dashboards only
+        width = len(columns) + (1 if shards.enabled else 0)
+        writer.writerows(row[:width] for row in rows)
+        sys.stdout.flush()
+        written += len(rows)
+        offset += len(rows)
+        if len(rows) < size:
+            break
+    return 0
+
+
+def cmd_assign(shards, args):
+    driver = shards.directory.get_user(username=args.driver)
+    if not driver or driver[3] != 'Driver':
+        print(f"No driver named {args.driver}", file=sys.stderr)
+        return 2
+    updated, rejected = [], {}
+    for db, booking_ids in shards.group_by_shard(read_ids(args.ids)).items():
+        if db is not shards.directory:
+            db.copy_user(driver)
+        for batch in chunks(booking_ids):
+            batch_updated, batch_rejected = db.assign_drivers(batch, driver[0])
+            updated += batch_updated
+            rejected.update(batch_rejected)
+    return print_results(updated, rejected)
+
+
+def cmd_cancel(shards, args):
+    updated, rejected = [], {}
+    for db, booking_ids in shards.group_by_shard(read_ids(args.ids)).items():
+        for batch in chunks(booking_ids):
+            batch_updated, batch_rejected = db.cancel_bookings(batch)
+            updated += batch_updated
+            rejected.update(batch_rejected)
+    return print_results(updated, rejected)
+
+
+def cmd_register_driver(shards, args):
+    city = args.city if args.city != OTHER_CITY else None
+    if not shards.directory.create_driver(args.username, args.password, args.name, args.phone,
+                                          args.vehicle, args.license, city):
+        print(f"Username {args.username} already exists", file=sys.stderr)
+        return 1
+    user = shards.directory.get_user(username=args.username)
+    if city:
+        shards.for_user(user[0])
+    print(user[0])
+    return 0
+
+
+def cmd_import(shards, args):
+    """Bookings from CSV with a header of customer,pickup,dropoff,date,time[,city]"""
+    source = sys.stdin if args.file == '-' else open(args.file, newline='')
+    customers = {}
+    pending = {}
+    imported, errors = 0, 0
+    with source:
+        for line_no, row in enumerate(csv.DictReader(source), start=2):
+            username = row['customer']
+            if username not in customers:
+                user = shards.directory.get_user(username=username)
+                customers[username] = user[0] if user else None
+            customer_id = customers[username]
+            try:
+                to_pickup_ts(row['date'], row['time'])
+            except ValueError:
+                customer_id = None
+            if customer_id is None:
+                print(f"line {line_no}: unknown customer or bad date/time, skipped", file=sys.stderr)
+                errors += 1
+                continue
+            db = shards.for_user(customer_id, row.get('city')) if shards.enabled else shards.directory
+            batch = pending.setdefault(db, [])
+            batch.append((customer_id, row['pickup'], row['dropoff'], row['date'], row['time']))
+            if len(batch) >= BATCH_SIZE:
+                imported += db.import_bookings(batch)
+                batch.clear()
+    for db, batch in pending.items():
+        if batch:
+            imported += db.import_bookings(batch)
+    print(f"{imported} imported, {errors} skipped", file=sys.stderr)
+    return 1 if errors else 0
+
+
+def cmd_report(shards, args):
+    """Bookings per day and status in a date range, per city when sharded.
+    
+    Read from each database's reporting snapshot, so the report may be up
+    to BACKUP['SNAPSHOT_INTERVAL'] seconds behind.
+    """
+    start_ts = day_bounds(date.fromisoformat(args.start))[0]
+    end_ts = day_bounds(date.fromisoformat(args.end))[1]
+    writer = csv.writer(sys.stdout)
+    writer.writerow(['City', 'Date', 'Status', 'Bookings'])
+    cities = [args.city] if args.city else shards.cities
+    for city in cities:
+        snapshot = open_snapshot(shards.for_city(city).db_name)
+        try:
+            for row in count_bookings_by_day(snapshot.cursor(), start_ts, end_ts):
+                writer.writerow([city, *row])
+        finally:
+            snapshot.close()
+        sys.stdout.flush()
+    return 0
+
+
+def cmd_import_travel_times(shards, args):
+    """Travel times from CSV with a header of from,to,km,minutes"""
+    source = sys.stdin if args.file == '-' else open(args.file, newline='')
+    with source:
+        rows = [(row['from'], row['to'], float(row['km']), float(row['minutes']))
+                for row in csv.DictReader(source)]
+    for db in shards.all():
+        db.set_travel_times(rows)
+    print(f"{len(rows)} travel time(s) stored", file=sys.stderr)
+    return 0
+
+
+def cmd_plan(shards, args):
+    """Proposed trip chains per driver for each day in a range"""
+    from models.route_planner import load_day, plan_days, TravelTable
+    start, end = date.fromisoformat(args.start), date.fromisoformat(args.end)
+    days = [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+    writer = csv.writer(sys.stdout)
+    writer.writerow(['City', 'Date', 'Driver', 'Order', 'ID', 'Time', 'Pickup', 'Dropoff', 'Empty km', 'Trip'])
+    cities = [args.city] if args.city else shards.cities
+    for city in cities:
+        db = shards.for_city(city)
+        times = db.get_travel_times()
+        table = TravelTable(times)
+        plans = plan_days([load_day(db, day) for day in days], times, args.workers)
+        for day, chains in zip(days, plans):
+            for driver_id, chain in sorted(chains.items()):
+                for order, trip in enumerate(chain, start=1):
+                    empty = table.leg(chain[order - 2].dropoff, trip.pickup)[0] if order > 1 else 0.0
+                    writer.writerow([city, day.isoformat(), driver_id, order, trip.booking_id,
+                                     from_pickup_ts(trip.pickup_ts)[1], trip.pickup, trip.dropoff,
+                                     f"{empty:.1f}", 'Proposed' if trip.driver_id is None else 'Assigned'])
+            sys.stdout.flush()
+    return 0
+
+
+def cmd_drivers_report(shards, args):
+    """Monthly trips, completion and cancellation rates and busiest routes per driver"""
+    from models.reports import ReportEngine
+    for month in (args.start, args.end):
+        if len(month) != 7 or not prefix_range(month):
+            print(f"Bad month {month}, expected YYYY-MM", file=sys.stderr)
+            return 2
+    names = {user_id: name for user_id, name in shards.directory.get_all_drivers()}
+    engine = ReportEngine([db.db_name for db in shards.all()])
+    writer = csv.writer(sys.stdout)
+    writer.writerow(['Month', 'Driver', 'Trips', 'Completed', 'Cancelled', 'Completion %',
+                     'Cancellation %', 'Busiest routes'])
+    for month, driver_id, trips, completed, cancelled, completion, cancellation, routes in \
+            engine.driver_report(args.start, args.end, args.workers):
+        driver = 'All bookings' if driver_id is None else names.get(driver_id, driver_id)
+        writer.writerow([month, driver, trips, completed, cancelled, f"{completion * 100:.1f}",
+                         f"{cancellation * 100:.1f}",
+                         '; '.join(f"{pickup} -> {dropoff} ({count})" for (pickup, dropoff), count in routes)])
+    return 0
+
+
+def cmd_tune_storage(shards, args):
+    """Benchmark SQLite settings on copies of the main database, optionally keeping the best"""
+    from utils.storage_tuner import StorageTuner, candidates, mix_from_profile
+    db = shards.directory
+    mix = None
+    if args.profile:
+        mix = mix_from_profile(args.profile)
+        if not mix:
+            print(f"No dashboard database calls recorded in {args.profile}", file=sys.stderr)
+            return 2
+    tuner = StorageTuner(db, mix, args.operations, args.warmup)
+    if not tuner.workload.usable():
+        print("The database needs customers, drivers and bookings to replay against", file=sys.stderr)
+        return 2
+    writer = csv.writer(sys.stdout)
+    writer.writerow(list(STORAGE_PRAGMAS) + ['Ops/s', 'p50 ms', 'p95 ms'])
+    results = tuner.run(candidates())
+    for result in results:
+        writer.writerow([result[pragma] for pragma in STORAGE_PRAGMAS]
+                        + [f"{result['ops_per_sec']:.0f}", f"{result['p50_ms']:.3f}", f"{result['p95_ms']:.3f}"])
+    best = {pragma: results[0][pragma] for pragma in STORAGE_PRAGMAS}
+    if args.apply:
+        db.save_storage_settings(best)
+        db.rebuild_with_page_size(best['page_size'])
+        print(f"Saved {best}", file=sys.stderr)
+    else:
+        print(f"Best: {best}; rerun with --apply to keep it", file=sys.stderr)
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m admin_cli', description="Taxi booking admin commands")
+    parser.add_argument('--db', default='taxi_booking.db', help="main database file")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    parser_list = commands.add_parser('list', help="stream bookings as CSV")
+    parser_list.add_argument('--view', choices=list(BOOKING_LISTS), default='admin')
+    parser_list.add_argument('--owner', type=int, help="customer or driver id for those views")
+    parser_list.add_argument('--sort', default='Date', choices=HEADINGS, help="column heading to sort by")
+    parser_list.add_argument('--desc', action='store_true')
+    parser_list.add_argument('--filter', action='append', default=[], type=list_filter, metavar='HEADING=PREFIX')
+    parser_list.add_argument('--city')
+    parser_list.add_argument('--limit', type=int)
+    parser_list.set_defaults(func=cmd_list, check=lambda args: check_list_args(parser_list, args))
+
+    parser_assign = commands.add_parser('assign', help="assign a driver to bookings")
+    parser_assign.add_argument('--driver', required=True, help="driver username")
+    parser_assign.add_argument('ids', nargs='+', help="booking ids, or - to read them from stdin")
+    parser_assign.set_defaults(func=cmd_assign)
+
+    parser_cancel = commands.add_parser('cancel', help="cancel bookings")
+    parser_cancel.add_argument('ids', nargs='+', help="booking ids, or - to read them from stdin")
+    parser_cancel.set_defaults(func=cmd_cancel)
+
+    parser_driver = commands.add_parser('register-driver', help="create a driver account")
+    for option in ('username', 'password', 'name', 'phone', 'vehicle', 'license'):
+        parser_driver.add_argument(f'--{option}', required=True)
+    parser_driver.add_argument('--city', default=OTHER_CITY)
+    parser_driver.set_defaults(func=cmd_register_driver)
+
+    parser_import = commands.add_parser('import', help="import bookings from CSV")
+    parser_import.add_argument('file', help="CSV file, or - for stdin")
+    parser_import.set_defaults(func=cmd_import)
+
+    parser_report = commands.add_parser('report', help="bookings per day and status")
+    parser_report.add_argument('--from', dest='start', default=date.today().isoformat())
+    parser_report.add_argument('--to', dest='end', default=date.today().isoformat())
+    parser_report.add_argument('--city')
+    parser_report.set_defaults(func=cmd_report)
+    
+    parser_times = commands.add_parser('import-travel-times', help="load the travel time table from CSV")
+    parser_times.add_argument('file', help="CSV file, or - for stdin")
+    parser_times.set_defaults(func=cmd_import_travel_times)
+    
+    parser_plan = commands.add_parser('plan', help="propose trip chains per driver")
+    parser_plan.add_argument('--from', dest='start', default=date.today().isoformat())
+    parser_plan.add_argument('--to', dest='end', default=date.today().isoformat())
+    parser_plan.add_argument('--city')
+    parser_plan.add_argument('--workers', type=int, help="planner processes (default: one per CPU)")
+    parser_plan.set_defaults(func=cmd_plan)
+    
+    parser_drivers = commands.add_parser('drivers-report', help="monthly figures per driver")
+    parser_drivers.add_argument('--from', dest='start', default=date.today().strftime('%Y-%m'), metavar='YYYY-MM')
+    parser_drivers.add_argument('--to', dest='end', default=date.today().strftime('%Y-%m'), metavar='YYYY-MM')
+    parser_drivers.add_argument('--workers', type=int, help="report processes (default: one per CPU)")
+    parser_drivers.set_defaults(func=cmd_drivers_report)
+    
+    parser_tune = commands.add_parser('tune-storage', help="benchmark SQLite settings on copies of the database")
+    parser_tune.add_argument('--operations', type=int, default=TUNER['OPERATIONS'], help="timed calls per setting")
+    parser_tune.add_argument('--warmup', type=int, default=TUNER['WARMUP'], help="untimed calls first")
+    parser_tune.add_argument('--profile', help="UI profiler folded file to take the operation mix from")
+    parser_tune.add_argument('--apply', action='store_true',
+                             help="save the best settings (close the dashboards first)")
+    parser_tune.set_defaults(func=cmd_tune_storage)
+    return parser
+
+
+def check_list_args(parser, args):
+    """Reject --sort and --filter headings the chosen view does not show"""
+    columns = BOOKING_LISTS[args.view]['columns']
+    for heading in [args.sort] + [heading for heading, _ in args.filter]:
+        if heading not in columns:
+            parser.error(f"the {args.view} list has no {heading} column (choose from {', '.join(columns)})")
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if getattr(args, 'check', None):
+        args.check(args)
+    db = Database(args.db)
+    shards = ShardRouter(db)
+    try:
+        return args.func(shards, args)
+    except BrokenPipeError:
+        # Output piped into head and the like
+        return 0
+    finally:
+        shards.close()
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
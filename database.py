@@ -1,17 +1,257 @@
 import sqlite3
 import hashlib
+import logging
 import os
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+from models.availability import AvailabilityIndex
+from models.recurrence import RecurrenceRule
+from models.sessions import SessionCache, hash_token
+from models.shifts import ShiftCalendar
+from models.zone_counters import ZoneCounters
+from storage import Storage
+from utils.constants import (BOOKING_STATUS, ASSIGN_RESULT, RECURRENCE, BOOKING_EVENT, SESSIONS, SHIFTS,
+                             NOTIFY, NOTIFICATION_STATUS, STORAGE_PRAGMAS)
+from utils.timestamps import to_pickup_ts, prefix_range, day_bounds
 
-class Database:
-    """Database handler for taxi booking system"""
+logger = logging.getLogger(__name__)
+
+# Booking lists shown by the dashboards, keyed by Treeview heading. Only
+# these expressions can be sorted or filtered on, so headings never reach
+# the SQL text directly. Joins name tables as {schema}users so the same
+# lists can be read from an attached shard database (see sharding.py).
+BOOKING_LISTS = {
+    'admin': {
+        'columns': {
+            'ID': 'b.booking_id',
+            'Customer': 'c.name',
+            'Pickup': 'b.pickup_location',
+            'Dropoff': 'b.dropoff_location',
+            'Date': 'b.booking_date',
+            'Time': 'b.booking_time',
+            'Driver': "COALESCE(d.name, 'Not Assigned')",
+            'Status': 'b.status'
+        },
+        'extra': ['b.version', 'b.pickup_ts', 'b.overdue'],
+        'joins': '''JOIN {schema}users c ON b.customer_id = c.user_id
+                    LEFT JOIN {schema}users d ON b.driver_id = d.user_id''',
+        'owner': None
+    },
+    'customer': {
+        'columns': {
+            'ID': 'b.booking_id',
+            'Pickup': 'b.pickup_location',
+            'Dropoff': 'b.dropoff_location',
+            'Date': 'b.booking_date',
+            'Time': 'b.booking_time',
+            'Driver': "COALESCE(u.name, 'Not Assigned')",
+            'Status': 'b.status'
+        },
+        'extra': [],
+        'joins': 'LEFT JOIN {schema}users u ON b.driver_id = u.user_id',
+        'owner': 'b.customer_id'
+    },
+    'driver': {
+        'columns': {
+            'ID': 'b.booking_id',
+            'Customer': 'u.name',
+            'Phone': 'u.phone',
+            'Pickup': 'b.pickup_location',
+            'Dropoff': 'b.dropoff_location',
+            'Date': 'b.booking_date',
+            'Time': 'b.booking_time',
+            'Status': 'b.status'
+        },
+        'extra': [],
+        'joins': 'JOIN {schema}users u ON b.customer_id = u.user_id',
+        'owner': 'b.driver_id'
+    }
+}
+
+# Headings sorted by something other than their displayed column
+SORT_KEYS = {
+    'Date': ['b.pickup_ts']
+}
+
+# Status a booking is left in by each event; CREATED and ASSIGNED leave it open
+EVENT_STATUS = {
+    BOOKING_EVENT['CREATED']: BOOKING_STATUS['PENDING'],
+    BOOKING_EVENT['ASSIGNED']: BOOKING_STATUS['ASSIGNED'],
+    BOOKING_EVENT['COMPLETED']: BOOKING_STATUS['COMPLETED'],
+    BOOKING_EVENT['CANCELLED']: BOOKING_STATUS['CANCELLED'],
+    BOOKING_EVENT['DRIVER_CANCELLED']: BOOKING_STATUS['CANCELLED'],
+    BOOKING_EVENT['EXPIRED']: BOOKING_STATUS['CANCELLED']
+}
+OPEN_EVENTS = {BOOKING_EVENT['CREATED'], BOOKING_EVENT['ASSIGNED']}
+
+def booking_list_filters(view, owner_id=None, filters=None):
+    """WHERE terms and parameters for a booking list.
+    
+    filters maps a heading to a prefix the column must start with (an
+    exact match for ID, a pickup_ts range for a date prefix).
+    """
+    spec = BOOKING_LISTS[view]
+    columns = spec['columns']
+    where, params = [], []
+    if spec['owner']:
+        where.append(f"{spec['owner']} = ?")
+        params.append(owner_id)
+    for heading, value in (filters or {}).items():
+        expr = columns[heading]
+        if heading == 'ID':
+            where.append(f'{expr} = ?')
+            params.append(int(value))
+        elif heading == 'Date' and prefix_range(value):
+            where.append('b.pickup_ts >= ? AND b.pickup_ts < ?')
+            params.extend(prefix_range(value))
+        else:
+            # A range on the prefix lets SQLite use the column's index
+            where.append(f'{expr} >= ? AND {expr} < ?')
+            params.extend([value, value + '\uffff'])
+    return where, params
+
+def booking_list_order(view, sort_by):
+    """ORDER BY expressions for sorting a booking list by a heading.
+    
+    Ties fall back to pickup time and id, the same trailing order as the
+    indexes, so a sorted page is read straight from an index.
+    """
+    order = list(SORT_KEYS.get(sort_by, [BOOKING_LISTS[view]['columns'][sort_by]]))
+    order += [expr for expr in SORT_KEYS['Date'] + ['b.booking_id'] if expr not in order]
+    return order
+
+def count_bookings_by_day(cursor, start_ts, end_ts):
+    """(booking_date, status, count) for bookings picking up in [start_ts, end_ts).
+    
+    Takes a cursor so reports can run it on a reporting snapshot.
+    """
+    cursor.execute('''
+        SELECT booking_date, status, COUNT(*) FROM bookings
+        WHERE pickup_ts >= ? AND pickup_ts < ?
+        GROUP BY booking_date, status
+        ORDER BY booking_date, status
+    ''', (start_ts, end_ts))
+    return cursor.fetchall()
+
+class Database(Storage):
+    """Database handler for taxi booking system, the SQLite storage backend"""
     
-    def __init__(self, db_name='taxi_booking.db'):
+    def __init__(self, db_name='taxi_booking.db', group_commit_ms=0):
         self.db_name = db_name
-        self.conn = sqlite3.connect(db_name)
+        # Transactions are managed explicitly by transaction(), so the
+        # connection runs in autocommit mode outside of them.
+        self.conn = sqlite3.connect(db_name, isolation_level=None, check_same_thread=False)
         self.cursor = self.conn.cursor()
+        # Must precede table creation; lets maintenance reclaim free pages
+        # in small steps (no effect on files created before it was added)
+        self.cursor.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        # WAL lets dispatchers read while another process holds the write lock
+        self.cursor.execute('PRAGMA journal_mode=WAL')
+        self.group_commit_ms = group_commit_ms
+        self._lock = threading.RLock()
+        self._tx_depth = 0
+        self._commit_timer = None
+        # Error of a group commit that failed on the timer thread; once set,
+        # no new unit of work starts on this connection
+        self.commit_error = None
+        self.availability = AvailabilityIndex()
+        self.sessions = SessionCache(SESSIONS['CACHE_SIZE'], SESSIONS['CACHE_MAX_AGE'])
+        self.zone_counters = ZoneCounters()
+        self.shift_calendar = ShiftCalendar()
         self.create_tables()
+        self.apply_storage_settings()
         self.create_default_users()
     
+    @contextmanager
+    def transaction(self, immediate=False):
+        """Run a unit of work atomically.
+        
+        The outermost call opens a transaction, nested calls open savepoints
+        so an inner failure only rolls back its own changes. With group commit
+        enabled the final COMMIT is deferred by group_commit_ms so writes that
+        arrive close together share one commit; a unit asking for immediate
+        commits those first, so its BEGIN IMMEDIATE is not lost in a savepoint.
+        Raises sqlite3.OperationalError once a deferred commit has failed.
+        """
+        with self._lock:
+            if not self._tx_depth:
+                if self.commit_error is not None:
+                    raise sqlite3.OperationalError(f"An earlier group commit failed: {self.commit_error}")
+                if immediate and self.conn.in_transaction:
+                    self.flush()
+            savepoint = None
+            if self.conn.in_transaction:
+                savepoint = f"sp_{self._tx_depth}"
+                self.conn.execute(f"SAVEPOINT {savepoint}")
+            else:
+                self.conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+            self._tx_depth += 1
+            try:
+                yield self.cursor
+            except BaseException:
+                if savepoint:
+                    self.conn.execute(f"ROLLBACK TO {savepoint}")
+                    self.conn.execute(f"RELEASE {savepoint}")
+                else:
+                    self._cancel_commit_timer()
+                    self.conn.execute("ROLLBACK")
+                raise
+            else:
+                if savepoint:
+                    self.conn.execute(f"RELEASE {savepoint}")
+                if self._tx_depth == 1:
+                    if self.group_commit_ms:
+                        self._schedule_commit()
+                    else:
+                        self.conn.execute("COMMIT")
+            finally:
+                self._tx_depth -= 1
+    
+    def _schedule_commit(self):
+        """Arm the group commit timer if it is not already running"""
+        if self._commit_timer is None:
+            self._commit_timer = threading.Timer(self.group_commit_ms / 1000, self._group_commit)
+            self._commit_timer.daemon = True
+            self._commit_timer.start()
+    
+    def _cancel_commit_timer(self):
+        if self._commit_timer is not None:
+            self._commit_timer.cancel()
+            self._commit_timer = None
+    
+    def _group_commit(self):
+        """Timer callback; nobody is waiting to hear about a failure, so
+        flush() has already logged it and recorded it in commit_error"""
+        try:
+            self.flush()
+        except sqlite3.Error:
+            pass
+    
+    def flush(self):
+        """Commit any writes still waiting for a group commit.
+        
+        If the COMMIT fails the waiting writes are rolled back and the error
+        is kept in commit_error as well as raised.
+        """
+        with self._lock:
+            self._commit_timer = None
+            if self._tx_depth:
+                # A unit of work is still running; it re-arms the timer on exit
+                return
+            if self.conn.in_transaction:
+                try:
+                    self.conn.execute("COMMIT")
+                except sqlite3.Error as error:
+                    logger.error("Group commit on %s failed, its writes are rolled back: %s",
+                                 self.db_name, error)
+                    if self.conn.in_transaction:
+                        self.conn.execute("ROLLBACK")
+                    self.commit_error = error
+                    raise
+    
     def create_tables(self):
         """Create necessary tables"""
         # Users table
@@ -22,7 +262,8 @@ class Database:
                 password TEXT NOT NULL,
                 role TEXT NOT NULL,
                 name TEXT NOT NULL,
-                phone TEXT
+                phone TEXT,
+                city TEXT
             )
         ''')
         
@@ -36,15 +277,268 @@ class Database:
                 dropoff_location TEXT NOT NULL,
                 booking_date TEXT NOT NULL,
                 booking_time TEXT NOT NULL,
+                pickup_ts INTEGER,
                 status TEXT DEFAULT 'Pending',
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                version INTEGER NOT NULL DEFAULT 0,
+                rule_id INTEGER,
+                occurrence_date TEXT,
+                overdue INTEGER NOT NULL DEFAULT 0,
                 FOREIGN KEY (customer_id) REFERENCES users(user_id),
-                FOREIGN KEY (driver_id) REFERENCES users(user_id)
+                FOREIGN KEY (driver_id) REFERENCES users(user_id),
+                FOREIGN KEY (rule_id) REFERENCES recurring_bookings(rule_id)
+            )
+        ''')
+        
+        # Recurring booking rules; occurrences are generated on demand and
+        # only copied into bookings once they are due or edited
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS recurring_bookings (
+                rule_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                customer_id INTEGER NOT NULL,
+                pickup_location TEXT NOT NULL,
+                dropoff_location TEXT NOT NULL,
+                booking_time TEXT NOT NULL,
+                start_date TEXT NOT NULL,
+                frequency TEXT NOT NULL,
+                interval_days INTEGER NOT NULL DEFAULT 1,
+                until_date TEXT,
+                active INTEGER NOT NULL DEFAULT 1,
+                FOREIGN KEY (customer_id) REFERENCES users(user_id)
+            )
+        ''')
+        
+        # Driving distance and time between known locations, for chaining
+        # trips; see models/route_planner.py
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS travel_times (
+                from_location TEXT NOT NULL,
+                to_location TEXT NOT NULL,
+                km REAL NOT NULL,
+                minutes REAL NOT NULL,
+                PRIMARY KEY (from_location, to_location)
+            ) WITHOUT ROWID
+        ''')
+        
+        # Append-only log of status changes, written in the same transaction
+        # as the change. Times are epoch seconds and events small codes.
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS booking_events (
+                event_id INTEGER PRIMARY KEY,
+                booking_id INTEGER NOT NULL,
+                ts INTEGER NOT NULL,
+                event INTEGER NOT NULL,
+                driver_id INTEGER
+            )
+        ''')
+        
+        # Periodic checkpoints of the open bookings, so as-of queries replay
+        # only the events after the nearest checkpoint
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS event_checkpoints (
+                checkpoint_id INTEGER PRIMARY KEY,
+                ts INTEGER NOT NULL,
+                last_event_id INTEGER NOT NULL
+            )
+        ''')
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS event_checkpoint_bookings (
+                checkpoint_id INTEGER NOT NULL,
+                booking_id INTEGER NOT NULL,
+                event_id INTEGER NOT NULL,
+                PRIMARY KEY (checkpoint_id, booking_id)
+            ) WITHOUT ROWID
+        ''')
+        
+        # Trip actions queued by drivers' offline replicas, keyed by the id
+        # the replica gave each one, so a retried sync never applies an
+        # action twice and gets the original result back
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS sync_ops (
+                op_id TEXT PRIMARY KEY,
+                driver_id INTEGER NOT NULL,
+                booking_id INTEGER NOT NULL,
+                result TEXT NOT NULL,
+                applied_ts INTEGER NOT NULL
+            ) WITHOUT ROWID
+        ''')
+        
+        # Login sessions, keyed by the SHA-256 of the token so a copy of
+        # the file does not hand out live tokens
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS sessions (
+                token_hash TEXT PRIMARY KEY,
+                user_id INTEGER NOT NULL,
+                created_ts INTEGER NOT NULL,
+                expires_ts INTEGER NOT NULL,
+                revoked INTEGER NOT NULL DEFAULT 0,
+                FOREIGN KEY (user_id) REFERENCES users (user_id)
+            ) WITHOUT ROWID
+        ''')
+        self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_sessions_user ON sessions (user_id)')
+        self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions (expires_ts)')
+        
+        # Driver shifts as [start_ts, end_ts) ranges; every change bumps
+        # shift_state.revision so cached calendars know to reload
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS driver_shifts (
+                shift_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                driver_id INTEGER NOT NULL,
+                start_ts INTEGER NOT NULL,
+                end_ts INTEGER NOT NULL CHECK (end_ts > start_ts),
+                FOREIGN KEY (driver_id) REFERENCES users (user_id)
+            )
+        ''')
+        self.cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_driver_shifts_driver_range
+            ON driver_shifts (driver_id, start_ts, end_ts)
+        ''')
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS shift_state (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                revision INTEGER NOT NULL
+            )
+        ''')
+        self.cursor.execute('INSERT OR IGNORE INTO shift_state (id, revision) VALUES (1, 0)')
+        
+        # Connection PRAGMAs chosen by the storage tuner, applied by every
+        # connection that opens this file
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS storage_settings (
+                pragma TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            ) WITHOUT ROWID
+        ''')
+        
+        # Customer notification outbox, one row per event and channel,
+        # written in the same transaction as the status change
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS notifications (
+                notification_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                booking_id INTEGER NOT NULL,
+                customer_id INTEGER NOT NULL,
+                event INTEGER NOT NULL,
+                driver_id INTEGER,
+                channel TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_ts INTEGER NOT NULL,
+                created_ts INTEGER NOT NULL,
+                sent_ts INTEGER,
+                last_error TEXT
             )
         ''')
+        self.cursor.execute(f'''
+            CREATE INDEX IF NOT EXISTS idx_notifications_due ON notifications (next_attempt_ts)
+            WHERE status = '{NOTIFICATION_STATUS['PENDING']}'
+        ''')
+        
+        self.migrate_tables()
+        
+        # A driver can hold at most one open booking per slot
+        self.cursor.execute('''
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_bookings_driver_pickup
+            ON bookings (driver_id, pickup_ts)
+            WHERE driver_id IS NOT NULL AND status NOT IN ('Cancelled', 'Completed')
+        ''')
+        
+        # Each occurrence of a rule is materialized at most once
+        self.cursor.execute('''
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_bookings_occurrence
+            ON bookings (rule_id, occurrence_date)
+            WHERE rule_id IS NOT NULL
+        ''')
+        
+        # Indexes matching the sortable and filterable list columns and the
+        # time-window queries; each ends in pickup_ts so ranges and ordered
+        # pages are read straight from an index
+        for name, columns in [
+            ('idx_bookings_pickup_ts', 'pickup_ts'),
+            ('idx_bookings_customer_ts', 'customer_id, pickup_ts'),
+            ('idx_bookings_driver_ts', 'driver_id, pickup_ts'),
+            ('idx_bookings_status_ts', 'status, pickup_ts'),
+            ('idx_bookings_pickup_loc_ts', 'pickup_location, pickup_ts'),
+            ('idx_bookings_dropoff_loc_ts', 'dropoff_location, pickup_ts')
+        ]:
+            self.cursor.execute(f'CREATE INDEX IF NOT EXISTS {name} ON bookings ({columns})')
+        self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_name ON users (name)')
+        
+        # Per-booking timelines (the rowid keeps them in event order) and
+        # per-driver history
+        self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_booking_events_booking ON booking_events (booking_id)')
+        self.cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_booking_events_driver_ts
+            ON booking_events (driver_id, ts) WHERE driver_id IS NOT NULL
+        ''')
         
         self.conn.commit()
     
+    def migrate_tables(self):
+        """Add columns introduced after a database file was first created"""
+        new_columns = {
+            'bookings': {
+                'version': 'INTEGER NOT NULL DEFAULT 0',
+                'rule_id': 'INTEGER',
+                'occurrence_date': 'TEXT',
+                'pickup_ts': 'INTEGER',
+                'overdue': 'INTEGER NOT NULL DEFAULT 0'
+            },
+            'users': {
+                'city': 'TEXT'
+            }
+        }
+        for table, table_columns in new_columns.items():
+            self.cursor.execute(f'PRAGMA table_info({table})')
+            columns = {row[1] for row in self.cursor.fetchall()}
+            for column, definition in table_columns.items():
+                if column not in columns:
+                    self.cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+        
+        # Closed bookings past the retention period are moved here; keep its
+        # columns in step with bookings
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS bookings_archive AS SELECT * FROM bookings WHERE 0
+        ''')
+        self.cursor.execute('PRAGMA table_info(bookings_archive)')
+        archived = {row[1] for row in self.cursor.fetchall()}
+        self.cursor.execute('PRAGMA table_info(bookings)')
+        for column, column_type in [row[1:3] for row in self.cursor.fetchall()]:
+            if column not in archived:
+                self.cursor.execute(f'ALTER TABLE bookings_archive ADD COLUMN {column} {column_type}')
+        # Monthly reports read archived bookings by pickup time
+        self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_bookings_archive_pickup_ts ON bookings_archive (pickup_ts)')
+        
+        # Superseded by the pickup_ts indexes
+        for name in ['idx_bookings_driver_slot', 'idx_bookings_date', 'idx_bookings_customer',
+                     'idx_bookings_driver', 'idx_bookings_status', 'idx_bookings_pickup',
+                     'idx_bookings_dropoff']:
+            self.cursor.execute(f'DROP INDEX IF EXISTS {name}')
+        
+        # Derive pickup_ts for rows written before it existed
+        self.cursor.execute('''
+            SELECT booking_id, booking_date, booking_time FROM bookings WHERE pickup_ts IS NULL
+        ''')
+        rows = [(to_pickup_ts(booking_date, booking_time), booking_id)
+                for booking_id, booking_date, booking_time in self.cursor.fetchall()]
+        if rows:
+            with self.transaction() as cur:
+                cur.executemany('UPDATE bookings SET pickup_ts = ? WHERE booking_id = ?', rows)
+        
+        # Bookings made before the event log get one event for their current state
+        self.cursor.execute('SELECT EXISTS (SELECT 1 FROM booking_events)')
+        if not self.cursor.fetchone()[0]:
+            with self.transaction() as cur:
+                cur.execute('''
+                    INSERT INTO booking_events (booking_id, ts, event, driver_id)
+                    SELECT booking_id, COALESCE(CAST(strftime('%s', created_at) AS INTEGER), pickup_ts),
+                           CASE status WHEN ? THEN ? WHEN ? THEN ? WHEN ? THEN ? ELSE ? END,
+                           driver_id
+                    FROM bookings ORDER BY booking_id
+                ''', (BOOKING_STATUS['ASSIGNED'], BOOKING_EVENT['ASSIGNED'],
+                      BOOKING_STATUS['COMPLETED'], BOOKING_EVENT['COMPLETED'],
+                      BOOKING_STATUS['CANCELLED'], BOOKING_EVENT['CANCELLED'],
+                      BOOKING_EVENT['CREATED']))
+    
     def create_default_users(self):
         """Create default users if they don't exist"""
         default_user = [
@@ -53,15 +547,10 @@ class Database:
         
         for username, password, role, name, phone in default_user:
             hashed_pw = hashlib.sha256(password.encode()).hexdigest()
-            try:
-                self.cursor.execute('''
-                    INSERT INTO users (username, password, role, name, phone)
-                    VALUES (?, ?, ?, ?, ?)
-                ''', (username, hashed_pw, role, name, phone))
-            except sqlite3.IntegrityError:
-                pass
-        
-        self.conn.commit()
+            self.cursor.execute('''
+                INSERT OR IGNORE INTO users (username, password, role, name, phone)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (username, hashed_pw, role, name, phone))
     
     def authenticate(self, username, password):
         """Authenticate user"""
@@ -72,42 +561,1108 @@ class Database:
         ''', (username, hashed_pw))
         return self.cursor.fetchone()
     
-    def get_all_drivers(self):
-        """Get all drivers"""
+    def create_session(self, user_id, ttl=SESSIONS['TTL']):
+        """Open a login session for user_id and return its token"""
+        token = secrets.token_urlsafe(32)
+        now = int(time.time())
+        with self.transaction() as cur:
+            cur.execute('''
+                INSERT INTO sessions (token_hash, user_id, created_ts, expires_ts)
+                VALUES (?, ?, ?, ?)
+            ''', (hash_token(token), user_id, now, now + ttl))
+        return token
+    
+    def resume_session(self, token):
+        """(user_id, username, role, name) for a live session token, else None.
+        
+        Tokens validated recently come from the in-memory cache without a
+        query; the rest take one primary key lookup. Neither verifies the
+        password again.
+        """
+        token_hash = hash_token(token)
+        user = self.sessions.get(token_hash)
+        if user:
+            return user
         self.cursor.execute('''
-            SELECT user_id, name FROM users WHERE role = 'Driver'
-        ''')
+            SELECT u.user_id, u.username, u.role, u.name, s.expires_ts
+            FROM sessions s JOIN users u ON u.user_id = s.user_id
+            WHERE s.token_hash = ? AND s.revoked = 0 AND s.expires_ts > ?
+        ''', (token_hash, int(time.time())))
+        row = self.cursor.fetchone()
+        if not row:
+            self.sessions.discard(token_hash)
+            return None
+        self.sessions.put(token_hash, row[:4], row[4])
+        return row[:4]
+    
+    def revoke_session(self, token):
+        token_hash = hash_token(token)
+        with self.transaction() as cur:
+            cur.execute('UPDATE sessions SET revoked = 1 WHERE token_hash = ?', (token_hash,))
+        self.sessions.discard(token_hash)
+    
+    def revoke_user_sessions(self, user_id):
+        """Revoke every session of a user, e.g. after a password change"""
+        with self.transaction() as cur:
+            cur.execute('UPDATE sessions SET revoked = 1 WHERE user_id = ? AND revoked = 0', (user_id,))
+        self.sessions.discard_user(user_id)
+    
+    def purge_sessions(self):
+        """Delete expired and revoked sessions, returning how many went"""
+        with self.transaction() as cur:
+            cur.execute('DELETE FROM sessions WHERE expires_ts <= ? OR revoked = 1', (int(time.time()),))
+            return cur.rowcount
+    
+    def get_all_drivers(self, city=None):
+        """Get all drivers, or only those based in city"""
+        if city:
+            self.cursor.execute('''
+                SELECT user_id, name FROM users WHERE role = 'Driver' AND city = ?
+            ''', (city,))
+        else:
+            self.cursor.execute('''
+                SELECT user_id, name FROM users WHERE role = 'Driver'
+            ''')
         return self.cursor.fetchall()
     
     def check_driver_availability(self, driver_id, booking_date, booking_time):
-        """Check if driver has overlapping bookings"""
+        """Check the driver is on shift and has no overlapping bookings"""
+        pickup_ts = to_pickup_ts(booking_date, booking_time)
+        self.load_shifts()
+        if not self.shift_calendar.on_shift(driver_id, pickup_ts):
+            return False
         self.cursor.execute('''
             SELECT COUNT(*) FROM bookings 
             WHERE driver_id = ? 
-            AND booking_date = ? 
-            AND booking_time = ?
+            AND pickup_ts = ?
             AND status NOT IN ('Cancelled', 'Completed')
-        ''', (driver_id, booking_date, booking_time))
+        ''', (driver_id, pickup_ts))
         
         return self.cursor.fetchone()[0] == 0
     
-    def create_user(self, username, password, role, name, phone):
+    def add_shifts(self, shifts):
+        """Add (driver_id, start_ts, end_ts) shifts in one transaction; returns the count"""
+        rows = [(driver_id, int(start_ts), int(end_ts)) for driver_id, start_ts, end_ts in shifts]
+        if any(end_ts <= start_ts for _, start_ts, end_ts in rows):
+            raise ValueError("A shift must end after it starts")
+        with self.transaction() as cur:
+            cur.executemany('INSERT INTO driver_shifts (driver_id, start_ts, end_ts) VALUES (?, ?, ?)', rows)
+            cur.execute('UPDATE shift_state SET revision = revision + 1')
+        return len(rows)
+    
+    def delete_shifts(self, shift_ids):
+        """Delete shifts by id; returns how many existed"""
+        with self.transaction() as cur:
+            cur.executemany('DELETE FROM driver_shifts WHERE shift_id = ?', [(shift_id,) for shift_id in shift_ids])
+            deleted = cur.rowcount
+            cur.execute('UPDATE shift_state SET revision = revision + 1')
+        return deleted
+    
+    def clear_shifts(self, driver_ids, start_ts, end_ts):
+        """Delete the drivers' shifts starting in [start_ts, end_ts); returns the count"""
+        with self.transaction() as cur:
+            cur.executemany('''
+                DELETE FROM driver_shifts WHERE driver_id = ? AND start_ts >= ? AND start_ts < ?
+            ''', [(driver_id, start_ts, end_ts) for driver_id in driver_ids])
+            deleted = cur.rowcount
+            cur.execute('UPDATE shift_state SET revision = revision + 1')
+        return deleted
+    
+    def get_shifts(self, driver_ids, start_ts, end_ts):
+        """(shift_id, driver_id, start_ts, end_ts) for the drivers' shifts
+        overlapping [start_ts, end_ts), by driver and start"""
+        rows = []
+        for driver_id in sorted(driver_ids):
+            self.cursor.execute('''
+                SELECT shift_id, driver_id, start_ts, end_ts FROM driver_shifts
+                WHERE driver_id = ? AND start_ts < ? AND end_ts > ?
+                ORDER BY start_ts, shift_id
+            ''', (driver_id, end_ts, start_ts))
+            rows += self.cursor.fetchall()
+        return rows
+    
+    def load_shifts(self):
+        """Rebuild the shift calendar if the shifts changed since it was loaded.
+        
+        Costs one single-row read when nothing changed. Shifts that ended
+        more than SHIFTS['LOOKBACK_DAYS'] ago are left out.
+        """
+        self.cursor.execute('SELECT revision FROM shift_state')
+        revision = self.cursor.fetchone()[0]
+        if revision == self.shift_calendar.revision:
+            return
+        with self.transaction() as cur:
+            cur.execute('SELECT revision FROM shift_state')
+            revision = cur.fetchone()[0]
+            cur.execute('SELECT DISTINCT driver_id FROM driver_shifts')
+            drivers = [row[0] for row in cur.fetchall()]
+            cur.execute('''
+                SELECT driver_id, start_ts, end_ts FROM driver_shifts
+                WHERE end_ts > ? ORDER BY driver_id, start_ts
+            ''', (int(time.time()) - SHIFTS['LOOKBACK_DAYS'] * 86400,))
+            self.shift_calendar.load(revision, drivers, cur.fetchall())
+    
+    def load_zone_counters(self):
+        """Apply the booking events logged since the last call.
+        
+        Every process writing to the file logs its bookings in
+        booking_events, so the counters see them all, and the first call
+        seeds them with the last window. Costs one primary key lookup when
+        nothing was logged; otherwise only the new events are read, newest
+        first, stopping at the first one older than the window.
+        """
+        counters = self.zone_counters
+        cutoff = int(time.time()) - counters.window * 60
+        with self.transaction() as cur:
+            cur.execute('SELECT COALESCE(MAX(event_id), 0) FROM booking_events')
+            newest = cur.fetchone()[0]
+            if newest == counters.last_event_id:
+                return
+            cur.execute('''
+                SELECT e.ts, e.booking_id, e.event, e.driver_id, b.pickup_location, b.dropoff_location
+                FROM booking_events e LEFT JOIN bookings b ON b.booking_id = e.booking_id
+                WHERE e.event_id > ? AND e.event_id <= ? ORDER BY e.event_id DESC
+            ''', (counters.last_event_id, newest))
+            events = []
+            for row in cur:
+                if row[0] < cutoff:
+                    break
+                # Bookings archived since leave nothing to count
+                if row[4] is not None:
+                    events.append(row)
+        for ts, booking_id, event, driver_id, pickup, dropoff in reversed(events):
+            counters.apply(booking_id, event, driver_id, pickup, dropoff, ts)
+        counters.last_event_id = newest
+    
+    def sync_availability(self):
+        """Drop the availability days touched by booking events logged since the last call.
+        
+        The write methods keep the bitmaps current for this process only;
+        other processes' assignments, cancellations and edits reach it
+        through booking_events, so the days they touch are dropped and the
+        next load_availability reads them again. Costs one primary key
+        lookup when nothing was logged. An edit may have moved a booking
+        off a day, and an archived booking no longer says which day it was
+        on, so either drops every loaded day.
+        """
+        index = self.availability
+        with self.transaction() as cur:
+            cur.execute('SELECT COALESCE(MAX(event_id), 0) FROM booking_events')
+            newest = cur.fetchone()[0]
+            if newest == index.last_event_id:
+                return
+            if index.last_event_id is None:
+                # Days loaded before the first check may already be stale
+                index.clear()
+            elif index.days:
+                cur.execute('''
+                    SELECT e.event, b.pickup_ts
+                    FROM booking_events e LEFT JOIN bookings b ON b.booking_id = e.booking_id
+                    WHERE e.event_id > ? AND e.event_id <= ? AND e.event != ?
+                ''', (index.last_event_id, newest, BOOKING_EVENT['CREATED']))
+                rows = cur.fetchall()
+                if any(event == BOOKING_EVENT['UPDATED'] or pickup_ts is None for event, pickup_ts in rows):
+                    index.clear()
+                else:
+                    index.forget({pickup_ts for _, pickup_ts in rows})
+        index.last_event_id = newest
+    
+    def load_availability(self, pickup_ts_list):
+        """Load availability bitmaps for every day touched by pickup_ts_list.
+        
+        Days already in memory are skipped, so this costs at most one range
+        query and nothing once the days are warm.
+        """
+        days = sorted({AvailabilityIndex.day_of(pickup_ts) for pickup_ts in pickup_ts_list
+                       if not self.availability.is_loaded(pickup_ts)})
+        if not days:
+            return
+        start_ts, end_ts = day_bounds(days[0])[0], day_bounds(days[-1])[1]
+        self.cursor.execute('''
+            SELECT driver_id, pickup_ts FROM bookings
+            WHERE pickup_ts >= ? AND pickup_ts < ?
+            AND driver_id IS NOT NULL AND status NOT IN ('Cancelled', 'Completed')
+        ''', (start_ts, end_ts))
+        self.availability.load_days(days[0], days[-1], self.cursor.fetchall())
+    
+    def get_bookings_between(self, start_ts, end_ts, status=None, driver_id=None):
+        """Bookings picking up in [start_ts, end_ts), ordered by pickup time.
+        
+        Rows are (booking_id, customer_id, driver_id, pickup_location,
+        dropoff_location, pickup_ts, status).
+        """
+        query = '''
+            SELECT booking_id, customer_id, driver_id, pickup_location,
+                   dropoff_location, pickup_ts, status
+            FROM bookings WHERE pickup_ts >= ? AND pickup_ts < ?
+        '''
+        params = [start_ts, end_ts]
+        if status is not None:
+            query += ' AND status = ?'
+            params.append(status)
+        if driver_id is not None:
+            query += ' AND driver_id = ?'
+            params.append(driver_id)
+        self.cursor.execute(query + ' ORDER BY pickup_ts', params)
+        return self.cursor.fetchall()
+    
+    def set_travel_times(self, rows):
+        """Store (from_location, to_location, km, minutes) rows, replacing known pairs"""
+        with self.transaction() as cur:
+            cur.executemany('''
+                INSERT OR REPLACE INTO travel_times (from_location, to_location, km, minutes)
+                VALUES (?, ?, ?, ?)
+            ''', rows)
+    
+    def get_travel_times(self):
+        """{(from_location, to_location): (km, minutes)} for every known pair"""
+        self.cursor.execute('SELECT from_location, to_location, km, minutes FROM travel_times')
+        return {(origin, destination): (km, minutes) for origin, destination, km, minutes in self.cursor.fetchall()}
+    
+    def get_max_booking_id(self):
+        self.cursor.execute('SELECT COALESCE(MAX(booking_id), 0) FROM bookings')
+        return self.cursor.fetchone()[0]
+    
+    def iter_pickups(self, after_id, chunk_size):
+        """Yield lists of (booking_id, pickup_ts, pickup_location, status) for bookings after after_id, in id order"""
+        cur = self.conn.cursor()
+        cur.execute('''
+            SELECT booking_id, pickup_ts, pickup_location, status FROM bookings
+            WHERE booking_id > ? AND pickup_ts IS NOT NULL
+            ORDER BY booking_id
+        ''', (after_id,))
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                return
+            yield rows
+    
+    def get_booking_changes(self, since=0):
+        """Bookings with events after revision since, as they are now.
+        
+        Revisions are booking event ids, as in get_driver_changes. Returns
+        (revision, rows) with rows of (booking_id, pickup_ts,
+        pickup_location, status).
+        """
+        with self.transaction() as cur:
+            cur.execute('SELECT COALESCE(MAX(event_id), 0) FROM booking_events')
+            revision = cur.fetchone()[0]
+            cur.execute('''
+                SELECT booking_id, pickup_ts, pickup_location, status FROM bookings
+                WHERE booking_id IN (SELECT booking_id FROM booking_events WHERE event_id > ? AND event_id <= ?)
+                AND pickup_ts IS NOT NULL
+            ''', (since, revision))
+            return revision, cur.fetchall()
+    
+    def count_bookings_by_day(self, start_ts, end_ts):
+        """(booking_date, status, count) for bookings picking up in [start_ts, end_ts)"""
+        return count_bookings_by_day(self.cursor, start_ts, end_ts)
+    
+    def create_user(self, username, password, role, name, phone, city=None):
         hashed_pw = hashlib.sha256(password.encode()).hexdigest()
         try:
-            self.cursor.execute('''
-                INSERT INTO users (username, password, role, name, phone)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (username, hashed_pw, role, name, phone))
-            self.conn.commit()
+            with self.transaction() as cur:
+                cur.execute('''
+                    INSERT INTO users (username, password, role, name, phone, city)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (username, hashed_pw, role, name, phone, city))
             return True
         except sqlite3.IntegrityError:
             return False
         
-    def create_driver(self, username, password, full_name, phone, vehicle_no, license_no):
-        """Create a new driver user"""
-        return self.create_user(username, password, 'Driver', full_name, phone)
-
+    def get_user(self, user_id=None, username=None):
+        """Get the full users row by id or username"""
+        column, value = ('user_id', user_id) if user_id is not None else ('username', username)
+        self.cursor.execute(f'''
+            SELECT user_id, username, password, role, name, phone, city
+            FROM users WHERE {column} = ?
+        ''', (value,))
+        return self.cursor.fetchone()
+    
+    def copy_user(self, user_row):
+        """Insert or refresh a users row copied from another database, keeping its id"""
+        with self.transaction() as cur:
+            cur.execute('DELETE FROM users WHERE username = ? AND user_id != ?', (user_row[1], user_row[0]))
+            cur.execute('''
+                INSERT OR REPLACE INTO users (user_id, username, password, role, name, phone, city)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', user_row)
+    
+    def reserve_booking_ids(self, first_id):
+        """Start booking ids at first_id if no booking has been written yet"""
+        with self.transaction() as cur:
+            cur.execute('''
+                INSERT INTO sqlite_sequence (name, seq)
+                SELECT 'bookings', ?
+                WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'bookings')
+            ''', (first_id - 1,))
+    
+    def list_bookings(self, view, owner_id=None, sort_by='Date', descending=True,
+                      filters=None, limit=100, offset=0):
+        """Fetch one page of a dashboard booking list.
+        
+        view is a key of BOOKING_LISTS. Sorting and filtering happen in SQL;
+        filters maps a heading to a prefix the column must start with (an
+        exact match for ID). Rows hold the view's columns followed by its
+        extra columns.
+        """
+        spec = BOOKING_LISTS[view]
+        columns = spec['columns']
+        select = ', '.join(list(columns.values()) + spec['extra'])
+        where, params = booking_list_filters(view, owner_id, filters)
+        
+        direction = 'DESC' if descending else 'ASC'
+        query = f'''
+            SELECT {select}
+            FROM bookings b
+            {spec['joins'].format(schema='')}
+            {'WHERE ' + ' AND '.join(where) if where else ''}
+            ORDER BY {', '.join(f'{expr} {direction}' for expr in booking_list_order(view, sort_by))}
+            LIMIT ? OFFSET ?
+        '''
+        self.cursor.execute(query, params + [limit, offset])
+        return self.cursor.fetchall()
+    
+    def get_booking_status(self, booking_id):
+        """Get the status of a booking, or None if it does not exist"""
+        self.cursor.execute('SELECT status FROM bookings WHERE booking_id = ?', (booking_id,))
+        row = self.cursor.fetchone()
+        return row[0] if row else None
+    
+    def book_taxi(self, customer_id, pickup, dropoff, booking_date, booking_time):
+        """Create a pending booking and return its id"""
+        with self.transaction() as cur:
+            cur.execute('''
+                INSERT INTO bookings (customer_id, pickup_location, dropoff_location,
+                                      booking_date, booking_time, pickup_ts, status)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (customer_id, pickup, dropoff, booking_date, booking_time,
+                  to_pickup_ts(booking_date, booking_time), BOOKING_STATUS['PENDING']))
+            booking_id = cur.lastrowid
+            self._log_events(cur, [(booking_id, BOOKING_EVENT['CREATED'], None)])
+        return booking_id
+    
+    def import_bookings(self, bookings):
+        """Create pending bookings from (customer_id, pickup, dropoff, date, time) rows.
+        
+        All rows go in with one statement and one commit; returns the count.
+        """
+        rows = [(customer_id, pickup, dropoff, booking_date, booking_time,
+                 to_pickup_ts(booking_date, booking_time), BOOKING_STATUS['PENDING'])
+                for customer_id, pickup, dropoff, booking_date, booking_time in bookings]
+        with self.transaction() as cur:
+            last_id = self.get_max_booking_id()
+            cur.executemany('''
+                INSERT INTO bookings (customer_id, pickup_location, dropoff_location,
+                                      booking_date, booking_time, pickup_ts, status)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
+            self._log_created_since(cur, last_id)
+        return len(rows)
+    
+    def update_booking(self, booking_id, pickup, dropoff, booking_date, booking_time):
+        """Update an open booking.
+        
+        Returns False if it is completed or cancelled, or if the new slot
+        clashes with another trip of the assigned driver.
+        """
+        pickup_ts = to_pickup_ts(booking_date, booking_time)
+        try:
+            with self.transaction() as cur:
+                cur.execute('SELECT driver_id, pickup_ts FROM bookings WHERE booking_id = ?', (booking_id,))
+                previous = cur.fetchone()
+                cur.execute('''
+                    UPDATE bookings SET pickup_location = ?, dropoff_location = ?,
+                                        booking_date = ?, booking_time = ?, pickup_ts = ?,
+                                        version = version + 1
+                    WHERE booking_id = ? AND status NOT IN (?, ?)
+                ''', (pickup, dropoff, booking_date, booking_time, pickup_ts, booking_id,
+                      BOOKING_STATUS['COMPLETED'], BOOKING_STATUS['CANCELLED']))
+                updated = cur.rowcount > 0
+                if updated:
+                    self._log_events(cur, [(booking_id, BOOKING_EVENT['UPDATED'], previous[0])])
+        except sqlite3.IntegrityError:
+            return False
+        if updated:
+            driver_id, previous_ts = previous
+            self.availability.release(driver_id, previous_ts)
+            self.availability.book(driver_id, pickup_ts)
+        return updated
+    
+    def _lock_bookings(self, cur, booking_ids):
+        """Fetch pickup time, status, version and driver for the given bookings in one query"""
+        placeholders = ', '.join('?' * len(booking_ids))
+        cur.execute(f'''
+            SELECT booking_id, pickup_ts, status, version, driver_id
+            FROM bookings WHERE booking_id IN ({placeholders})
+        ''', list(booking_ids))
+        return {row[0]: row[1:] for row in cur.fetchall()}
+    
+    def _close_bookings(self, booking_ids, new_status, release_driver=False):
+        """Move open bookings to a final status with a single executemany.
+        
+        Returns (updated_ids, rejected) where rejected maps booking id to
+        one of ASSIGN_RESULT explaining why it was skipped.
+        """
+        updated, rejected = [], {}
+        if not booking_ids:
+            return updated, rejected
+        with self.transaction() as cur:
+            bookings = self._lock_bookings(cur, booking_ids)
+            for booking_id in booking_ids:
+                if booking_id not in bookings:
+                    rejected[booking_id] = ASSIGN_RESULT['NOT_FOUND']
+                elif bookings[booking_id][1] in [BOOKING_STATUS['CANCELLED'], BOOKING_STATUS['COMPLETED']]:
+                    rejected[booking_id] = ASSIGN_RESULT['CLOSED']
+                else:
+                    updated.append(booking_id)
+            
+            driver_clause = ', driver_id = NULL' if release_driver else ''
+            cur.executemany(f'''
+                UPDATE bookings SET status = ?, version = version + 1{driver_clause}
+                WHERE booking_id = ?
+            ''', [(new_status, booking_id) for booking_id in updated])
+            if new_status == BOOKING_STATUS['COMPLETED']:
+                event = BOOKING_EVENT['COMPLETED']
+            else:
+                event = BOOKING_EVENT['DRIVER_CANCELLED' if release_driver else 'CANCELLED']
+            self._log_events(cur, [(booking_id, event, bookings[booking_id][3]) for booking_id in updated])
+        for booking_id in updated:
+            pickup_ts, _, _, driver_id = bookings[booking_id]
+            self.availability.release(driver_id, pickup_ts)
+        return updated, rejected
+    
+    def cancel_bookings(self, booking_ids):
+        """Cancel several bookings on behalf of a customer or admin"""
+        return self._close_bookings(booking_ids, BOOKING_STATUS['CANCELLED'])
+    
+    def assign_drivers(self, booking_ids, driver_id, versions=None):
+        """Assign (or reassign) one driver to several bookings.
+        
+        Runs under BEGIN IMMEDIATE so the validation and the executemany see
+        the same data. Bookings clashing with the driver's other open trips,
+        or with each other, are rejected, as are bookings whose version no
+        longer matches the one in versions and bookings outside the driver's
+        shifts. Returns (updated_ids, rejected) like _close_bookings.
+        """
+        updated, rejected = [], {}
+        if not booking_ids:
+            return updated, rejected
+        versions = versions or {}
+        with self.transaction(immediate=True) as cur:
+            bookings = self._lock_bookings(cur, booking_ids)
+            cur.execute('''
+                SELECT booking_id, pickup_ts FROM bookings
+                WHERE driver_id = ? AND status NOT IN (?, ?)
+            ''', (driver_id, BOOKING_STATUS['CANCELLED'], BOOKING_STATUS['COMPLETED']))
+            busy = {pickup_ts for booking_id, pickup_ts in cur.fetchall()
+                    if booking_id not in bookings}
+            off_shift = self._off_shift(cur, driver_id, [row[0] for row in bookings.values()])
+            
+            for booking_id in booking_ids:
+                if booking_id not in bookings:
+                    rejected[booking_id] = ASSIGN_RESULT['NOT_FOUND']
+                    continue
+                pickup_ts, status, version, _ = bookings[booking_id]
+                if booking_id in versions and versions[booking_id] != version:
+                    rejected[booking_id] = ASSIGN_RESULT['STALE']
+                elif status in [BOOKING_STATUS['CANCELLED'], BOOKING_STATUS['COMPLETED']]:
+                    rejected[booking_id] = ASSIGN_RESULT['CLOSED']
+                elif pickup_ts in off_shift:
+                    rejected[booking_id] = ASSIGN_RESULT['OFF_SHIFT']
+                elif pickup_ts in busy:
+                    rejected[booking_id] = ASSIGN_RESULT['CONFLICT']
+                else:
+                    busy.add(pickup_ts)
+                    updated.append(booking_id)
+            
+            cur.executemany('''
+                UPDATE bookings
+                SET driver_id = ?, status = ?, version = version + 1
+                WHERE booking_id = ?
+            ''', [(driver_id, BOOKING_STATUS['ASSIGNED'], booking_id) for booking_id in updated])
+            self._log_events(cur, [(booking_id, BOOKING_EVENT['ASSIGNED'], driver_id) for booking_id in updated])
+        for booking_id in updated:
+            pickup_ts, _, _, previous_driver = bookings[booking_id]
+            self.availability.release(previous_driver, pickup_ts)
+            self.availability.book(driver_id, pickup_ts)
+        return updated, rejected
+    
+    def assign_driver(self, booking_id, driver_id, version=None):
+        """Assign a driver to a booking, returning one of ASSIGN_RESULT.
+        
+        The assignment is one conditional UPDATE under BEGIN IMMEDIATE: it
+        only succeeds if the booking is still open, still at the expected
+        version (when given), the driver is on shift at pickup time and
+        has no other open trip in the same slot. The unique (driver, slot)
+        index backs this up. When nothing is updated the booking is re-read
+        to report why.
+        """
+        try:
+            with self.transaction(immediate=True) as cur:
+                # Only used to keep the availability bitmaps current
+                cur.execute('SELECT driver_id, pickup_ts FROM bookings WHERE booking_id = ?', (booking_id,))
+                previous = cur.fetchone()
+                cur.execute('''
+                    UPDATE bookings
+                    SET driver_id = :driver_id, status = :assigned, version = version + 1
+                    WHERE booking_id = :booking_id
+                    AND (:version IS NULL OR version = :version)
+                    AND status NOT IN (:cancelled, :completed)
+                    AND (NOT EXISTS (SELECT 1 FROM driver_shifts WHERE driver_id = :driver_id)
+                         OR EXISTS (
+                            SELECT 1 FROM driver_shifts
+                            WHERE driver_id = :driver_id
+                            AND start_ts <= bookings.pickup_ts AND end_ts > bookings.pickup_ts
+                         ))
+                    AND NOT EXISTS (
+                        SELECT 1 FROM bookings other
+                        WHERE other.driver_id = :driver_id
+                        AND other.pickup_ts = bookings.pickup_ts
+                        AND other.status NOT IN (:cancelled, :completed)
+                        AND other.booking_id != bookings.booking_id
+                    )
+                ''', {'driver_id': driver_id, 'booking_id': booking_id, 'version': version,
+                      'assigned': BOOKING_STATUS['ASSIGNED'],
+                      'cancelled': BOOKING_STATUS['CANCELLED'],
+                      'completed': BOOKING_STATUS['COMPLETED']})
+                if cur.rowcount:
+                    result = ASSIGN_RESULT['OK']
+                    self._log_events(cur, [(booking_id, BOOKING_EVENT['ASSIGNED'], driver_id)])
+                else:
+                    result = self._explain_assign_failure(cur, booking_id, driver_id, version)
+        except sqlite3.IntegrityError:
+            return ASSIGN_RESULT['CONFLICT']
+        if result == ASSIGN_RESULT['OK']:
+            previous_driver, pickup_ts = previous
+            self.availability.release(previous_driver, pickup_ts)
+            self.availability.book(driver_id, pickup_ts)
+        return result
+    
+    def _explain_assign_failure(self, cur, booking_id, driver_id, version):
+        """Work out why a conditional assignment updated nothing"""
+        cur.execute('SELECT status, version, pickup_ts FROM bookings WHERE booking_id = ?', (booking_id,))
+        row = cur.fetchone()
+        if not row:
+            return ASSIGN_RESULT['NOT_FOUND']
+        if version is not None and row[1] != version:
+            return ASSIGN_RESULT['STALE']
+        if row[0] in [BOOKING_STATUS['CANCELLED'], BOOKING_STATUS['COMPLETED']]:
+            return ASSIGN_RESULT['CLOSED']
+        if self._off_shift(cur, driver_id, [row[2]]):
+            return ASSIGN_RESULT['OFF_SHIFT']
+        return ASSIGN_RESULT['CONFLICT']
+    
+    def _off_shift(self, cur, driver_id, pickup_times):
+        """The pickup times at which driver_id is off shift.
+        
+        Read from driver_shifts inside the caller's transaction rather than
+        from shift_calendar, which may lag behind other processes. Like the
+        calendar, a driver without any shifts is always on shift.
+        """
+        if not pickup_times:
+            return set()
+        cur.execute('''
+            SELECT start_ts, end_ts FROM driver_shifts
+            WHERE driver_id = ? AND start_ts <= ? AND end_ts > ?
+        ''', (driver_id, max(pickup_times), min(pickup_times)))
+        shifts = cur.fetchall()
+        if not shifts:
+            cur.execute('SELECT 1 FROM driver_shifts WHERE driver_id = ? LIMIT 1', (driver_id,))
+            if not cur.fetchone():
+                return set()
+        return {pickup_ts for pickup_ts in pickup_times
+                if not any(start_ts <= pickup_ts < end_ts for start_ts, end_ts in shifts)}
+    
+    def complete_trips(self, booking_ids):
+        """Mark several trips as completed"""
+        return self._close_bookings(booking_ids, BOOKING_STATUS['COMPLETED'])
+    
+    def cancel_trips(self, booking_ids):
+        """Cancel several trips on behalf of the driver, releasing the driver"""
+        return self._close_bookings(booking_ids, BOOKING_STATUS['CANCELLED'], release_driver=True)
+    
+    def get_driver_changes(self, driver_id, since=0):
+        """(revision, rows) for a driver's trips changed after revision since.
+        
+        Revisions are booking event ids, so only bookings with events after
+        since are read; since 0 reads the driver's current trips. Rows are
+        (booking_id, customer_id, customer name, customer phone, driver_id,
+        pickup, dropoff, date, time, pickup_ts, status, version) for
+        bookings that are or were the driver's, so a row with another
+        driver_id tells the replica the trip was taken away.
+        """
+        columns = '''b.booking_id, b.customer_id, u.name, u.phone, b.driver_id,
+                     b.pickup_location, b.dropoff_location, b.booking_date,
+                     b.booking_time, b.pickup_ts, b.status, b.version'''
+        # One read transaction, so the rows are exactly as of the revision
+        with self.transaction() as cur:
+            cur.execute('SELECT COALESCE(MAX(event_id), 0) FROM booking_events')
+            revision = cur.fetchone()[0]
+            if not since:
+                cur.execute(f'''
+                    SELECT {columns} FROM bookings b JOIN users u ON b.customer_id = u.user_id
+                    WHERE b.driver_id = ?
+                ''', (driver_id,))
+            else:
+                cur.execute(f'''
+                    SELECT {columns} FROM bookings b JOIN users u ON b.customer_id = u.user_id
+                    WHERE b.booking_id IN (SELECT booking_id FROM booking_events WHERE event_id > ?)
+                    AND (b.driver_id = ? OR EXISTS (
+                        SELECT 1 FROM booking_events e
+                        WHERE e.booking_id = b.booking_id AND e.driver_id = ?))
+                ''', (since, driver_id, driver_id))
+            return revision, cur.fetchall()
+    
+    def apply_driver_ops(self, driver_id, ops):
+        """Apply trip actions queued by a driver's offline replica.
+        
+        ops are (op_id, booking_id, new_status) in the order the driver
+        made them, new_status being Completed or Cancelled. An op_id seen
+        before gets its recorded result back without being applied again.
+        The central copy wins conflicts: trips no longer assigned to the
+        driver are rejected as REASSIGNED, closed ones as CLOSED. Returns
+        {op_id: ASSIGN_RESULT}.
+        """
+        if not ops:
+            return {}
+        with self.transaction(immediate=True) as cur:
+            placeholders = ', '.join('?' * len(ops))
+            cur.execute(f'SELECT op_id, result FROM sync_ops WHERE op_id IN ({placeholders})',
+                        [op_id for op_id, _, _ in ops])
+            results = dict(cur.fetchall())
+            applied = []
+            for op_id, booking_id, new_status in ops:
+                if op_id in results:
+                    continue
+                bookings = self._lock_bookings(cur, [booking_id])
+                if booking_id not in bookings:
+                    result = ASSIGN_RESULT['NOT_FOUND']
+                elif bookings[booking_id][3] != driver_id:
+                    result = ASSIGN_RESULT['REASSIGNED']
+                else:
+                    release = new_status == BOOKING_STATUS['CANCELLED']
+                    _, rejected = self._close_bookings([booking_id], new_status, release_driver=release)
+                    result = rejected.get(booking_id, ASSIGN_RESULT['OK'])
+                results[op_id] = result
+                applied.append((op_id, driver_id, booking_id, result, int(time.time())))
+            cur.executemany('''
+                INSERT INTO sync_ops (op_id, driver_id, booking_id, result, applied_ts) VALUES (?, ?, ?, ?, ?)
+            ''', applied)
+        return results
+    
+    def create_recurring_booking(self, customer_id, pickup, dropoff, booking_time,
+                                 start_date, frequency, interval_days=1, until_date=None):
+        """Store a recurring booking rule and return its id"""
+        with self.transaction() as cur:
+            cur.execute('''
+                INSERT INTO recurring_bookings (customer_id, pickup_location, dropoff_location,
+                                                booking_time, start_date, frequency,
+                                                interval_days, until_date)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (customer_id, pickup, dropoff, booking_time, start_date, frequency,
+                  interval_days, until_date))
+            rule_id = cur.lastrowid
+        self.materialize_due_occurrences()
+        return rule_id
+    
+    def stop_recurring_booking(self, rule_id):
+        """Stop generating new occurrences for a rule"""
+        with self.transaction() as cur:
+            cur.execute('UPDATE recurring_bookings SET active = 0 WHERE rule_id = ?', (rule_id,))
+            return cur.rowcount > 0
+    
+    def get_recurring_rules(self, customer_id=None):
+        """Get active recurring booking rules, optionally for one customer"""
+        query = '''
+            SELECT rule_id, customer_id, pickup_location, dropoff_location, booking_time,
+                   start_date, frequency, interval_days, until_date
+            FROM recurring_bookings WHERE active = 1
+        '''
+        params = ()
+        if customer_id is not None:
+            query += ' AND customer_id = ?'
+            params = (customer_id,)
+        self.cursor.execute(query, params)
+        return [RecurrenceRule(*row) for row in self.cursor.fetchall()]
+    
+    def iter_occurrences(self, window_start, window_end, customer_id=None):
+        """Lazily yield (rule, occurrence_date) pairs not yet in bookings.
+        
+        Dates are date objects; the window is inclusive at both ends.
+        """
+        rules = self.get_recurring_rules(customer_id)
+        if not rules:
+            return
+        self.cursor.execute('''
+            SELECT rule_id, occurrence_date FROM bookings
+            WHERE rule_id IS NOT NULL AND occurrence_date BETWEEN ? AND ?
+        ''', (window_start.isoformat(), window_end.isoformat()))
+        materialized = set(self.cursor.fetchall())
+        for rule in rules:
+            for day in rule.occurrences(window_start, window_end):
+                if (rule.rule_id, day.isoformat()) not in materialized:
+                    yield rule, day
+    
+    def _insert_occurrences(self, cur, occurrences):
+        """Insert (rule, occurrence_date) pairs, skipping ones already stored"""
+        last_id = self.get_max_booking_id()
+        cur.executemany('''
+            INSERT OR IGNORE INTO bookings (customer_id, pickup_location, dropoff_location,
+                                            booking_date, booking_time, pickup_ts, status,
+                                            rule_id, occurrence_date)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [(rule.customer_id, rule.pickup, rule.dropoff, day.isoformat(), rule.booking_time,
+               to_pickup_ts(day.isoformat(), rule.booking_time), BOOKING_STATUS['PENDING'],
+               rule.rule_id, day.isoformat())
+              for rule, day in occurrences])
+        self._log_created_since(cur, last_id)
+    
+    def materialize_occurrence(self, rule_id, occurrence_date):
+        """Copy one occurrence into bookings (if needed) and return its booking id"""
+        with self.transaction() as cur:
+            cur.execute('''
+                SELECT rule_id, customer_id, pickup_location, dropoff_location, booking_time,
+                       start_date, frequency, interval_days, until_date
+                FROM recurring_bookings WHERE rule_id = ?
+            ''', (rule_id,))
+            row = cur.fetchone()
+            if not row:
+                return None
+            self._insert_occurrences(cur, [(RecurrenceRule(*row), date.fromisoformat(occurrence_date))])
+            cur.execute('''
+                SELECT booking_id FROM bookings WHERE rule_id = ? AND occurrence_date = ?
+            ''', (rule_id, occurrence_date))
+            return cur.fetchone()[0]
+    
+    def materialize_due_occurrences(self, horizon_days=RECURRENCE['DISPATCH_HORIZON_DAYS']):
+        """Copy every occurrence inside the dispatch window into bookings"""
+        today = date.today()
+        due = list(self.iter_occurrences(today, today + timedelta(days=horizon_days)))
+        if due:
+            with self.transaction() as cur:
+                self._insert_occurrences(cur, due)
+        return len(due)
+    
+    def expire_stale_bookings(self, grace_minutes, batch_size):
+        """Cancel Pending bookings whose pickup time passed grace_minutes ago.
+        
+        Works in batches of batch_size, one short transaction each, and
+        returns the number of bookings expired.
+        """
+        cutoff = int(time.time()) - grace_minutes * 60
+        return self._run_batched('''
+            UPDATE bookings SET status = ?, version = version + 1
+            WHERE booking_id IN (
+                SELECT booking_id FROM bookings
+                WHERE status = ? AND pickup_ts < ?
+                LIMIT ?
+            )
+            RETURNING booking_id, driver_id
+        ''', (BOOKING_STATUS['CANCELLED'], BOOKING_STATUS['PENDING'], cutoff), batch_size,
+            event=BOOKING_EVENT['EXPIRED'])
+    
+    def flag_overdue_trips(self, grace_minutes, batch_size):
+        """Flag Assigned trips still open grace_minutes after pickup"""
+        cutoff = int(time.time()) - grace_minutes * 60
+        return self._run_batched('''
+            UPDATE bookings SET overdue = 1
+            WHERE booking_id IN (
+                SELECT booking_id FROM bookings
+                WHERE status = ? AND pickup_ts < ? AND overdue = 0
+                LIMIT ?
+            )
+        ''', (BOOKING_STATUS['ASSIGNED'], cutoff), batch_size)
+    
+    def archive_closed_bookings(self, older_than_days, batch_size):
+        """Move completed and cancelled bookings older than older_than_days to bookings_archive"""
+        cutoff = int(time.time()) - older_than_days * 86400
+        self.cursor.execute('PRAGMA table_info(bookings)')
+        columns = ', '.join(row[1] for row in self.cursor.fetchall())
+        moved = 0
+        while True:
+            with self.transaction() as cur:
+                cur.execute('''
+                    SELECT booking_id FROM bookings
+                    WHERE status IN (?, ?) AND pickup_ts < ?
+                    LIMIT ?
+                ''', (BOOKING_STATUS['CANCELLED'], BOOKING_STATUS['COMPLETED'], cutoff, batch_size))
+                batch = [row[0] for row in cur.fetchall()]
+                if not batch:
+                    return moved
+                placeholders = ', '.join('?' * len(batch))
+                cur.execute(f'''
+                    INSERT INTO bookings_archive ({columns})
+                    SELECT {columns} FROM bookings WHERE booking_id IN ({placeholders})
+                ''', batch)
+                cur.execute(f'DELETE FROM bookings WHERE booking_id IN ({placeholders})', batch)
+            moved += len(batch)
+            if len(batch) < batch_size:
+                return moved
+    
+    def _run_batched(self, statement, params, batch_size, event=None):
+        """Repeat a LIMIT-ed UPDATE in separate transactions until it runs dry.
+        
+        With event given, the statement must return (booking_id, driver_id)
+        for each changed row, and the event is logged for each.
+        """
+        total = 0
+        while True:
+            with self.transaction() as cur:
+                cur.execute(statement, params + (batch_size,))
+                if event is None:
+                    changed = cur.rowcount
+                else:
+                    rows = cur.fetchall()
+                    self._log_events(cur, [(booking_id, event, driver_id) for booking_id, driver_id in rows])
+                    changed = len(rows)
+            total += changed
+            if changed < batch_size:
+                return total
+    
+    def _log_events(self, cur, events):
+        """Append (booking_id, event, driver_id) rows to booking_events"""
+        now = int(time.time())
+        cur.executemany('''
+            INSERT INTO booking_events (booking_id, ts, event, driver_id) VALUES (?, ?, ?, ?)
+        ''', [(booking_id, now, event, driver_id) for booking_id, event, driver_id in events])
+        cur.executemany('''
+            INSERT INTO notifications (booking_id, customer_id, event, driver_id, channel, status,
+                                       next_attempt_ts, created_ts)
+            SELECT booking_id, customer_id, ?, ?, ?, ?, ?, ? FROM bookings WHERE booking_id = ?
+        ''', [(event, driver_id, channel, NOTIFICATION_STATUS['PENDING'], now, now, booking_id)
+              for booking_id, event, driver_id in events if event in NOTIFY['EVENTS']
+              for channel in NOTIFY['CHANNELS']])
+    
+    def _log_created_since(self, cur, last_id):
+        """Log CREATED for bookings inserted after last_id in this transaction"""
+        cur.execute('''
+            INSERT INTO booking_events (booking_id, ts, event, driver_id)
+            SELECT booking_id, ?, ?, NULL FROM bookings WHERE booking_id > ?
+        ''', (int(time.time()), BOOKING_EVENT['CREATED'], last_id))
+    
+    def claim_notifications(self, batch_size, lease_seconds):
+        """Claim up to batch_size due notifications for delivery.
+        
+        Claimed rows stay pending but are not due again for lease_seconds,
+        so a worker that dies mid-batch only delays them. Returns
+        (notification_id, channel, event, attempts, booking_id, customer
+        name, phone, pickup, dropoff, date, time, name of the event's
+        driver) rows, with attempts counting this one.
+        """
+        now = int(time.time())
+        with self.transaction(immediate=True) as cur:
+            cur.execute('''
+                UPDATE notifications SET next_attempt_ts = ?, attempts = attempts + 1
+                WHERE notification_id IN (
+                    SELECT notification_id FROM notifications
+                    WHERE status = ? AND next_attempt_ts <= ?
+                    ORDER BY next_attempt_ts
+                    LIMIT ?
+                )
+                RETURNING notification_id
+            ''', (now + lease_seconds, NOTIFICATION_STATUS['PENDING'], now, batch_size))
+            claimed = [row[0] for row in cur.fetchall()]
+            if not claimed:
+                return []
+            placeholders = ', '.join('?' * len(claimed))
+            cur.execute(f'''
+                SELECT n.notification_id, n.channel, n.event, n.attempts, n.booking_id,
+                       c.name, c.phone, b.pickup_location, b.dropoff_location,
+                       b.booking_date, b.booking_time, d.name
+                FROM notifications n
+                JOIN users c ON c.user_id = n.customer_id
+                LEFT JOIN bookings b ON b.booking_id = n.booking_id
+                LEFT JOIN users d ON d.user_id = n.driver_id
+                WHERE n.notification_id IN ({placeholders})
+                ORDER BY n.notification_id
+            ''', claimed)
+            return cur.fetchall()
+    
+    def finish_notifications(self, sent, failed):
+        """Record a delivery round: sent is a list of notification ids,
+        failed maps ids to (error, retry_ts), retry_ts None meaning give up"""
+        now = int(time.time())
+        with self.transaction() as cur:
+            cur.executemany('''
+                UPDATE notifications SET status = ?, sent_ts = ?, last_error = NULL
+                WHERE notification_id = ?
+            ''', [(NOTIFICATION_STATUS['SENT'], now, notification_id) for notification_id in sent])
+            cur.executemany('''
+                UPDATE notifications SET status = ?, next_attempt_ts = COALESCE(?, next_attempt_ts),
+                                         last_error = ?
+                WHERE notification_id = ?
+            ''', [(NOTIFICATION_STATUS['PENDING' if retry_ts else 'FAILED'], retry_ts, error, notification_id)
+                  for notification_id, (error, retry_ts) in failed.items()])
+    
+    def get_booking_timeline(self, booking_id):
+        """(ts, event, driver_id) for every status change of a booking, oldest first"""
+        self.cursor.execute('''
+            SELECT ts, event, driver_id FROM booking_events
+            WHERE booking_id = ? ORDER BY event_id
+        ''', (booking_id,))
+        return self.cursor.fetchall()
+    
+    def get_driver_history(self, driver_id, start_ts=0, end_ts=2 ** 62):
+        """(ts, booking_id, event) for the driver's events in [start_ts, end_ts).
+        
+        Includes trips the driver gave up, which bookings no longer shows.
+        """
+        self.cursor.execute('''
+            SELECT ts, booking_id, event FROM booking_events
+            WHERE driver_id = ? AND ts >= ? AND ts < ?
+            ORDER BY ts, event_id
+        ''', (driver_id, start_ts, end_ts))
+        return self.cursor.fetchall()
+    
+    def booking_state_as_of(self, booking_id, ts):
+        """(status, driver_id) of a booking at time ts, or None if it did not exist yet"""
+        self.cursor.execute('''
+            SELECT event, driver_id FROM booking_events
+            WHERE booking_id = ? AND ts <= ? AND event != ?
+            ORDER BY event_id DESC LIMIT 1
+        ''', (booking_id, ts, BOOKING_EVENT['UPDATED']))
+        row = self.cursor.fetchone()
+        if not row:
+            return None
+        event, driver_id = row
+        return EVENT_STATUS[event], None if event == BOOKING_EVENT['DRIVER_CANCELLED'] else driver_id
+    
+    def open_bookings_as_of(self, ts):
+        """{booking_id: (status, driver_id)} for bookings open at time ts.
+        
+        Starts from the latest checkpoint at or before ts and replays only
+        the events logged after it.
+        """
+        self.cursor.execute('''
+            SELECT checkpoint_id, last_event_id FROM event_checkpoints
+            WHERE ts <= ? ORDER BY ts DESC LIMIT 1
+        ''', (ts,))
+        checkpoint = self.cursor.fetchone()
+        state, last_event_id = {}, 0
+        if checkpoint:
+            checkpoint_id, last_event_id = checkpoint
+            self.cursor.execute('''
+                SELECT c.booking_id, e.event, e.driver_id
+                FROM event_checkpoint_bookings c JOIN booking_events e ON e.event_id = c.event_id
+                WHERE c.checkpoint_id = ?
+            ''', (checkpoint_id,))
+            state = {booking_id: (event, driver_id) for booking_id, event, driver_id in self.cursor.fetchall()}
+        self.cursor.execute('''
+            SELECT booking_id, event, driver_id FROM booking_events
+            WHERE event_id > ? AND ts <= ? AND event != ? ORDER BY event_id
+        ''', (last_event_id, ts, BOOKING_EVENT['UPDATED']))
+        for booking_id, event, driver_id in self.cursor.fetchall():
+            if event in OPEN_EVENTS:
+                state[booking_id] = (event, driver_id)
+            else:
+                state.pop(booking_id, None)
+        return {booking_id: (EVENT_STATUS[event], driver_id)
+                for booking_id, (event, driver_id) in state.items()}
+    
+    def checkpoint_events(self, keep):
+        """Record which bookings are open and their latest event, keeping the newest keep checkpoints.
+        
+        Built from the previous checkpoint plus the events since, so this
+        never replays the whole log. Returns the new checkpoint id, or None
+        if nothing happened since the last one.
+        """
+        with self.transaction() as cur:
+            cur.execute('SELECT checkpoint_id, last_event_id FROM event_checkpoints ORDER BY checkpoint_id DESC LIMIT 1')
+            previous = cur.fetchone()
+            state, last_event_id = {}, 0
+            if previous:
+                last_event_id = previous[1]
+                cur.execute('''
+                    SELECT booking_id, event_id FROM event_checkpoint_bookings WHERE checkpoint_id = ?
+                ''', (previous[0],))
+                state = dict(cur.fetchall())
+            cur.execute('''
+                SELECT event_id, booking_id, event FROM booking_events
+                WHERE event_id > ? ORDER BY event_id
+            ''', (last_event_id,))
+            events = [row for row in cur.fetchall() if row[2] != BOOKING_EVENT['UPDATED']]
+            if previous and not events:
+                return None
+            for event_id, booking_id, event in events:
+                if event in OPEN_EVENTS:
+                    state[booking_id] = event_id
+                else:
+                    state.pop(booking_id, None)
+            if events:
+                last_event_id = events[-1][0]
+            cur.execute('INSERT INTO event_checkpoints (ts, last_event_id) VALUES (?, ?)',
+                        (int(time.time()), last_event_id))
+            checkpoint_id = cur.lastrowid
+            cur.executemany('''
+                INSERT INTO event_checkpoint_bookings (checkpoint_id, booking_id, event_id) VALUES (?, ?, ?)
+            ''', [(checkpoint_id, booking_id, event_id) for booking_id, event_id in state.items()])
+            
+            cur.execute('''
+                SELECT checkpoint_id FROM event_checkpoints ORDER BY checkpoint_id DESC LIMIT -1 OFFSET ?
+            ''', (keep,))
+            expired = [(row[0],) for row in cur.fetchall()]
+            cur.executemany('DELETE FROM event_checkpoint_bookings WHERE checkpoint_id = ?', expired)
+            cur.executemany('DELETE FROM event_checkpoints WHERE checkpoint_id = ?', expired)
+        return checkpoint_id
+    
+    def get_storage_settings(self):
+        """{pragma: value} saved by the storage tuner"""
+        self.cursor.execute('SELECT pragma, value FROM storage_settings')
+        return {pragma: value for pragma, value in self.cursor.fetchall() if pragma in STORAGE_PRAGMAS}
+    
+    def save_storage_settings(self, settings):
+        """Persist {pragma: value} for every later connection and apply it to this one"""
+        with self.transaction() as cur:
+            cur.executemany('INSERT OR REPLACE INTO storage_settings (pragma, value) VALUES (?, ?)',
+                            [(pragma, int(value)) for pragma, value in settings.items()
+                             if pragma in STORAGE_PRAGMAS])
+        self.apply_storage_settings()
+    
+    def apply_storage_settings(self, settings=None):
+        """Set the per-connection PRAGMAs, from the saved settings by default.
+        
+        page_size is a property of the file rather than the connection;
+        see rebuild_with_page_size.
+        """
+        settings = self.get_storage_settings() if settings is None else settings
+        for pragma in STORAGE_PRAGMAS:
+            if pragma in settings and pragma != 'page_size':
+                self.cursor.execute(f'PRAGMA {pragma} = {int(settings[pragma])}')
+                self.cursor.fetchall()
+    
+    def rebuild_with_page_size(self, page_size):
+        """Rewrite the file with a new page size.
+        
+        A WAL database keeps its page size, so this leaves WAL, vacuums and
+        returns to WAL. It rewrites the whole file under an exclusive lock;
+        run it while no dashboards are open. Returns whether anything changed.
+        """
+        with self._lock:
+            self.flush()
+            self.cursor.execute('PRAGMA page_size')
+            if self.cursor.fetchone()[0] == page_size:
+                return False
+            self.cursor.execute('PRAGMA journal_mode=DELETE')
+            self.cursor.execute(f'PRAGMA page_size = {int(page_size)}')
+            self.cursor.execute('VACUUM')
+            self.cursor.execute('PRAGMA journal_mode=WAL')
+            return True
+    
+    def run_maintenance(self, vacuum_pages):
+        """Refresh planner statistics and return up to vacuum_pages free pages to the OS"""
+        with self._lock:
+            self.cursor.execute('PRAGMA optimize')
+            self.cursor.execute('PRAGMA auto_vacuum')
+            if self.cursor.fetchone()[0] == 2:
+                self.cursor.execute(f'PRAGMA incremental_vacuum({int(vacuum_pages)})')
+                self.cursor.fetchall()
     
     def close(self):
         """Close database connection"""
-        self.conn.close()
\ No newline at end of file
+        with self._lock:
+            self._cancel_commit_timer()
+        try:
+            self.flush()
+        finally:
+            self.conn.close()
\ No newline at end of file
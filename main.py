@@ -1,15 +1,37 @@
+import os
 import tkinter as tk
 from database import Database
+from sharding import ShardRouter
 from views.login_window import LoginWindow
 from views.customer_dashboard import CustomerDashboard
 from views.admin_dashboard import AdminDashboard
 from views.driver_dashboard import DriverDashboard
+from utils.scheduler import create_lifecycle_scheduler
+from utils.notifications import NotificationWorker, create_channels
+from utils.constants import PROFILE
+from utils.profiler import UIProfiler
 
 class TaxiBookingApp:
     
     def __init__(self):
+        self.profiler = None
+        if PROFILE['ENABLED'] or os.environ.get('TAXI_PROFILE') == '1':
+            self.profiler = UIProfiler().install((Database, ShardRouter))
         self.db = Database()
+        # Per-city shard files (none unless SHARDS is configured)
+        self.shards = ShardRouter(self.db)
+        # Lifecycle jobs run on their own thread and connection, one
+        # scheduler per database file, each with a notification worker
+        self.notifiers = [NotificationWorker(create_channels(db.db_name)) for db in self.shards.all()]
+        self.schedulers = [create_lifecycle_scheduler(db.db_name, notifier)
+                           for db, notifier in zip(self.shards.all(), self.notifiers)]
+        for scheduler in self.schedulers:
+            scheduler.start()
         self.current_window = None
+        # (token, user) of recent logins on this terminal, for the quick switch
+        self.recent_sessions = []
+        # Token of the session the open dashboard belongs to
+        self.session = None
         self.show_login()
     
     def show_login(self, fullscreen=False, geometry=None):
@@ -23,13 +45,25 @@ class TaxiBookingApp:
         
         root = tk.Tk()
         self.current_window = root
-        LoginWindow(root, self.db, self.on_login_success, fullscreen, geometry)
+        if self.profiler:
+            self.profiler.attach(root)
+        LoginWindow(root, self.db, self.on_login_success, fullscreen, geometry, self.recent_sessions)
         root.update_idletasks()  # Ensure geometry is applied
         root.mainloop()
     
-    def on_login_success(self, user_data, fullscreen=False, geometry=None):
+    def logout(self, fullscreen=False, geometry=None, keep_session=False):
+        """Return to the login window, ending the session unless the user is
+        only switching and wants it kept for the quick switch"""
+        if self.session and not keep_session:
+            self.db.revoke_session(self.session)
+            self.recent_sessions[:] = [entry for entry in self.recent_sessions if entry[0] != self.session]
+        self.session = None
+        self.show_login(fullscreen, geometry)
+    
+    def on_login_success(self, user_data, fullscreen=False, geometry=None, session=None):
         """Handle successful login"""
         user_id, username, role, name = user_data
+        self.session = session
         
         if self.current_window:
             try:
@@ -40,13 +74,18 @@ class TaxiBookingApp:
         
         root = tk.Tk()
         self.current_window = root
+        if self.profiler:
+            self.profiler.attach(root)
         
+        # Customers and drivers work in their own city's database
+        shards = self.shards if self.shards.enabled else None
+        db = self.shards.for_user(user_id) if shards else self.db
         if role == 'Customer':
-            CustomerDashboard(root, self.db, user_data, self.show_login, fullscreen, geometry)
+            CustomerDashboard(root, db, user_data, self.logout, fullscreen, geometry, shards)
         elif role == 'Admin':
-            AdminDashboard(root, self.db, user_data, self.show_login, fullscreen, geometry)
+            AdminDashboard(root, self.db, user_data, self.logout, fullscreen, geometry, shards)
         elif role == 'Driver':
-            DriverDashboard(root, self.db, user_data, self.show_login, fullscreen, geometry)
+            DriverDashboard(root, db, user_data, self.logout, fullscreen, geometry)
         
         root.update_idletasks()  # Ensure geometry is applied
         root.mainloop()
@@ -54,3 +93,11 @@ class TaxiBookingApp:
 
 if __name__ == "__main__":
     app = TaxiBookingApp()
+    for scheduler in app.schedulers:
+        scheduler.stop()
+    for notifier in app.notifiers:
+        notifier.close()
+    app.shards.close()
+    app.db.close()
+    if app.profiler:
+        app.profiler.close()
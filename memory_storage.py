@@ -0,0 +1,611 @@
+"""In-memory storage backend, for simulations and benchmarks"""
+import hashlib
+import secrets
+import threading
+import time
+from bisect import bisect_left, insort
+from datetime import date, timedelta
+from itertools import islice
+from database import BOOKING_LISTS
+from models.availability import AvailabilityIndex
+from models.recurrence import RecurrenceRule
+from models.sessions import hash_token
+from models.shifts import ShiftCalendar
+from models.zone_counters import ZoneCounters
+from storage import Storage
+from utils.constants import BOOKING_STATUS, ASSIGN_RESULT, RECURRENCE, BOOKING_EVENT, SESSIONS, SHIFTS
+from utils.timestamps import to_pickup_ts, prefix_range, day_bounds
+
+CLOSED = (BOOKING_STATUS['CANCELLED'], BOOKING_STATUS['COMPLETED'])
+
+# Python counterparts of the BOOKING_LISTS column expressions, taking
+# (storage, booking)
+COLUMN_VALUES = {
+    'ID': lambda store, b: b['booking_id'],
+    'Customer': lambda store, b: store.users[b['customer_id']][4],
+    'Phone': lambda store, b: store.users[b['customer_id']][5],
+    'Pickup': lambda store, b: b['pickup_location'],
+    'Dropoff': lambda store, b: b['dropoff_location'],
+    'Date': lambda store, b: b['booking_date'],
+    'Time': lambda store, b: b['booking_time'],
+    'Driver': lambda store, b: store.users[b['driver_id']][4] if b['driver_id'] in store.users else 'Not Assigned',
+    'Status': lambda store, b: b['status']
+}
+EXTRA_VALUES = {
+    'b.version': 'version',
+    'b.pickup_ts': 'pickup_ts',
+    'b.overdue': 'overdue'
+}
+
+
+class TimeIndex:
+    """(pickup_ts, booking_id) pairs kept sorted, per key.
+
+    The in-memory counterpart of the pickup_ts indexes: ranges and
+    time-ordered walks are bisections and slices of a sorted list.
+    """
+
+    def __init__(self):
+        self.keys = {}
+
+    def add(self, key, pickup_ts, booking_id):
+        insort(self.keys.setdefault(key, []), (pickup_ts, booking_id))
+
+    def remove(self, key, pickup_ts, booking_id):
+        entries = self.keys.get(key, [])
+        index = bisect_left(entries, (pickup_ts, booking_id))
+        if index < len(entries) and entries[index] == (pickup_ts, booking_id):
+            del entries[index]
+
+    def between(self, key, start_ts, end_ts):
+        """Booking ids for key picking up in [start_ts, end_ts), in time order"""
+        entries = self.keys.get(key, [])
+        low = bisect_left(entries, (start_ts,))
+        high = bisect_left(entries, (end_ts,))
+        return [booking_id for _, booking_id in entries[low:high]]
+
+    def walk(self, key, descending):
+        entries = self.keys.get(key, [])
+        return (booking_id for _, booking_id in (reversed(entries) if descending else entries))
+
+
+class MemoryStorage(Storage):
+    """Users, bookings and rules in dicts, with sorted indexes by time.
+
+    Bookings are dicts keyed by column name. Three TimeIndexes stand in
+    for the SQLite indexes: all bookings, per customer and per driver.
+    Writes take one lock, like a transaction. Nothing is persisted.
+    """
+
+    def __init__(self, db_name=':memory:'):
+        self.db_name = db_name
+        self._lock = threading.RLock()
+        self.availability = AvailabilityIndex()
+        self.zone_counters = ZoneCounters()
+        self.shift_calendar = ShiftCalendar()
+        self.users = {}
+        self.usernames = {}
+        self.bookings = {}
+        self.booking_ids = []
+        self.by_time = TimeIndex()
+        self.by_customer = TimeIndex()
+        self.by_driver = TimeIndex()
+        self.rules = {}
+        self.occurrences = {}
+        self.travel_times = {}
+        self.events = []
+        self.event_drivers = {}
+        self.sync_ops = {}
+        self.sessions = {}
+        self.shifts = {}
+        self.shift_revision = 0
+        self.next_shift_id = 1
+        self.next_user_id = 1
+        self.next_booking_id = 1
+        self.next_rule_id = 1
+        self.create_user('admin', 'admin123', 'Admin', 'System Admin', '1234567890')
+
+    # Users
+
+    @staticmethod
+    def _hash(password):
+        return hashlib.sha256(password.encode()).hexdigest()
+
+    def authenticate(self, username, password):
+        user = self.users.get(self.usernames.get(username))
+        if user and user[2] == self._hash(password):
+            return user[0], user[1], user[3], user[4]
+        return None
+
+    def create_user(self, username, password, role, name, phone, city=None):
+        with self._lock:
+            if username in self.usernames:
+                return False
+            user_id = self.next_user_id
+            self.next_user_id += 1
+            self.users[user_id] = (user_id, username, self._hash(password), role, name, phone, city)
+            self.usernames[username] = user_id
+            return True
+
+    def get_user(self, user_id=None, username=None):
+        if user_id is None:
+            user_id = self.usernames.get(username)
+        return self.users.get(user_id)
+
+    def create_session(self, user_id, ttl=SESSIONS['TTL']):
+        token = secrets.token_urlsafe(32)
+        with self._lock:
+            self.sessions[hash_token(token)] = [user_id, int(time.time()) + ttl, False]
+        return token
+    
+    def resume_session(self, token):
+        session = self.sessions.get(hash_token(token))
+        if not session or session[2] or session[1] <= int(time.time()):
+            return None
+        user = self.users[session[0]]
+        return user[0], user[1], user[3], user[4]
+    
+    def revoke_session(self, token):
+        session = self.sessions.get(hash_token(token))
+        if session:
+            session[2] = True
+    
+    def revoke_user_sessions(self, user_id):
+        for session in self.sessions.values():
+            if session[0] == user_id:
+                session[2] = True
+    
+    def get_all_drivers(self, city=None):
+        return [(user[0], user[4]) for user in self.users.values()
+                if user[3] == 'Driver' and (not city or user[6] == city)]
+
+    # Bookings
+
+    def _insert(self, customer_id, pickup, dropoff, booking_date, booking_time,
+                rule_id=None, occurrence_date=None):
+        booking_id = self.next_booking_id
+        self.next_booking_id += 1
+        pickup_ts = to_pickup_ts(booking_date, booking_time)
+        self.bookings[booking_id] = {
+            'booking_id': booking_id, 'customer_id': customer_id, 'driver_id': None,
+            'pickup_location': pickup, 'dropoff_location': dropoff,
+            'booking_date': booking_date, 'booking_time': booking_time, 'pickup_ts': pickup_ts,
+            'status': BOOKING_STATUS['PENDING'], 'version': 0,
+            'rule_id': rule_id, 'occurrence_date': occurrence_date, 'overdue': 0
+        }
+        self.booking_ids.append(booking_id)
+        self.by_time.add(None, pickup_ts, booking_id)
+        self.by_customer.add(customer_id, pickup_ts, booking_id)
+        self._log(booking_id, BOOKING_EVENT['CREATED'], None)
+        return booking_id
+
+    def _set_driver(self, booking, driver_id):
+        if booking['driver_id'] is not None:
+            self.by_driver.remove(booking['driver_id'], booking['pickup_ts'], booking['booking_id'])
+        if driver_id is not None:
+            self.by_driver.add(driver_id, booking['pickup_ts'], booking['booking_id'])
+        booking['driver_id'] = driver_id
+
+    def _log(self, booking_id, event, driver_id):
+        self.events.append((booking_id, event, driver_id))
+        if driver_id is not None:
+            self.event_drivers.setdefault(booking_id, set()).add(driver_id)
+        booking = self.bookings[booking_id]
+        self.zone_counters.apply(booking_id, event, driver_id, booking['pickup_location'],
+                                 booking['dropoff_location'])
+
+    def _driver_busy(self, driver_id, pickup_ts, booking_id=None):
+        """Whether the driver holds another open booking at pickup_ts"""
+        return any(other != booking_id and self.bookings[other]['status'] not in CLOSED
+                   for other in self.by_driver.between(driver_id, pickup_ts, pickup_ts + 1))
+
+    def book_taxi(self, customer_id, pickup, dropoff, booking_date, booking_time):
+        with self._lock:
+            return self._insert(customer_id, pickup, dropoff, booking_date, booking_time)
+
+    def import_bookings(self, bookings):
+        # Bad dates fail before anything is stored, as in one transaction
+        for _, _, _, booking_date, booking_time in bookings:
+            to_pickup_ts(booking_date, booking_time)
+        with self._lock:
+            for row in bookings:
+                self._insert(*row)
+        return len(bookings)
+
+    def update_booking(self, booking_id, pickup, dropoff, booking_date, booking_time):
+        pickup_ts = to_pickup_ts(booking_date, booking_time)
+        with self._lock:
+            booking = self.bookings.get(booking_id)
+            if not booking or booking['status'] in CLOSED:
+                return False
+            driver_id, previous_ts = booking['driver_id'], booking['pickup_ts']
+            if driver_id is not None and self._driver_busy(driver_id, pickup_ts, booking_id):
+                return False
+            self._set_driver(booking, None)
+            self.by_time.remove(None, previous_ts, booking_id)
+            self.by_customer.remove(booking['customer_id'], previous_ts, booking_id)
+            booking.update(pickup_location=pickup, dropoff_location=dropoff, booking_date=booking_date,
+                           booking_time=booking_time, pickup_ts=pickup_ts, version=booking['version'] + 1)
+            self.by_time.add(None, pickup_ts, booking_id)
+            self.by_customer.add(booking['customer_id'], pickup_ts, booking_id)
+            self._set_driver(booking, driver_id)
+            self._log(booking_id, BOOKING_EVENT['UPDATED'], driver_id)
+        self.availability.release(driver_id, previous_ts)
+        self.availability.book(driver_id, pickup_ts)
+        return True
+
+    def get_booking_status(self, booking_id):
+        booking = self.bookings.get(booking_id)
+        return booking['status'] if booking else None
+
+    def list_bookings(self, view, owner_id=None, sort_by='Date', descending=True,
+                      filters=None, limit=100, offset=0):
+        spec = BOOKING_LISTS[view]
+        headings = list(spec['columns'])
+        tests = [self._filter(spec['columns'], heading, value) for heading, value in (filters or {}).items()]
+        if spec['owner'] == 'b.customer_id':
+            index = self.by_customer.keys.get(owner_id, [])
+        elif spec['owner'] == 'b.driver_id':
+            index = self.by_driver.keys.get(owner_id, [])
+        else:
+            index = self.by_time.keys.get(None, [])
+        # Admin and driver lists inner-join the customer
+        joined = view != 'customer'
+
+        def matches(booking):
+            return ((not joined or booking['customer_id'] in self.users)
+                    and all(test(booking) for test in tests))
+
+        entries = reversed(index) if descending else index
+        candidates = (self.bookings[booking_id] for _, booking_id in entries)
+        if sort_by == 'Date':
+            # Already in (pickup_ts, booking_id) order
+            page = islice((b for b in candidates if matches(b)), offset, offset + limit)
+        else:
+            value = COLUMN_VALUES[sort_by]
+            rows = sorted((b for b in candidates if matches(b)), reverse=descending,
+                          key=lambda b: (sort_key(value(self, b)), b['pickup_ts'], b['booking_id']))
+            page = rows[offset:offset + limit]
+        return [tuple(COLUMN_VALUES[heading](self, b) for heading in headings)
+                + tuple(b[EXTRA_VALUES[expr]] for expr in spec['extra'])
+                for b in page]
+
+    def _filter(self, columns, heading, value):
+        """A test on a booking matching booking_list_filters"""
+        if heading not in columns:
+            raise KeyError(heading)
+        if heading == 'ID':
+            booking_id = int(value)
+            return lambda b: b['booking_id'] == booking_id
+        if heading == 'Date' and prefix_range(value):
+            start_ts, end_ts = prefix_range(value)
+            return lambda b: start_ts <= b['pickup_ts'] < end_ts
+        column = COLUMN_VALUES[heading]
+        high = value + '\uffff'
+
+        def test(b):
+            found = column(self, b)
+            return isinstance(found, str) and value <= found < high
+        return test
+
+    def get_bookings_between(self, start_ts, end_ts, status=None, driver_id=None):
+        if driver_id is not None:
+            booking_ids = self.by_driver.between(driver_id, start_ts, end_ts)
+        else:
+            booking_ids = self.by_time.between(None, start_ts, end_ts)
+        rows = []
+        for booking_id in booking_ids:
+            b = self.bookings[booking_id]
+            if status is None or b['status'] == status:
+                rows.append((booking_id, b['customer_id'], b['driver_id'], b['pickup_location'],
+                             b['dropoff_location'], b['pickup_ts'], b['status']))
+        return rows
+
+    def count_bookings_by_day(self, start_ts, end_ts):
+        counts = {}
+        for booking_id in self.by_time.between(None, start_ts, end_ts):
+            b = self.bookings[booking_id]
+            key = (b['booking_date'], b['status'])
+            counts[key] = counts.get(key, 0) + 1
+        return [key + (count,) for key, count in sorted(counts.items())]
+
+    def get_max_booking_id(self):
+        return self.booking_ids[-1] if self.booking_ids else 0
+
+    def iter_pickups(self, after_id, chunk_size):
+        start = bisect_left(self.booking_ids, after_id + 1)
+        for first in range(start, len(self.booking_ids), chunk_size):
+            yield [(booking_id, self.bookings[booking_id]['pickup_ts'],
+                    self.bookings[booking_id]['pickup_location'], self.bookings[booking_id]['status'])
+                   for booking_id in self.booking_ids[first:first + chunk_size]]
+
+    def get_booking_changes(self, since=0):
+        # Revisions are positions in the event list, as for get_driver_changes
+        with self._lock:
+            revision = len(self.events)
+            booking_ids = sorted({booking_id for booking_id, _, _ in self.events[since:]})
+            return revision, [(booking_id, self.bookings[booking_id]['pickup_ts'],
+                               self.bookings[booking_id]['pickup_location'], self.bookings[booking_id]['status'])
+                              for booking_id in booking_ids if booking_id in self.bookings]
+
+    # Assignment and trip lifecycle
+
+    def assign_drivers(self, booking_ids, driver_id, versions=None):
+        updated, rejected = [], {}
+        versions = versions or {}
+        previous = {}
+        with self._lock:
+            requested = set(booking_ids)
+            busy = {self.bookings[other]['pickup_ts'] for other in self.by_driver.walk(driver_id, False)
+                    if other not in requested and self.bookings[other]['status'] not in CLOSED}
+            for booking_id in booking_ids:
+                booking = self.bookings.get(booking_id)
+                if not booking:
+                    rejected[booking_id] = ASSIGN_RESULT['NOT_FOUND']
+                elif booking_id in versions and versions[booking_id] != booking['version']:
+                    rejected[booking_id] = ASSIGN_RESULT['STALE']
+                elif booking['status'] in CLOSED:
+                    rejected[booking_id] = ASSIGN_RESULT['CLOSED']
+                elif self._off_shift(driver_id, booking['pickup_ts']):
+                    rejected[booking_id] = ASSIGN_RESULT['OFF_SHIFT']
+                elif booking['pickup_ts'] in busy:
+                    rejected[booking_id] = ASSIGN_RESULT['CONFLICT']
+                else:
+                    busy.add(booking['pickup_ts'])
+                    updated.append(booking_id)
+            for booking_id in updated:
+                previous[booking_id] = self._assign(self.bookings[booking_id], driver_id)
+        for booking_id in updated:
+            pickup_ts = self.bookings[booking_id]['pickup_ts']
+            self.availability.release(previous[booking_id], pickup_ts)
+            self.availability.book(driver_id, pickup_ts)
+        return updated, rejected
+
+    def _assign(self, booking, driver_id):
+        """Give the booking to driver_id; returns the previous driver"""
+        previous = booking['driver_id']
+        self._set_driver(booking, driver_id)
+        booking['status'] = BOOKING_STATUS['ASSIGNED']
+        booking['version'] += 1
+        self._log(booking['booking_id'], BOOKING_EVENT['ASSIGNED'], driver_id)
+        return previous
+
+    def assign_driver(self, booking_id, driver_id, version=None):
+        with self._lock:
+            booking = self.bookings.get(booking_id)
+            if not booking:
+                return ASSIGN_RESULT['NOT_FOUND']
+            if version is not None and booking['version'] != version:
+                return ASSIGN_RESULT['STALE']
+            if booking['status'] in CLOSED:
+                return ASSIGN_RESULT['CLOSED']
+            if self._off_shift(driver_id, booking['pickup_ts']):
+                return ASSIGN_RESULT['OFF_SHIFT']
+            if self._driver_busy(driver_id, booking['pickup_ts'], booking_id):
+                return ASSIGN_RESULT['CONFLICT']
+            previous = self._assign(booking, driver_id)
+        self.availability.release(previous, booking['pickup_ts'])
+        self.availability.book(driver_id, booking['pickup_ts'])
+        return ASSIGN_RESULT['OK']
+
+    def _off_shift(self, driver_id, pickup_ts):
+        """Whether driver_id has shifts but none covering pickup_ts"""
+        shifts = [(start_ts, end_ts) for shift_driver, start_ts, end_ts in self.shifts.values()
+                  if shift_driver == driver_id]
+        return bool(shifts) and not any(start_ts <= pickup_ts < end_ts for start_ts, end_ts in shifts)
+
+    def _close_bookings(self, booking_ids, new_status, release_driver=False):
+        updated, rejected = [], {}
+        released = []
+        with self._lock:
+            for booking_id in booking_ids:
+                booking = self.bookings.get(booking_id)
+                if not booking:
+                    rejected[booking_id] = ASSIGN_RESULT['NOT_FOUND']
+                elif booking['status'] in CLOSED:
+                    rejected[booking_id] = ASSIGN_RESULT['CLOSED']
+                else:
+                    updated.append(booking_id)
+            if new_status == BOOKING_STATUS['COMPLETED']:
+                event = BOOKING_EVENT['COMPLETED']
+            else:
+                event = BOOKING_EVENT['DRIVER_CANCELLED' if release_driver else 'CANCELLED']
+            for booking_id in updated:
+                booking = self.bookings[booking_id]
+                released.append((booking['driver_id'], booking['pickup_ts']))
+                self._log(booking_id, event, booking['driver_id'])
+                booking['status'] = new_status
+                booking['version'] += 1
+                if release_driver:
+                    self._set_driver(booking, None)
+        for driver_id, pickup_ts in released:
+            self.availability.release(driver_id, pickup_ts)
+        return updated, rejected
+
+    def cancel_bookings(self, booking_ids):
+        return self._close_bookings(booking_ids, BOOKING_STATUS['CANCELLED'])
+
+    def complete_trips(self, booking_ids):
+        return self._close_bookings(booking_ids, BOOKING_STATUS['COMPLETED'])
+
+    def cancel_trips(self, booking_ids):
+        return self._close_bookings(booking_ids, BOOKING_STATUS['CANCELLED'], release_driver=True)
+
+    def check_driver_availability(self, driver_id, booking_date, booking_time):
+        pickup_ts = to_pickup_ts(booking_date, booking_time)
+        self.load_shifts()
+        return self.shift_calendar.on_shift(driver_id, pickup_ts) and not self._driver_busy(driver_id, pickup_ts)
+
+    # Driver shifts
+    
+    def add_shifts(self, shifts):
+        rows = [(driver_id, int(start_ts), int(end_ts)) for driver_id, start_ts, end_ts in shifts]
+        if any(end_ts <= start_ts for _, start_ts, end_ts in rows):
+            raise ValueError("A shift must end after it starts")
+        with self._lock:
+            for row in rows:
+                self.shifts[self.next_shift_id] = row
+                self.next_shift_id += 1
+            self.shift_revision += 1
+        return len(rows)
+    
+    def delete_shifts(self, shift_ids):
+        with self._lock:
+            deleted = sum(self.shifts.pop(shift_id, None) is not None for shift_id in shift_ids)
+            self.shift_revision += 1
+        return deleted
+    
+    def clear_shifts(self, driver_ids, start_ts, end_ts):
+        drivers = set(driver_ids)
+        with self._lock:
+            doomed = [shift_id for shift_id, (driver_id, shift_start, _) in self.shifts.items()
+                      if driver_id in drivers and start_ts <= shift_start < end_ts]
+            for shift_id in doomed:
+                del self.shifts[shift_id]
+            self.shift_revision += 1
+        return len(doomed)
+    
+    def get_shifts(self, driver_ids, start_ts, end_ts):
+        drivers = set(driver_ids)
+        return sorted(((shift_id,) + row for shift_id, row in self.shifts.items()
+                       if row[0] in drivers and row[1] < end_ts and row[2] > start_ts),
+                      key=lambda row: (row[1], row[2], row[0]))
+    
+    def load_shifts(self):
+        if self.shift_revision == self.shift_calendar.revision:
+            return
+        cutoff = int(time.time()) - SHIFTS['LOOKBACK_DAYS'] * 86400
+        with self._lock:
+            drivers = {driver_id for driver_id, _, _ in self.shifts.values()}
+            rows = sorted(row for row in self.shifts.values() if row[2] > cutoff)
+            self.shift_calendar.load(self.shift_revision, drivers, rows)
+    
+    def load_zone_counters(self):
+        # Every event is counted as _log records it
+        pass
+
+    def sync_availability(self):
+        # Only this object writes, and it keeps the bitmaps current itself
+        pass
+
+    def load_availability(self, pickup_ts_list):
+        days = sorted({AvailabilityIndex.day_of(pickup_ts) for pickup_ts in pickup_ts_list
+                       if not self.availability.is_loaded(pickup_ts)})
+        if not days:
+            return
+        start_ts, end_ts = day_bounds(days[0])[0], day_bounds(days[-1])[1]
+        booked = [(b['driver_id'], b['pickup_ts'])
+                  for b in (self.bookings[booking_id] for booking_id in self.by_time.between(None, start_ts, end_ts))
+                  if b['driver_id'] is not None and b['status'] not in CLOSED]
+        self.availability.load_days(days[0], days[-1], booked)
+
+    # Recurring bookings
+
+    def create_recurring_booking(self, customer_id, pickup, dropoff, booking_time,
+                                 start_date, frequency, interval_days=1, until_date=None):
+        with self._lock:
+            rule_id = self.next_rule_id
+            self.next_rule_id += 1
+            self.rules[rule_id] = [(rule_id, customer_id, pickup, dropoff, booking_time,
+                                    start_date, frequency, interval_days, until_date), True]
+        self.materialize_due_occurrences()
+        return rule_id
+
+    def stop_recurring_booking(self, rule_id):
+        with self._lock:
+            if rule_id not in self.rules:
+                return False
+            self.rules[rule_id][1] = False
+            return True
+
+    def get_recurring_rules(self, customer_id=None):
+        return [RecurrenceRule(*row) for row, active in self.rules.values()
+                if active and (customer_id is None or row[1] == customer_id)]
+
+    def iter_occurrences(self, window_start, window_end, customer_id=None):
+        for rule in self.get_recurring_rules(customer_id):
+            for day in rule.occurrences(window_start, window_end):
+                if (rule.rule_id, day.isoformat()) not in self.occurrences:
+                    yield rule, day
+
+    def _insert_occurrences(self, occurrences):
+        for rule, day in occurrences:
+            key = (rule.rule_id, day.isoformat())
+            if key not in self.occurrences:
+                self.occurrences[key] = self._insert(rule.customer_id, rule.pickup, rule.dropoff,
+                                                     day.isoformat(), rule.booking_time, *key)
+
+    def materialize_occurrence(self, rule_id, occurrence_date):
+        with self._lock:
+            if rule_id not in self.rules:
+                return None
+            rule = RecurrenceRule(*self.rules[rule_id][0])
+            self._insert_occurrences([(rule, date.fromisoformat(occurrence_date))])
+            return self.occurrences[(rule_id, occurrence_date)]
+
+    def materialize_due_occurrences(self, horizon_days=RECURRENCE['DISPATCH_HORIZON_DAYS']):
+        today = date.today()
+        with self._lock:
+            due = list(self.iter_occurrences(today, today + timedelta(days=horizon_days)))
+            self._insert_occurrences(due)
+        return len(due)
+
+    # Route planning
+
+    def set_travel_times(self, rows):
+        with self._lock:
+            for origin, destination, km, minutes in rows:
+                self.travel_times[(origin, destination)] = (km, minutes)
+
+    def get_travel_times(self):
+        return dict(self.travel_times)
+
+    # Driver replica sync; revisions are positions in the event list
+
+    def get_driver_changes(self, driver_id, since=0):
+        with self._lock:
+            revision = len(self.events)
+            if not since:
+                booking_ids = [booking_id for _, booking_id in self.by_driver.keys.get(driver_id, [])]
+            else:
+                booking_ids = sorted({booking_id for booking_id, _, _ in self.events[since:]})
+            rows = []
+            for booking_id in booking_ids:
+                b = self.bookings.get(booking_id)
+                if not b or b['customer_id'] not in self.users:
+                    continue
+                if b['driver_id'] != driver_id and driver_id not in self.event_drivers.get(booking_id, ()):
+                    continue
+                customer = self.users[b['customer_id']]
+                rows.append((booking_id, b['customer_id'], customer[4], customer[5], b['driver_id'],
+                             b['pickup_location'], b['dropoff_location'], b['booking_date'],
+                             b['booking_time'], b['pickup_ts'], b['status'], b['version']))
+            return revision, rows
+
+    def apply_driver_ops(self, driver_id, ops):
+        results = {}
+        with self._lock:
+            for op_id, booking_id, new_status in ops:
+                if op_id in self.sync_ops:
+                    results[op_id] = self.sync_ops[op_id]
+                    continue
+                booking = self.bookings.get(booking_id)
+                if not booking:
+                    result = ASSIGN_RESULT['NOT_FOUND']
+                elif booking['driver_id'] != driver_id:
+                    result = ASSIGN_RESULT['REASSIGNED']
+                else:
+                    release = new_status == BOOKING_STATUS['CANCELLED']
+                    _, rejected = self._close_bookings([booking_id], new_status, release_driver=release)
+                    result = rejected.get(booking_id, ASSIGN_RESULT['OK'])
+                results[op_id] = self.sync_ops[op_id] = result
+        return results
+
+
+def sort_key(value):
+    """Order values as SQLite does: NULL first, then numbers, then text"""
+    if value is None:
+        return (0, 0)
+    if isinstance(value, str):
+        return (2, value)
+    return (1, value)
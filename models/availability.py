@@ -0,0 +1,83 @@
+"""Driver availability bitmaps"""
+from datetime import datetime, date
+
+
+class AvailabilityIndex:
+    """Per-day, per-driver bitmaps of booked slots.
+
+    Each driver-day is a bytearray with one bit per slot, so checking or
+    updating a slot is a couple of integer operations. Days are loaded
+    from the database in bulk and then kept current by the Database write
+    methods; days that were never loaded are simply unknown. Writes made
+    by other processes only show up in the booking events, so the storage
+    drops the days those touch (see Storage.sync_availability);
+    last_event_id is the newest event checked so far, or None before the
+    first check.
+    """
+
+    def __init__(self, slot_minutes=1):
+        self.slot_seconds = slot_minutes * 60
+        self.slots_per_day = 24 * 3600 // self.slot_seconds
+        self.days = {}
+        self.last_event_id = None
+
+    def locate(self, pickup_ts):
+        """Map a timestamp to (day ordinal, slot number) in local time"""
+        moment = datetime.fromtimestamp(pickup_ts)
+        seconds = moment.hour * 3600 + moment.minute * 60 + moment.second
+        return moment.toordinal(), seconds // self.slot_seconds
+
+    def is_loaded(self, pickup_ts):
+        return self.locate(pickup_ts)[0] in self.days
+
+    def load_days(self, first_day, last_day, booked):
+        """Replace the bitmaps for first_day..last_day (date objects) from (driver_id, pickup_ts) rows"""
+        for ordinal in range(first_day.toordinal(), last_day.toordinal() + 1):
+            self.days[ordinal] = {}
+        for driver_id, pickup_ts in booked:
+            self.book(driver_id, pickup_ts)
+
+    def forget(self, pickup_ts_list):
+        """Drop the days touched by pickup_ts_list, so they are loaded afresh"""
+        for pickup_ts in pickup_ts_list:
+            self.days.pop(self.locate(pickup_ts)[0], None)
+
+    def book(self, driver_id, pickup_ts):
+        self._set(driver_id, pickup_ts, True)
+
+    def release(self, driver_id, pickup_ts):
+        self._set(driver_id, pickup_ts, False)
+
+    def _set(self, driver_id, pickup_ts, booked):
+        if driver_id is None or pickup_ts is None:
+            return
+        day, slot = self.locate(pickup_ts)
+        drivers = self.days.get(day)
+        if drivers is None:
+            return
+        bitmap = drivers.get(driver_id)
+        if bitmap is None:
+            if not booked:
+                return
+            bitmap = drivers[driver_id] = bytearray((self.slots_per_day + 7) // 8)
+        if booked:
+            bitmap[slot >> 3] |= 1 << (slot & 7)
+        else:
+            bitmap[slot >> 3] &= ~(1 << (slot & 7)) & 0xFF
+
+    def is_free(self, driver_id, pickup_ts):
+        day, slot = self.locate(pickup_ts)
+        bitmap = self.days.get(day, {}).get(driver_id)
+        return bitmap is None or not bitmap[slot >> 3] & (1 << (slot & 7))
+
+    def free_drivers(self, driver_ids, pickup_ts_list):
+        """Drivers free in every one of the given slots"""
+        return [driver_id for driver_id in driver_ids
+                if all(self.is_free(driver_id, pickup_ts) for pickup_ts in pickup_ts_list)]
+
+    def clear(self):
+        self.days.clear()
+
+    @staticmethod
+    def day_of(pickup_ts):
+        return date.fromtimestamp(pickup_ts)
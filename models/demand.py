@@ -0,0 +1,187 @@
+"""Pickup demand by hour of week and location, and forecasts from it"""
+import os
+import time
+import numpy as np
+from utils.constants import DEMAND, BOOKING_STATUS
+
+HOURS_PER_WEEK = 168
+OTHER_LOCATION = '(other)'
+
+
+def local_hours(stamps):
+    """Split epoch timestamps into local (week number, hour of week) arrays.
+
+    The UTC offset is looked up once per distinct hour, since DST changes
+    fall on the hour, and applied to the whole array at once. Weeks start
+    on Monday; the epoch fell on a Thursday, hence the +3 days.
+    """
+    stamps = np.asarray(stamps, dtype=np.int64)
+    hours, inverse = np.unique(stamps // 3600, return_inverse=True)
+    offsets = np.array([time.localtime(int(hour) * 3600).tm_gmtoff for hour in hours], dtype=np.int64)
+    local = stamps + offsets[inverse.reshape(-1)]
+    days = local // 86400 + 3
+    return days // 7, (days % 7) * 24 + (local % 86400) // 3600
+
+
+def current_week():
+    weeks, _ = local_hours([int(time.time())])
+    return int(weeks[0])
+
+
+class DemandModel:
+    """Pickup counts per week, hour of week and pickup location.
+
+    counts has shape (weeks, 168, locations) and is kept in a .npz file
+    next to the database. Cancelled bookings are not counted. update()
+    only streams bookings with ids above the last one counted, so
+    reopening the model costs one small query rather than a pass over the
+    whole history. Bookings still open can be edited or cancelled later,
+    so the cell each was counted in is kept too, and the bookings with
+    booking events since the last update are read again and moved or
+    taken out. Locations beyond MAX_LOCATIONS share the OTHER_LOCATION
+    column.
+    """
+
+    def __init__(self, db, cache_path=None):
+        self.db = db
+        self.cache_path = cache_path or os.path.splitext(db.db_name)[0] + '.demand.npz'
+        self.reset()
+        self.load()
+
+    def reset(self):
+        self.counts = np.zeros((0, HOURS_PER_WEEK, 1), dtype=np.int32)
+        self.locations = [OTHER_LOCATION]
+        self.location_index = {OTHER_LOCATION: 0}
+        self.first_week = None
+        self.last_booking_id = 0
+        self.revision = 0
+        # booking_id -> (week, hour of week, column) of counted open bookings
+        self.open_cells = {}
+
+    def load(self):
+        if not os.path.exists(self.cache_path):
+            return
+        with np.load(self.cache_path) as cache:
+            if 'open_cells' not in cache:
+                # Written before open bookings were tracked; count again
+                return
+            self.counts = cache['counts']
+            self.locations = [str(name) for name in cache['locations']]
+            first_week, self.last_booking_id, self.revision = (int(value) for value in cache['meta'])
+            self.open_cells = {int(row[0]): tuple(int(value) for value in row[1:]) for row in cache['open_cells']}
+        self.first_week = first_week if self.counts.shape[0] else None
+        self.location_index = {name: i for i, name in enumerate(self.locations)}
+        # A cache from a different or recreated database file
+        if self.last_booking_id > self.db.get_max_booking_id():
+            self.reset()
+
+    def save(self):
+        partial = self.cache_path + '.part'
+        with open(partial, 'wb') as cache:
+            open_cells = np.array([(booking_id,) + cell for booking_id, cell in self.open_cells.items()],
+                                  dtype=np.int64).reshape(-1, 4)
+            np.savez_compressed(cache, counts=self.counts, locations=np.array(self.locations),
+                                meta=np.array([self.first_week or 0, self.last_booking_id, self.revision]),
+                                open_cells=open_cells)
+        os.replace(partial, self.cache_path)
+
+    def update(self):
+        """Count bookings added since the last update and recount the open
+        ones changed since; returns how many were added"""
+        revision, changed = self.db.get_booking_changes(self.revision)
+        changed = [row for row in changed if row[0] in self.open_cells]
+        for booking_id, _, _, _ in changed:
+            week, hour, column = self.open_cells.pop(booking_id)
+            if week >= self.first_week:
+                self.counts[week - self.first_week, hour, column] -= 1
+        self._count(changed)
+        self.revision = revision
+
+        added = 0
+        for rows in self.db.iter_pickups(self.last_booking_id, DEMAND['CHUNK_SIZE']):
+            self._count(rows)
+            self.last_booking_id = rows[-1][0]
+            added += len(rows)
+        if added or changed:
+            self._trim()
+            self.save()
+        return added
+
+    def _count(self, rows):
+        """Add (booking_id, pickup_ts, pickup_location, status) rows that are not cancelled"""
+        rows = [row for row in rows if row[3] != BOOKING_STATUS['CANCELLED']]
+        if not rows:
+            return
+        booking_ids, stamps, places, statuses = zip(*rows)
+        weeks, hours = local_hours(stamps)
+        columns = np.array([self._column(place) for place in places])
+        self._grow(int(weeks.min()), int(weeks.max()))
+        np.add.at(self.counts, (weeks - self.first_week, hours, columns), 1)
+        for booking_id, status, week, hour, column in zip(booking_ids, statuses, weeks, hours, columns):
+            if status != BOOKING_STATUS['COMPLETED']:
+                self.open_cells[booking_id] = (int(week), int(hour), int(column))
+
+    def _column(self, place):
+        place = place.strip()
+        if place not in self.location_index:
+            if len(self.locations) >= DEMAND['MAX_LOCATIONS']:
+                return 0
+            self.location_index[place] = len(self.locations)
+            self.locations.append(place)
+        return self.location_index[place]
+
+    def _grow(self, min_week, max_week):
+        """Pad counts to cover min_week..max_week and every known location"""
+        if self.first_week is None:
+            self.first_week = min_week
+        last_week = self.first_week + self.counts.shape[0] - 1
+        start, end = min(self.first_week, min_week), max(last_week, max_week)
+        padding = ((self.first_week - start, end - last_week), (0, 0),
+                   (0, len(self.locations) - self.counts.shape[2]))
+        if any(before or after for before, after in padding):
+            self.counts = np.pad(self.counts, padding)
+        self.first_week = start
+
+    def _trim(self):
+        """Drop weeks older than HISTORY_WEEKS"""
+        oldest = current_week() - DEMAND['HISTORY_WEEKS']
+        if self.first_week is not None and self.first_week < oldest:
+            self.counts = self.counts[oldest - self.first_week:]
+            self.first_week = oldest
+            self.open_cells = {booking_id: cell for booking_id, cell in self.open_cells.items()
+                               if cell[0] >= oldest}
+
+    def forecast(self, weeks=DEMAND['FORECAST_WEEKS'], decay=DEMAND['DECAY']):
+        """Expected pickups per (hour of week, location) for the coming week.
+
+        An exponentially weighted average of the last weeks, the most
+        recent weighing most, computed for every cell at once.
+        """
+        if self.first_week is None:
+            return np.zeros((HOURS_PER_WEEK, len(self.locations)))
+        window = np.arange(current_week() - weeks, current_week()) - self.first_week
+        weights = decay ** np.arange(weeks)[::-1]
+        present = (window >= 0) & (window < self.counts.shape[0])
+        if not present.any():
+            return np.zeros((HOURS_PER_WEEK, self.counts.shape[2]))
+        return np.tensordot(weights[present], self.counts[window[present]], axes=1) / weights[present].sum()
+
+    def upcoming(self, hours):
+        """Forecast rows for the next hours, starting with the current hour"""
+        _, now = local_hours([int(time.time())])
+        return self.forecast()[(now[0] + np.arange(hours)) % HOURS_PER_WEEK]
+
+    def heatmap(self, hours=DEMAND['HEATMAP_HOURS'], rows=DEMAND['HEATMAP_ROWS']):
+        """(location names, matrix of rows x hours) for the busiest upcoming locations"""
+        upcoming = self.upcoming(hours)
+        totals = upcoming.sum(axis=0)
+        busiest = [column for column in np.argsort(-totals)[:rows] if totals[column] > 0]
+        return [self.locations[column] for column in busiest], upcoming[:, busiest].T
+
+    def hotspots(self, hours=DEMAND['HEATMAP_HOURS'], limit=DEMAND['HOTSPOTS']):
+        """(hours from now, location, expected pickups) for the busiest upcoming cells"""
+        upcoming = self.upcoming(hours)
+        cells = np.argsort(-upcoming, axis=None)[:limit]
+        hour_offsets, columns = np.unravel_index(cells, upcoming.shape)
+        return [(int(hour), self.locations[column], float(upcoming[hour, column]))
+                for hour, column in zip(hour_offsets, columns) if upcoming[hour, column] > 0]
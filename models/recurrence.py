@@ -0,0 +1,47 @@
+"""Recurring booking model"""
+from datetime import date, timedelta
+from utils.constants import RECURRENCE
+
+
+class RecurrenceRule:
+
+    def __init__(self, rule_id, customer_id, pickup, dropoff, booking_time,
+                 start_date, frequency, interval_days=1, until_date=None):
+        self.rule_id = rule_id
+        self.customer_id = customer_id
+        self.pickup = pickup
+        self.dropoff = dropoff
+        self.booking_time = booking_time
+        self.start_date = date.fromisoformat(start_date)
+        self.frequency = frequency
+        self.interval_days = max(1, interval_days or 1)
+        self.until_date = date.fromisoformat(until_date) if until_date else None
+
+    def occurrences(self, window_start, window_end):
+        """Yield occurrence dates between window_start and window_end inclusive.
+
+        Dates are generated on demand, so an open-ended rule costs nothing
+        beyond the window being looked at.
+        """
+        start = max(window_start, self.start_date)
+        end = min(window_end, self.until_date) if self.until_date else window_end
+        if start > end:
+            return
+
+        if self.frequency == RECURRENCE['WEEKDAYS']:
+            day = start
+            while day <= end:
+                if day.weekday() < 5:
+                    yield day
+                day += timedelta(days=1)
+        else:
+            # Align to the rule's own cycle rather than the window start
+            offset = -(start - self.start_date).days % self.interval_days
+            day = start + timedelta(days=offset)
+            step = timedelta(days=self.interval_days)
+            while day <= end:
+                yield day
+                day += step
+
+    def __repr__(self):
+        return f"RecurrenceRule({self.rule_id}, {self.frequency}, {self.booking_time})"
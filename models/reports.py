@@ -0,0 +1,153 @@
+"""Monthly driver reports over live and archived bookings"""
+import json
+import os
+import sqlite3
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from pathlib import Path
+from utils.backup import snapshot_path
+from utils.constants import REPORTS, BOOKING_STATUS, BOOKING_EVENT
+from utils.timestamps import prefix_range
+
+
+def months_between(start_month, end_month):
+    """'YYYY-MM' keys from start_month to end_month inclusive"""
+    year, month = (int(part) for part in start_month.split('-'))
+    months = []
+    while f"{year:04d}-{month:02d}" <= end_month:
+        months.append(f"{year:04d}-{month:02d}")
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+def month_partial(task):
+    """Aggregates for one month of one database file.
+
+    Runs in a worker process on its own read-only connection to the
+    file's reporting snapshot, inside one read transaction, so it never
+    touches the live database the dispatchers write to. Returns JSON-ready
+    rows: bookings grouped by (driver_id, pickup, dropoff, status), and
+    trips given up per driver.
+    """
+    path, month = task
+    start_ts, end_ts = prefix_range(month)
+    conn = sqlite3.connect(Path(os.path.abspath(path)).as_uri() + '?mode=ro', uri=True)
+    try:
+        conn.execute('BEGIN')
+        bookings = conn.execute('''
+            SELECT driver_id, pickup_location, dropoff_location, status, COUNT(*) FROM (
+                SELECT driver_id, pickup_location, dropoff_location, status FROM bookings
+                WHERE pickup_ts >= ? AND pickup_ts < ?
+                UNION ALL
+                SELECT driver_id, pickup_location, dropoff_location, status FROM bookings_archive
+                WHERE pickup_ts >= ? AND pickup_ts < ?
+            ) GROUP BY 1, 2, 3, 4
+        ''', (start_ts, end_ts, start_ts, end_ts)).fetchall()
+        # A driver's cancellation releases the booking, so only the event
+        # log still knows who gave it up. It counts in the month of the
+        # booking's pickup, like the bookings above, not of the event.
+        given_up = conn.execute('''
+            SELECT e.driver_id, COUNT(*) FROM (
+                SELECT booking_id FROM bookings
+                WHERE pickup_ts >= ? AND pickup_ts < ?
+                UNION ALL
+                SELECT booking_id FROM bookings_archive
+                WHERE pickup_ts >= ? AND pickup_ts < ?
+            ) AS b JOIN booking_events e ON e.booking_id = b.booking_id
+            WHERE e.event = ?
+            GROUP BY e.driver_id
+        ''', (start_ts, end_ts, start_ts, end_ts, BOOKING_EVENT['DRIVER_CANCELLED'])).fetchall()
+        conn.execute('COMMIT')
+    finally:
+        conn.close()
+    return {'bookings': [list(row) for row in bookings], 'given_up': [list(row) for row in given_up]}
+
+
+class ReportEngine:
+    """Per-month report aggregates for one or more database files.
+
+    Each (file, month) pair is an independent task, so they run in a
+    process pool and their partial aggregates are merged afterwards.
+    Tasks read each file's reporting snapshot (utils/backup.py), refreshed
+    first if it is out of date. Finished months are kept in a JSON cache
+    next to the first file; the current month (and later ones) is always
+    recomputed.
+    """
+
+    def __init__(self, db_names, cache_path=None):
+        self.db_names = list(db_names)
+        self.cache_path = cache_path or REPORTS['CACHE_FILE'].format(
+            base=os.path.splitext(self.db_names[0])[0])
+        self.cache = {}
+        if os.path.exists(self.cache_path):
+            with open(self.cache_path) as cache:
+                self.cache = json.load(cache)
+
+    def save(self):
+        partial = self.cache_path + '.part'
+        with open(partial, 'w') as cache:
+            json.dump(self.cache, cache)
+        os.replace(partial, self.cache_path)
+
+    def partials(self, months, workers=None):
+        """{month: [partial per database file]}, computing only what the cache lacks"""
+        current = date.today().strftime('%Y-%m')
+        tasks = [(db_name, month) for month in months for db_name in self.db_names
+                 if month >= current or month not in self.cache.get(db_name, {})]
+        snapshots = {db_name: snapshot_path(db_name) for db_name in {db_name for db_name, _ in tasks}}
+        work = [(snapshots[db_name], month) for db_name, month in tasks]
+        if len(work) <= 1 or workers == 1:
+            results = [month_partial(task) for task in work]
+        else:
+            with ProcessPoolExecutor(workers) as pool:
+                results = list(pool.map(month_partial, work))
+
+        fresh = {task: result for task, result in zip(tasks, results)}
+        finished = [(db_name, month) for db_name, month in fresh if month < current]
+        for db_name, month in finished:
+            self.cache.setdefault(db_name, {})[month] = fresh[(db_name, month)]
+        if finished:
+            self.save()
+        return {month: [fresh.get((db_name, month)) or self.cache[db_name][month]
+                        for db_name in self.db_names]
+                for month in months}
+
+    def driver_report(self, start_month, end_month, workers=None, top_routes=REPORTS['TOP_ROUTES']):
+        """Rows of (month, driver_id, trips, completed, cancelled, completion rate,
+        cancellation rate, busiest routes) per driver with trips, plus a
+        (month, None, bookings, ...) row for all bookings of the month.
+
+        Trips are bookings held by the driver plus those the driver gave
+        up; cancelled counts both those and bookings cancelled while
+        assigned. Routes are ((pickup, dropoff), count) pairs.
+        """
+        rows = []
+        for month, partials in self.partials(months_between(start_month, end_month), workers).items():
+            statuses = Counter()
+            drivers = {}
+            for partial in partials:
+                for driver_id, pickup, dropoff, status, count in partial['bookings']:
+                    statuses[status] += count
+                    if driver_id is None:
+                        continue
+                    totals, routes = drivers.setdefault(driver_id, (Counter(), Counter()))
+                    totals[status] += count
+                    routes[(pickup, dropoff)] += count
+                for driver_id, count in partial['given_up']:
+                    drivers.setdefault(driver_id, (Counter(), Counter()))[0]['given_up'] += count
+
+            rows.append(report_row(month, None, statuses, Counter(), top_routes))
+            for driver_id in sorted(drivers):
+                totals, routes = drivers[driver_id]
+                rows.append(report_row(month, driver_id, totals, routes, top_routes))
+        return rows
+
+
+def report_row(month, driver_id, totals, routes, top_routes):
+    trips = sum(totals.values())
+    completed = totals[BOOKING_STATUS['COMPLETED']]
+    cancelled = totals[BOOKING_STATUS['CANCELLED']] + totals['given_up']
+    return (month, driver_id, trips, completed, cancelled,
+            completed / trips if trips else 0.0, cancelled / trips if trips else 0.0,
+            routes.most_common(top_routes))
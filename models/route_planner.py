@@ -0,0 +1,200 @@
+"""Chaining each driver's trips for a day to cut empty kilometres"""
+import os
+from bisect import bisect
+from collections import Counter, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from utils.constants import ROUTES, BOOKING_STATUS
+from utils.timestamps import day_bounds
+
+# driver_id is the assigned driver, or None for a pending trip
+Trip = namedtuple('Trip', 'booking_id pickup dropoff pickup_ts driver_id')
+
+
+class TravelTable:
+    """Kilometres and minutes between known locations.
+
+    times maps (origin, destination) to (km, minutes). A pair missing in
+    one direction falls back to the other, and unknown pairs to the
+    ROUTES defaults.
+    """
+
+    def __init__(self, times):
+        self.times = times
+
+    def leg(self, origin, destination):
+        if origin == destination:
+            return 0.0, 0.0
+        return (self.times.get((origin, destination)) or self.times.get((destination, origin))
+                or (ROUTES['DEFAULT_KM'], ROUTES['DEFAULT_MINUTES']))
+
+    def free_at(self, trip):
+        """Epoch seconds at which a trip's dropoff is done"""
+        return trip.pickup_ts + int(self.leg(trip.pickup, trip.dropoff)[1] * 60)
+
+    def reaches(self, before, after):
+        """Whether a driver finishing before can make after's pickup in time"""
+        drive = self.leg(before.dropoff, after.pickup)[1] * 60
+        return self.free_at(before) + drive <= after.pickup_ts + ROUTES['LATE_TOLERANCE_MINUTES'] * 60
+
+
+def empty_km(chain, table):
+    """Kilometres driven empty between consecutive trips of a chain"""
+    return sum(table.leg(before.dropoff, after.pickup)[0] for before, after in zip(chain, chain[1:]))
+
+
+def insertion(chain, trip, table):
+    """(added empty km, position) for fitting trip into a chain, or None if it cannot be reached"""
+    position = bisect([other.pickup_ts for other in chain], trip.pickup_ts)
+    before = chain[position - 1] if position else None
+    after = chain[position] if position < len(chain) else None
+    if (before and not table.reaches(before, trip)) or (after and not table.reaches(trip, after)):
+        return None
+    added = 0.0
+    if before:
+        added += table.leg(before.dropoff, trip.pickup)[0]
+    if after:
+        added += table.leg(trip.dropoff, after.pickup)[0]
+    if before and after:
+        added -= table.leg(before.dropoff, after.pickup)[0]
+    return added, position
+
+
+def plan_day(chains, pending, table, passes=ROUTES['LOCAL_SEARCH_PASSES']):
+    """Propose which pending trips each driver should chain on one day.
+
+    chains maps driver_id to that driver's assigned trips, which stay
+    where they are. Pending trips are placed by cheapest insertion in
+    pickup order, then a local search moves proposed trips between
+    drivers while that lowers the empty kilometres. Trips no driver can
+    reach in time are left out. Returns {driver_id: chain} sorted by
+    pickup time, with proposed trips still carrying driver_id None.
+    """
+    chains = {driver_id: sorted(trips, key=lambda trip: trip.pickup_ts) for driver_id, trips in chains.items()}
+
+    def best_driver(trip, exclude=None):
+        best = None
+        for driver_id, chain in chains.items():
+            if driver_id == exclude:
+                continue
+            fit = insertion(chain, trip, table)
+            if fit and (best is None or fit[0] < best[1]):
+                best = (driver_id, fit[0], fit[1])
+        return best
+
+    for trip in sorted(pending, key=lambda trip: trip.pickup_ts):
+        best = best_driver(trip)
+        if best:
+            driver_id, _, position = best
+            chains[driver_id].insert(position, trip)
+
+    # Relocate proposed trips while that saves empty kilometres
+    for _ in range(passes):
+        improved = False
+        for driver_id, chain in chains.items():
+            for trip in [trip for trip in chain if trip.driver_id is None]:
+                index = chain.index(trip)
+                rest = chain[:index] + chain[index + 1:]
+                saving = empty_km(chain, table) - empty_km(rest, table)
+                best = best_driver(trip, exclude=driver_id)
+                if best and best[1] < saving - 1e-9:
+                    chain.remove(trip)
+                    chains[best[0]].insert(best[2], trip)
+                    improved = True
+        if not improved:
+            break
+    return chains
+
+
+def split_day(chains, pending, parts):
+    """Split one day's (chains, pending) into up to parts smaller ones by zone.
+
+    Pending trips are grouped by pickup location and the locations dealt
+    out so each part gets about the same number of trips. A driver goes
+    to the part holding most of their assigned pickups; drivers without
+    such trips are dealt to the parts with the most pending trips per
+    driver. A trip then only competes for the drivers of its own part,
+    so parts plan independently, at the price of never chaining a trip
+    across parts. Parts without pending trips are left out.
+    """
+    if parts <= 1 or not pending:
+        return [(chains, pending)]
+    by_zone = {}
+    for trip in pending:
+        by_zone.setdefault(trip.pickup, []).append(trip)
+    loads = [0] * parts
+    part_of = {}
+    for zone, trips in sorted(by_zone.items(), key=lambda item: (-len(item[1]), item[0])):
+        part = loads.index(min(loads))
+        part_of[zone] = part
+        loads[part] += len(trips)
+    tasks = [({}, []) for _ in range(parts)]
+    for zone, trips in by_zone.items():
+        tasks[part_of[zone]][1].extend(trips)
+    unplaced = []
+    for driver_id, trips in chains.items():
+        votes = Counter(part_of[trip.pickup] for trip in trips if trip.pickup in part_of)
+        if votes:
+            tasks[votes.most_common(1)[0][0]][0][driver_id] = trips
+        else:
+            unplaced.append(driver_id)
+    for driver_id in unplaced:
+        part = max(range(parts), key=lambda part: loads[part] / (len(tasks[part][0]) + 1))
+        tasks[part][0][driver_id] = chains[driver_id]
+    return [task for task in tasks if task[1]]
+
+
+def _plan_day_task(task):
+    chains, pending, times = task
+    return plan_day(chains, pending, TravelTable(times))
+
+
+def plan_days(tasks, times, workers=None):
+    """Run plan_day for several independent (chains, pending) days.
+
+    Days do not share trips, and a day with at least
+    ROUTES['SPLIT_MIN_TRIPS'] pending trips is split further by zone (see
+    split_day), so a single day with a large fleet is spread over the
+    process pool too. Work that makes a single task runs in-process.
+    """
+    workers = workers or os.cpu_count() or 1
+    work, owners = [], []
+    for day, (chains, pending) in enumerate(tasks):
+        parts = workers if len(pending) >= ROUTES['SPLIT_MIN_TRIPS'] else 1
+        for part in split_day(chains, pending, parts):
+            work.append(part)
+            owners.append(day)
+    if len(work) <= 1 or workers == 1:
+        results = [plan_day(chains, pending, TravelTable(times)) for chains, pending in work]
+    else:
+        with ProcessPoolExecutor(workers) as pool:
+            results = list(pool.map(_plan_day_task, [(chains, pending, times) for chains, pending in work]))
+    # Drivers of parts left out keep their assigned trips
+    plans = [{driver_id: sorted(trips, key=lambda trip: trip.pickup_ts) for driver_id, trips in chains.items()}
+             for chains, _ in tasks]
+    for day, chains in zip(owners, results):
+        plans[day].update(chains)
+    return plans
+
+
+def load_day(db, day, replica=None):
+    """(chains, pending) for plan_day from one day's open bookings in db.
+
+    With a driver's replica, that driver's trips are taken from it
+    instead, so trips closed on the terminal but not yet synced are left
+    out.
+    """
+    start_ts, end_ts = day_bounds(day)
+    chains = {driver_id: [] for driver_id, _ in db.get_all_drivers()}
+    pending = []
+    rows = db.get_bookings_between(start_ts, end_ts)
+    if replica is not None:
+        own = replica.get_bookings_between(start_ts, end_ts)
+        local = {row[0] for row in own}
+        rows = [row for row in rows if row[0] not in local and row[2] != replica.driver_id] + own
+    for booking_id, _, driver_id, pickup, dropoff, pickup_ts, status in rows:
+        trip = Trip(booking_id, pickup, dropoff, pickup_ts, driver_id)
+        if status == BOOKING_STATUS['ASSIGNED']:
+            chains.setdefault(driver_id, []).append(trip)
+        elif status == BOOKING_STATUS['PENDING']:
+            pending.append(trip)
+    return chains, pending
@@ -0,0 +1,52 @@
+"""Recently validated login sessions"""
+import hashlib
+import time
+from collections import OrderedDict
+
+
+def hash_token(token):
+    """The form a session token is stored and cached under"""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class SessionCache:
+    """LRU of session token hashes that recently passed a database check.
+
+    Maps a token hash to the session's user row and expiry, so switching
+    back to a recent user on a shared terminal costs a dict lookup. An
+    entry is trusted for at most max_age seconds before the database is
+    asked again; that bounds how long a revocation made by another
+    process goes unnoticed here. Revocations made through this process
+    drop the entry at once.
+    """
+
+    def __init__(self, capacity, max_age):
+        self.capacity = capacity
+        self.max_age = max_age
+        self.entries = OrderedDict()
+
+    def get(self, token_hash):
+        """The cached user row, or None if absent, expired or due for a recheck"""
+        entry = self.entries.get(token_hash)
+        if entry is None:
+            return None
+        user, expires_ts, checked = entry
+        now = time.time()
+        if now >= expires_ts or now - checked > self.max_age:
+            del self.entries[token_hash]
+            return None
+        self.entries.move_to_end(token_hash)
+        return user
+
+    def put(self, token_hash, user, expires_ts):
+        self.entries[token_hash] = (user, expires_ts, time.time())
+        self.entries.move_to_end(token_hash)
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    def discard(self, token_hash):
+        self.entries.pop(token_hash, None)
+
+    def discard_user(self, user_id):
+        for token_hash in [key for key, (user, _, _) in self.entries.items() if user[0] == user_id]:
+            del self.entries[token_hash]
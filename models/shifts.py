@@ -0,0 +1,47 @@
+"""Driver shift calendar"""
+from bisect import bisect_right
+
+
+class ShiftCalendar:
+    """Every driver's shifts as sorted, merged [start_ts, end_ts) intervals.
+
+    Built in one pass from the shift rows and rebuilt only when the
+    storage's shift revision moves, so on-duty checks are a bisect per
+    driver and slot. Drivers with no shifts at all are on duty at any
+    time, as they were before shifts existed; once a driver has any
+    shift, they are on duty only inside their shifts.
+    """
+
+    def __init__(self):
+        self.revision = None
+        self.starts = {}
+        self.ends = {}
+
+    def load(self, revision, drivers, rows):
+        """Replace the calendar from (driver_id, start_ts, end_ts) rows ordered
+        by driver and start. drivers are all drivers with shifts, including
+        those whose shifts are all too old to be among the rows.
+        """
+        self.revision = revision
+        self.starts = {driver_id: [] for driver_id in drivers}
+        self.ends = {driver_id: [] for driver_id in drivers}
+        for driver_id, start_ts, end_ts in rows:
+            starts = self.starts.setdefault(driver_id, [])
+            ends = self.ends.setdefault(driver_id, [])
+            if ends and start_ts <= ends[-1]:
+                ends[-1] = max(ends[-1], end_ts)
+            else:
+                starts.append(start_ts)
+                ends.append(end_ts)
+
+    def on_shift(self, driver_id, ts):
+        starts = self.starts.get(driver_id)
+        if starts is None:
+            return True
+        index = bisect_right(starts, ts) - 1
+        return index >= 0 and ts < self.ends[driver_id][index]
+
+    def on_shift_drivers(self, driver_ids, ts_list):
+        """Drivers on shift at every one of the given times"""
+        return [driver_id for driver_id in driver_ids
+                if all(self.on_shift(driver_id, ts) for ts in ts_list)]
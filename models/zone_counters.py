@@ -0,0 +1,110 @@
+"""Sliding-window supply and demand counters per zone"""
+import time
+from utils.constants import SURGE, BOOKING_EVENT
+
+# Events that take a booking's request back
+WITHDRAWN = (BOOKING_EVENT['CANCELLED'], BOOKING_EVENT['DRIVER_CANCELLED'], BOOKING_EVENT['EXPIRED'])
+
+
+class RingCounter:
+    """Event count over the last `window` minutes, one bucket per minute.
+
+    A bucket is reused when its minute comes round again, so adding is
+    O(1) and memory stays fixed however busy the zone gets. Counts for a
+    minute older than the one already in its bucket are dropped.
+    """
+
+    def __init__(self, window):
+        self.counts = [0] * window
+        self.minutes = [-1] * window
+
+    def add(self, minute, count=1):
+        slot = minute % len(self.counts)
+        if self.minutes[slot] > minute:
+            return
+        if self.minutes[slot] != minute:
+            self.minutes[slot] = minute
+            self.counts[slot] = 0
+        self.counts[slot] += count
+
+    def remove(self, minute, count=1):
+        """Take back counts added for minute, unless its bucket has moved on"""
+        slot = minute % len(self.counts)
+        if self.minutes[slot] == minute:
+            self.counts[slot] -= count
+
+    def total(self, minute):
+        oldest = minute - len(self.counts)
+        return sum(count for count, stamp in zip(self.counts, self.minutes) if stamp > oldest)
+
+
+class ZoneCounters:
+    """Open requests and free drivers per zone over the last window.
+
+    A zone is a location. Demand is bookings requested in the zone during
+    the window, less those cancelled or expired since. Supply is drivers
+    whose last trip ended in the zone during the window and who have not
+    been assigned since: completing a trip frees the driver at its
+    dropoff, and an assignment takes the driver out again, however many
+    times a booking changes hands. Drivers whose last trip ended before
+    the window are not counted anywhere.
+
+    The storage object that owns the counters feeds them its booking
+    events through apply() (see Storage.load_zone_counters);
+    last_event_id is the newest event applied so far.
+    """
+
+    def __init__(self, window_minutes=SURGE['WINDOW_MINUTES']):
+        self.window = window_minutes
+        self.demand = {}
+        # booking_id -> (zone, minute) for requests still open and counted
+        self.open_requests = {}
+        # driver_id -> (zone, ts) for drivers freed and not yet assigned
+        self.free_drivers = {}
+        self.last_event_id = 0
+
+    def apply(self, booking_id, event, driver_id, pickup, dropoff, ts=None):
+        """Count one booking event logged at ts (epoch seconds, default now)"""
+        ts = time.time() if ts is None else ts
+        if event == BOOKING_EVENT['CREATED']:
+            minute = int(ts // 60)
+            counter = self.demand.get(pickup)
+            if counter is None:
+                counter = self.demand[pickup] = RingCounter(self.window)
+            counter.add(minute)
+            self.open_requests[booking_id] = (pickup, minute)
+        elif event in WITHDRAWN:
+            request = self.open_requests.pop(booking_id, None)
+            if request is not None:
+                self.demand[request[0]].remove(request[1])
+        elif event == BOOKING_EVENT['ASSIGNED']:
+            self.free_drivers.pop(driver_id, None)
+        elif event == BOOKING_EVENT['COMPLETED'] and driver_id is not None:
+            self.free_drivers[driver_id] = (dropoff, ts)
+
+    def pressure(self, min_demand=SURGE['MIN_DEMAND'], surge_ratio=SURGE['SURGE_RATIO']):
+        """(zone, demand, supply, supply/demand ratio, surge) for zones active in
+        the window, lowest ratio first. A zone surges when it has at least
+        min_demand requests and its ratio is below surge_ratio.
+        """
+        now = time.time()
+        minute = int(now // 60)
+        oldest = minute - self.window
+        self.open_requests = {booking_id: request for booking_id, request in self.open_requests.items()
+                              if request[1] > oldest}
+        self.free_drivers = {driver_id: free for driver_id, free in self.free_drivers.items()
+                             if free[1] > now - self.window * 60}
+        supply = {}
+        for zone, _ in self.free_drivers.values():
+            supply[zone] = supply.get(zone, 0) + 1
+        rows = []
+        for zone in set(self.demand) | set(supply):
+            counter = self.demand.get(zone)
+            requested, supplied = counter.total(minute) if counter else 0, supply.get(zone, 0)
+            if not requested and not supplied:
+                continue
+            ratio = supplied / requested if requested else float('inf')
+            rows.append((zone, requested, supplied, ratio,
+                         requested >= min_demand and ratio < surge_ratio))
+        rows.sort(key=lambda row: (row[3], -row[1], row[0]))
+        return rows
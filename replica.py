@@ -0,0 +1,186 @@
+"""Local replica of one driver's trips, for terminals on a flaky link"""
+import os
+import sqlite3
+import time
+import uuid
+from database import BOOKING_LISTS, booking_list_filters, booking_list_order
+from utils.constants import ASSIGN_RESULT, BOOKING_STATUS, SYNC
+
+
+class DriverReplica:
+    """A driver's trips in a small SQLite file, synced with the central database.
+
+    The driver dashboard reads and writes only the replica. Completions
+    and cancellations change the local copy at once and wait in an
+    outbox; sync() pushes the outbox, then pulls the trips changed since
+    the last revision it saw (see Database.get_driver_changes). Every step
+    can be repeated safely: queued actions carry ids the central database
+    remembers, and pulled rows overwrite the local ones. While the central
+    database cannot be reached the outbox keeps growing and sync() returns
+    None.
+    """
+
+    def __init__(self, central, driver_id, path=None):
+        self.central = central
+        self.driver_id = driver_id
+        self.path = path or SYNC['REPLICA_FILE'].format(base=os.path.splitext(central.db_name)[0],
+                                                       driver_id=driver_id)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.cursor = self.conn.cursor()
+        self.create_tables()
+
+    def create_tables(self):
+        # The same names as the central tables, so the driver booking list
+        # query runs here unchanged
+        self.cursor.executescript('''
+            CREATE TABLE IF NOT EXISTS users (
+                user_id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                phone TEXT
+            );
+            CREATE TABLE IF NOT EXISTS bookings (
+                booking_id INTEGER PRIMARY KEY,
+                customer_id INTEGER NOT NULL,
+                driver_id INTEGER,
+                pickup_location TEXT NOT NULL,
+                dropoff_location TEXT NOT NULL,
+                booking_date TEXT NOT NULL,
+                booking_time TEXT NOT NULL,
+                pickup_ts INTEGER,
+                status TEXT NOT NULL,
+                version INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS outbox (
+                seq INTEGER PRIMARY KEY,
+                op_id TEXT NOT NULL UNIQUE,
+                booking_id INTEGER NOT NULL,
+                new_status TEXT NOT NULL,
+                queued_ts INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS sync_state (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                revision INTEGER NOT NULL
+            );
+            INSERT OR IGNORE INTO sync_state (id, revision) VALUES (1, 0);
+        ''')
+
+    @property
+    def revision(self):
+        self.cursor.execute('SELECT revision FROM sync_state')
+        return self.cursor.fetchone()[0]
+
+    def pending_count(self):
+        """Actions waiting to reach the central database"""
+        self.cursor.execute('SELECT COUNT(*) FROM outbox')
+        return self.cursor.fetchone()[0]
+
+    def list_bookings(self, view, owner_id=None, sort_by='Date', descending=True,
+                      filters=None, limit=100, offset=0):
+        """One page of the driver booking list, as Database.list_bookings"""
+        spec = BOOKING_LISTS[view]
+        where, params = booking_list_filters(view, owner_id, filters)
+        direction = 'DESC' if descending else 'ASC'
+        self.cursor.execute(f'''
+            SELECT {', '.join(list(spec['columns'].values()) + spec['extra'])}
+            FROM bookings b
+            {spec['joins'].format(schema='')}
+            {'WHERE ' + ' AND '.join(where) if where else ''}
+            ORDER BY {', '.join(f'{expr} {direction}' for expr in booking_list_order(view, sort_by))}
+            LIMIT ? OFFSET ?
+        ''', params + [limit, offset])
+        return self.cursor.fetchall()
+
+    def get_bookings_between(self, start_ts, end_ts):
+        """The driver's trips picking up in [start_ts, end_ts), in the row
+        shape of Database.get_bookings_between"""
+        self.cursor.execute('''
+            SELECT booking_id, customer_id, driver_id, pickup_location,
+                   dropoff_location, pickup_ts, status
+            FROM bookings WHERE pickup_ts >= ? AND pickup_ts < ? AND driver_id = ?
+            ORDER BY pickup_ts, booking_id
+        ''', (start_ts, end_ts, self.driver_id))
+        return self.cursor.fetchall()
+
+    def _queue(self, booking_ids, new_status):
+        """Close open local trips and queue the change; returns (updated, rejected)"""
+        updated, rejected = [], {}
+        with self.conn:
+            for booking_id in booking_ids:
+                self.cursor.execute('SELECT status FROM bookings WHERE booking_id = ? AND driver_id = ?',
+                                    (booking_id, self.driver_id))
+                row = self.cursor.fetchone()
+                if not row:
+                    rejected[booking_id] = ASSIGN_RESULT['NOT_FOUND']
+                elif row[0] in [BOOKING_STATUS['CANCELLED'], BOOKING_STATUS['COMPLETED']]:
+                    rejected[booking_id] = ASSIGN_RESULT['CLOSED']
+                else:
+                    updated.append(booking_id)
+            # A driver's cancellation releases the trip, as in the central database
+            driver_clause = ', driver_id = NULL' if new_status == BOOKING_STATUS['CANCELLED'] else ''
+            self.cursor.executemany(f'UPDATE bookings SET status = ?{driver_clause} WHERE booking_id = ?',
+                                    [(new_status, booking_id) for booking_id in updated])
+            now = int(time.time())
+            self.cursor.executemany('''
+                INSERT INTO outbox (op_id, booking_id, new_status, queued_ts) VALUES (?, ?, ?, ?)
+            ''', [(uuid.uuid4().hex, booking_id, new_status, now) for booking_id in updated])
+        return updated, rejected
+
+    def complete_trips(self, booking_ids):
+        return self._queue(booking_ids, BOOKING_STATUS['COMPLETED'])
+
+    def cancel_trips(self, booking_ids):
+        return self._queue(booking_ids, BOOKING_STATUS['CANCELLED'])
+
+    def sync(self):
+        """Push queued actions, then pull changed trips.
+
+        Returns (updated, rejected) for the pushed actions, rejected
+        mapping booking id to the central database's ASSIGN_RESULT, or
+        None if the central database could not be reached. Rejected
+        actions are not retried; the pull brings back the central state.
+        """
+        try:
+            updated, rejected = self._push()
+            self._pull()
+        except sqlite3.Error:
+            return None
+        return updated, rejected
+
+    def _push(self):
+        self.cursor.execute('SELECT op_id, booking_id, new_status FROM outbox ORDER BY seq')
+        ops = self.cursor.fetchall()
+        results = self.central.apply_driver_ops(self.driver_id, ops)
+        updated, rejected = [], {}
+        for op_id, booking_id, _ in ops:
+            if results[op_id] == ASSIGN_RESULT['OK']:
+                updated.append(booking_id)
+            else:
+                rejected[booking_id] = results[op_id]
+        with self.conn:
+            self.cursor.executemany('DELETE FROM outbox WHERE op_id = ?', [(op_id,) for op_id in results])
+        return updated, rejected
+
+    def _pull(self):
+        since = self.revision
+        revision, rows = self.central.get_driver_changes(self.driver_id, since)
+        with self.conn:
+            if revision < since:
+                # The central database was replaced; start over from its current trips
+                self.cursor.execute('DELETE FROM bookings')
+                revision, rows = self.central.get_driver_changes(self.driver_id)
+            for booking_id, customer_id, name, phone, driver_id, *booking in rows:
+                if driver_id != self.driver_id:
+                    self.cursor.execute('DELETE FROM bookings WHERE booking_id = ?', (booking_id,))
+                    continue
+                self.cursor.execute('INSERT OR REPLACE INTO users (user_id, name, phone) VALUES (?, ?, ?)',
+                                    (customer_id, name, phone))
+                self.cursor.execute('''
+                    INSERT OR REPLACE INTO bookings (booking_id, customer_id, driver_id, pickup_location,
+                                                     dropoff_location, booking_date, booking_time,
+                                                     pickup_ts, status, version)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (booking_id, customer_id, driver_id, *booking))
+            self.cursor.execute('UPDATE sync_state SET revision = ?', (revision,))
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,145 @@
+"""Per-city database shards"""
+import sqlite3
+import threading
+from database import Database, BOOKING_LISTS, booking_list_filters, booking_list_order
+from utils.constants import SHARDS, OTHER_CITY
+
+
+class ShardRouter:
+    """Routes bookings to one database file per city.
+
+    The main database stays the directory: every user is created and
+    authenticated there, and bookings for cities without a shard (or made
+    before sharding) stay there too. Each city in the shard map gets its
+    own file, and so its own write lock, holding that city's bookings plus
+    copies of the users they refer to so the usual joins work locally.
+
+    Booking ids are handed out from a separate range per shard (shard
+    number * ID_RANGE), so an id alone says which file a booking is in.
+    """
+
+    ID_RANGE = 10 ** 9
+
+    def __init__(self, directory, shard_map=SHARDS):
+        self.directory = directory
+        self.shard_map = shard_map
+        self.shards = {}
+        for city, (db_name, shard_no) in shard_map.items():
+            shard = Database(db_name)
+            shard.reserve_booking_ids(shard_no * self.ID_RANGE + 1)
+            self.shards[city] = shard
+        self._read_conn = None
+        self._read_lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return bool(self.shards)
+
+    @property
+    def cities(self):
+        """Sharded cities followed by OTHER_CITY for the directory"""
+        return sorted(self.shards) + [OTHER_CITY]
+
+    def all(self):
+        """The directory followed by every shard"""
+        return [self.directory] + [self.shards[city] for city in sorted(self.shards)]
+
+    def for_city(self, city):
+        return self.shards.get(city, self.directory)
+
+    def city_of_booking(self, booking_id):
+        shard_no = int(booking_id) // self.ID_RANGE
+        for city, (_, number) in self.shard_map.items():
+            if number == shard_no:
+                return city
+        return OTHER_CITY
+
+    def for_booking(self, booking_id):
+        return self.for_city(self.city_of_booking(booking_id))
+
+    def group_by_shard(self, booking_ids):
+        """Split booking ids into {database: [ids]}, keeping their order"""
+        groups = {}
+        for booking_id in booking_ids:
+            groups.setdefault(self.for_booking(booking_id), []).append(booking_id)
+        return groups
+
+    def for_user(self, user_id, city=None):
+        """Database for a user's city (their own by default), with the user copied into it"""
+        user = self.directory.get_user(user_id)
+        db = self.for_city(city or user[6])
+        if db is not self.directory:
+            db.copy_user(user)
+        return db
+
+    def _reader(self):
+        """Connection to the directory with every shard attached, for merged reads"""
+        if self._read_conn is None:
+            conn = sqlite3.connect(self.directory.db_name, check_same_thread=False)
+            for city in sorted(self.shards):
+                conn.execute(f'ATTACH DATABASE ? AS s{self.shard_map[city][1]}',
+                             (self.shards[city].db_name,))
+            self._read_conn = conn
+        return self._read_conn
+
+    def list_bookings(self, view, owner_id=None, sort_by='Date', descending=True,
+                      filters=None, limit=100, offset=0, cities=None):
+        """One page of a booking list merged across the directory and the shards.
+
+        Rows are the view's columns, then the City, then its extra columns.
+        Every database is read in one statement on an ATTACH connection: each
+        branch returns only its own first limit + offset rows in index order,
+        and SQLite merges them under the outer ORDER BY. A City filter, or
+        cities, leaves the other databases out of the query altogether.
+        """
+        filters = dict(filters or {})
+        city_prefix = filters.pop('City', '')
+        sources = [(OTHER_CITY, '')] + [(city, f's{self.shard_map[city][1]}.')
+                                        for city in sorted(self.shards)]
+        sources = [(city, schema) for city, schema in sources
+                   if city.startswith(city_prefix) and (cities is None or city in cities)]
+        if not sources:
+            return []
+
+        spec = BOOKING_LISTS[view]
+        exprs = list(spec['columns'].values()) + spec['extra']
+        order = booking_list_order(view, 'Date' if sort_by == 'City' else sort_by)
+        exprs += [expr for expr in order if expr not in exprs]
+        aliases = {expr: f'c{i}' for i, expr in enumerate(exprs)}
+        direction = 'DESC' if descending else 'ASC'
+        branch_order = ', '.join(f'{aliases[expr]} {direction}' for expr in order)
+        outer_order = ([f'city {direction}'] if sort_by == 'City' else []) + [branch_order]
+
+        where, params = booking_list_filters(view, owner_id, filters)
+        select = ', '.join(f'{expr} AS {alias}' for expr, alias in aliases.items())
+        branches, branch_params = [], []
+        for city, schema in sources:
+            branches.append(f'''
+                SELECT * FROM (
+                    SELECT {select}, ? AS city
+                    FROM {schema}bookings b
+                    {spec['joins'].format(schema=schema)}
+                    {'WHERE ' + ' AND '.join(where) if where else ''}
+                    ORDER BY {branch_order}
+                    LIMIT ?
+                )''')
+            branch_params += [city] + params + [limit + offset]
+
+        visible = [aliases[expr] for expr in spec['columns'].values()]
+        extra = [aliases[expr] for expr in spec['extra']]
+        query = f'''
+            SELECT {', '.join(visible + ['city'] + extra)}
+            FROM ({' UNION ALL '.join(branches)})
+            ORDER BY {', '.join(outer_order)}
+            LIMIT ? OFFSET ?
+        '''
+        with self._read_lock:
+            cursor = self._reader().execute(query, branch_params + [limit, offset])
+            return cursor.fetchall()
+
+    def close(self):
+        if self._read_conn is not None:
+            self._read_conn.close()
+            self._read_conn = None
+        for shard in self.shards.values():
+            shard.close()
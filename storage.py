@@ -0,0 +1,259 @@
+"""The storage interface behind the dashboards"""
+import time
+from abc import ABC, abstractmethod
+from utils.constants import RECURRENCE, SESSIONS
+
+
+class Storage(ABC):
+    """Operations the dashboards, admin tools and driver replicas use.
+
+    Database (database.py) keeps everything in an SQLite file and
+    MemoryStorage (memory_storage.py) in plain Python structures, for
+    simulations and benchmarks that should not pay for disk I/O. Both
+    return the same rows in the same order and report the same
+    ASSIGN_RESULT outcomes; see Database for the full behaviour of each
+    method. Backends also expose db_name, an AvailabilityIndex as
+    availability, ZoneCounters as zone_counters and a ShiftCalendar as
+    shift_calendar.
+
+    Every operation a backend must provide is an abstractmethod, so a
+    backend missing one fails when it is created rather than partway
+    through a dashboard action.
+
+    Maintenance, sharding, as-of history queries and the customer
+    notification outbox stay SQLite-only.
+    """
+
+    # Users
+
+    @abstractmethod
+    def authenticate(self, username, password):
+        """(user_id, username, role, name) for valid credentials, else None"""
+
+    @abstractmethod
+    def create_user(self, username, password, role, name, phone, city=None):
+        """Create a user; False if the username is taken"""
+
+    def create_driver(self, username, password, full_name, phone, vehicle_no, license_no, city=None):
+        """Create a new driver user"""
+        return self.create_user(username, password, 'Driver', full_name, phone, city)
+
+    @abstractmethod
+    def create_session(self, user_id, ttl=SESSIONS['TTL']):
+        """Open a login session for user_id and return its token"""
+    
+    @abstractmethod
+    def resume_session(self, token):
+        """(user_id, username, role, name) for a live session token, else None"""
+    
+    @abstractmethod
+    def revoke_session(self, token):
+        """End a session so its token no longer resumes"""
+    
+    @abstractmethod
+    def revoke_user_sessions(self, user_id):
+        """End every session of a user"""
+    
+    @abstractmethod
+    def get_user(self, user_id=None, username=None):
+        """(user_id, username, password, role, name, phone, city) or None"""
+
+    @abstractmethod
+    def get_all_drivers(self, city=None):
+        """(user_id, name) for every driver, or only those based in city"""
+
+    # Bookings
+
+    @abstractmethod
+    def book_taxi(self, customer_id, pickup, dropoff, booking_date, booking_time):
+        """Create a pending booking and return its id"""
+
+    @abstractmethod
+    def import_bookings(self, bookings):
+        """Create pending bookings from (customer_id, pickup, dropoff, date, time) rows"""
+
+    @abstractmethod
+    def update_booking(self, booking_id, pickup, dropoff, booking_date, booking_time):
+        """Update an open booking; False if it is closed or the new slot clashes"""
+
+    @abstractmethod
+    def get_booking_status(self, booking_id):
+        """Status of a booking, or None if it does not exist"""
+
+    @abstractmethod
+    def list_bookings(self, view, owner_id=None, sort_by='Date', descending=True,
+                      filters=None, limit=100, offset=0):
+        """One page of a BOOKING_LISTS view"""
+
+    @abstractmethod
+    def get_bookings_between(self, start_ts, end_ts, status=None, driver_id=None):
+        """Bookings picking up in [start_ts, end_ts), ordered by pickup time"""
+
+    def get_upcoming_bookings(self, hours=2, status=None, driver_id=None):
+        """Bookings picking up within the next few hours"""
+        now = int(time.time())
+        return self.get_bookings_between(now, now + int(hours * 3600), status, driver_id)
+
+    @abstractmethod
+    def count_bookings_by_day(self, start_ts, end_ts):
+        """(booking_date, status, count) for bookings picking up in [start_ts, end_ts)"""
+
+    @abstractmethod
+    def get_max_booking_id(self):
+        """Highest booking id, 0 when there are none"""
+
+    @abstractmethod
+    def iter_pickups(self, after_id, chunk_size):
+        """Yield lists of (booking_id, pickup_ts, pickup_location, status) after after_id, in id order"""
+
+    @abstractmethod
+    def get_booking_changes(self, since=0):
+        """(revision, rows) with the current (booking_id, pickup_ts,
+        pickup_location, status) of bookings changed after revision since"""
+
+    # Assignment and trip lifecycle; bulk methods return (updated_ids, rejected)
+
+    @abstractmethod
+    def assign_drivers(self, booking_ids, driver_id, versions=None):
+        """Assign one driver to several bookings, rejecting stale, closed, off-shift and clashing ones"""
+
+    @abstractmethod
+    def assign_driver(self, booking_id, driver_id, version=None):
+        """Assign a driver to a booking, returning one of ASSIGN_RESULT"""
+
+    @abstractmethod
+    def cancel_bookings(self, booking_ids):
+        """Cancel several bookings on behalf of a customer or admin"""
+
+    def cancel_booking(self, booking_id):
+        """Cancel a booking on behalf of the customer"""
+        return bool(self.cancel_bookings([booking_id])[0])
+
+    @abstractmethod
+    def complete_trips(self, booking_ids):
+        """Mark several trips as completed"""
+
+    def complete_trip(self, booking_id):
+        """Mark a trip as completed"""
+        return bool(self.complete_trips([booking_id])[0])
+
+    @abstractmethod
+    def cancel_trips(self, booking_ids):
+        """Cancel several trips on behalf of the driver, releasing the driver"""
+
+    def cancel_trip(self, booking_id):
+        """Cancel a trip on behalf of the driver, releasing the driver"""
+        return bool(self.cancel_trips([booking_id])[0])
+
+    @abstractmethod
+    def check_driver_availability(self, driver_id, booking_date, booking_time):
+        """Whether the driver has no open booking in that slot"""
+
+    @abstractmethod
+    def load_availability(self, pickup_ts_list):
+        """Load the availability bitmaps for every day touched by pickup_ts_list"""
+
+    @abstractmethod
+    def sync_availability(self):
+        """Drop the availability days that booking events logged since the
+        last call touched, so bookings changed by other processes reload"""
+
+    def get_free_drivers(self, driver_ids, pickup_ts_list):
+        """Drivers on shift and with no open booking in every one of the given
+        slots, from the bitmaps and the shift calendar"""
+        self.sync_availability()
+        self.load_availability(pickup_ts_list)
+        self.load_shifts()
+        free = self.availability.free_drivers(driver_ids, pickup_ts_list)
+        return self.shift_calendar.on_shift_drivers(free, pickup_ts_list)
+    
+    # Driver shifts
+    
+    @abstractmethod
+    def add_shifts(self, shifts):
+        """Add (driver_id, start_ts, end_ts) shifts; returns the count"""
+    
+    @abstractmethod
+    def delete_shifts(self, shift_ids):
+        """Delete shifts by id; returns how many existed"""
+    
+    @abstractmethod
+    def clear_shifts(self, driver_ids, start_ts, end_ts):
+        """Delete the drivers' shifts starting in [start_ts, end_ts)"""
+    
+    @abstractmethod
+    def get_shifts(self, driver_ids, start_ts, end_ts):
+        """(shift_id, driver_id, start_ts, end_ts) overlapping [start_ts, end_ts)"""
+    
+    @abstractmethod
+    def load_shifts(self):
+        """Bring shift_calendar up to date with the stored shifts"""
+
+    @abstractmethod
+    def load_zone_counters(self):
+        """Bring zone_counters up to date with the booking events: open
+        requests per pickup zone, and drivers freed at their last dropoff"""
+
+    def refresh(self):
+        """Catch zone_counters, availability and shift_calendar up with what
+        every process wrote; cheap when nothing changed"""
+        self.load_zone_counters()
+        self.sync_availability()
+        self.load_shifts()
+
+    def get_zone_pressure(self):
+        """(zone, demand, supply, ratio, surge) per pickup zone over the last few
+        minutes, from the in-memory counters. Refreshes every in-memory index,
+        so callers polling this keep them all current."""
+        self.refresh()
+        return self.zone_counters.pressure()
+    
+    # Recurring bookings
+
+    @abstractmethod
+    def create_recurring_booking(self, customer_id, pickup, dropoff, booking_time,
+                                 start_date, frequency, interval_days=1, until_date=None):
+        """Store a recurring booking rule and return its id"""
+
+    @abstractmethod
+    def stop_recurring_booking(self, rule_id):
+        """Stop generating new occurrences for a rule; False if it does not exist"""
+
+    @abstractmethod
+    def get_recurring_rules(self, customer_id=None):
+        """Active RecurrenceRules, optionally for one customer"""
+
+    @abstractmethod
+    def iter_occurrences(self, window_start, window_end, customer_id=None):
+        """Yield (rule, occurrence_date) pairs not yet in bookings"""
+
+    @abstractmethod
+    def materialize_occurrence(self, rule_id, occurrence_date):
+        """Copy one occurrence into bookings (if needed) and return its booking id"""
+
+    @abstractmethod
+    def materialize_due_occurrences(self, horizon_days=RECURRENCE['DISPATCH_HORIZON_DAYS']):
+        """Copy every occurrence inside the dispatch window into bookings"""
+
+    # Route planning
+
+    @abstractmethod
+    def set_travel_times(self, rows):
+        """Store (from_location, to_location, km, minutes) rows, replacing known pairs"""
+
+    @abstractmethod
+    def get_travel_times(self):
+        """{(from_location, to_location): (km, minutes)}"""
+
+    # Driver replica sync
+
+    @abstractmethod
+    def get_driver_changes(self, driver_id, since=0):
+        """(revision, rows) for a driver's trips changed after revision since"""
+
+    @abstractmethod
+    def apply_driver_ops(self, driver_id, ops):
+        """Apply trip actions queued by a driver's replica; {op_id: ASSIGN_RESULT}"""
+
+    def close(self):
+        pass
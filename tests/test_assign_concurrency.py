@@ -0,0 +1,99 @@
+"""Dispatchers in separate processes racing to assign the same booking or slot"""
+import multiprocessing
+import pytest
+from database import Database
+from utils.constants import ASSIGN_RESULT, BOOKING_STATUS
+
+DISPATCHERS = 8
+
+
+def race(db_name, barrier, results, bulk, booking_id, driver_id, version):
+    """One dispatcher process: wait for the others, then assign"""
+    db = Database(db_name)
+    try:
+        barrier.wait()
+        if bulk:
+            versions = None if version is None else {booking_id: version}
+            updated, rejected = db.assign_drivers([booking_id], driver_id, versions)
+            result = ASSIGN_RESULT['OK'] if updated else rejected[booking_id]
+        else:
+            result = db.assign_driver(booking_id, driver_id, version)
+        results.put((booking_id, driver_id, result))
+    finally:
+        db.close()
+
+
+def run_dispatchers(db_name, attempts):
+    """Run one process per (booking_id, driver_id, version) attempt, alternating
+    assign_driver and assign_drivers; returns their (booking_id, driver_id, result)"""
+    context = multiprocessing.get_context('spawn')
+    barrier = context.Barrier(len(attempts))
+    results = context.Queue()
+    processes = [context.Process(target=race, args=(db_name, barrier, results, number % 2 == 1) + attempt)
+                 for number, attempt in enumerate(attempts)]
+    for process in processes:
+        process.start()
+    outcomes = [results.get(timeout=60) for _ in processes]
+    for process in processes:
+        process.join(60)
+        assert process.exitcode == 0
+    return outcomes
+
+
+def assert_no_double_booking(db_name):
+    db = Database(db_name)
+    try:
+        db.cursor.execute('''
+            SELECT driver_id, pickup_ts, COUNT(*) FROM bookings
+            WHERE driver_id IS NOT NULL AND status NOT IN (?, ?)
+            GROUP BY driver_id, pickup_ts HAVING COUNT(*) > 1
+        ''', (BOOKING_STATUS['CANCELLED'], BOOKING_STATUS['COMPLETED']))
+        assert db.cursor.fetchall() == []
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def setup(tmp_path):
+    """A database file with a customer, DISPATCHERS drivers and a helper to book"""
+    db_name = str(tmp_path / 'taxi.db')
+    db = Database(db_name)
+    db.create_user('customer', 'pw', 'Customer', 'Customer', '1')
+    customer_id = db.get_user(username='customer')[0]
+    for number in range(DISPATCHERS):
+        db.create_driver(f'driver{number}', 'pw', f'Driver {number}', '1', 'V', 'L')
+    drivers = [db.get_user(username=f'driver{number}')[0] for number in range(DISPATCHERS)]
+    bookings = [db.book_taxi(customer_id, 'Airport', 'Station', '2030-01-01', '09:00')
+                for _ in range(DISPATCHERS)]
+    db.close()
+    return db_name, drivers, bookings
+
+
+def test_one_dispatcher_wins_a_booking(setup):
+    db_name, drivers, bookings = setup
+    booking_id = bookings[0]
+    # Every dispatcher saw version 0 and picked a different driver
+    outcomes = run_dispatchers(db_name, [(booking_id, driver_id, 0) for driver_id in drivers])
+
+    results = [result for _, _, result in outcomes]
+    assert results.count(ASSIGN_RESULT['OK']) == 1
+    assert set(results) - {ASSIGN_RESULT['OK']} <= {ASSIGN_RESULT['STALE'], ASSIGN_RESULT['CONFLICT']}
+    winner = next(driver_id for _, driver_id, result in outcomes if result == ASSIGN_RESULT['OK'])
+    db = Database(db_name)
+    try:
+        db.cursor.execute('SELECT driver_id, status, version FROM bookings WHERE booking_id = ?', (booking_id,))
+        assert db.cursor.fetchone() == (winner, BOOKING_STATUS['ASSIGNED'], 1)
+    finally:
+        db.close()
+    assert_no_double_booking(db_name)
+
+
+def test_driver_is_never_double_booked(setup):
+    db_name, drivers, bookings = setup
+    # Every dispatcher gives the same driver a different booking in the same slot
+    outcomes = run_dispatchers(db_name, [(booking_id, drivers[0], None) for booking_id in bookings])
+
+    results = [result for _, _, result in outcomes]
+    assert results.count(ASSIGN_RESULT['OK']) == 1
+    assert results.count(ASSIGN_RESULT['CONFLICT']) == DISPATCHERS - 1
+    assert_no_double_booking(db_name)
@@ -0,0 +1,40 @@
+"""Availability bitmaps kept current across processes sharing a file"""
+from database import Database
+from utils.timestamps import to_pickup_ts
+
+DAY = '2030-01-01'
+
+
+def test_free_drivers_follow_other_writers(tmp_path):
+    db_name = str(tmp_path / 'taxi.db')
+    writer = Database(db_name)
+    writer.create_user('customer', 'pw', 'Customer', 'Customer', '1')
+    customer_id = writer.get_user(username='customer')[0]
+    drivers = []
+    for name in ('dan', 'erin'):
+        writer.create_driver(name, 'pw', name.title(), '1', 'V', 'L')
+        drivers.append(writer.get_user(username=name)[0])
+    booking_id = writer.book_taxi(customer_id, 'Airport', 'Station', DAY, '09:00')
+    slot = to_pickup_ts(DAY, '09:00')
+
+    reader = Database(db_name)
+    assert reader.get_free_drivers(drivers, [slot]) == drivers
+    assert reader.availability.is_loaded(slot)
+
+    writer.assign_driver(booking_id, drivers[0])
+    assert reader.get_free_drivers(drivers, [slot]) == [drivers[1]]
+
+    # An edit moves the trip to 11:00, freeing the 09:00 slot
+    writer.update_booking(booking_id, 'Airport', 'Station', DAY, '11:00')
+    assert reader.get_free_drivers(drivers, [slot]) == drivers
+    assert reader.get_free_drivers(drivers, [to_pickup_ts(DAY, '11:00')]) == [drivers[1]]
+
+    writer.cancel_trip(booking_id)
+    assert reader.get_free_drivers(drivers, [to_pickup_ts(DAY, '11:00')]) == drivers
+
+    # Shifts added elsewhere reach the reader's calendar on the next refresh
+    writer.add_shifts([(drivers[1], to_pickup_ts(DAY, '13:00'), to_pickup_ts(DAY, '18:00'))])
+    reader.refresh()
+    assert not reader.shift_calendar.on_shift(drivers[1], slot)
+    writer.close()
+    reader.close()
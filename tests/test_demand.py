@@ -0,0 +1,68 @@
+"""The cached demand model keeps up with new, edited and cancelled bookings"""
+import time
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+from database import Database
+from models.demand import DemandModel, local_hours
+
+
+@pytest.fixture(params=['UTC', 'Europe/London', 'America/New_York'])
+def timezone(request, monkeypatch):
+    monkeypatch.setenv('TZ', request.param)
+    time.tzset()
+    yield request.param
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_local_hours_matches_localtime(timezone):
+    # A year at an odd stride, so both DST changes are crossed
+    start = int(time.mktime((2026, 1, 1, 0, 0, 0, 0, 0, -1)))
+    stamps = np.arange(start, start + 366 * 86400, 3 * 3600 + 17 * 60)
+    weeks, hours = local_hours(stamps)
+    for ts, week, hour in zip(stamps, weeks, hours):
+        moment = time.localtime(int(ts))
+        local_day = (int(ts) + moment.tm_gmtoff) // 86400
+        assert week == (local_day + 3) // 7
+        assert hour == moment.tm_wday * 24 + moment.tm_hour
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = Database(str(tmp_path / 'taxi.db'))
+    db.create_user('customer', 'pw', 'Customer', 'Customer', '1')
+    yield db
+    db.close()
+
+
+def book(db, location, when):
+    customer_id = db.get_user(username='customer')[0]
+    return db.book_taxi(customer_id, location, 'Zoo', when.strftime('%Y-%m-%d'), when.strftime('%H:00'))
+
+
+def totals(model):
+    return {location: int(model.counts[:, :, column].sum()) for column, location in enumerate(model.locations)
+            if model.counts[:, :, column].sum()}
+
+
+def test_edits_and_cancellations_reach_the_cache(db):
+    soon = datetime.now().replace(minute=0, second=0, microsecond=0) + timedelta(days=1)
+    airport = [book(db, 'Airport', soon) for _ in range(3)]
+    mall = book(db, 'Mall', soon)
+    model = DemandModel(db)
+    assert model.update() == 4
+    assert totals(model) == {'Airport': 3, 'Mall': 1}
+
+    db.cancel_bookings([airport[0]])
+    db.update_booking(airport[1], 'Park', 'Zoo', soon.strftime('%Y-%m-%d'), '10:00')
+    db.complete_trips([mall])
+    book(db, 'Mall', soon)
+    # A fresh model reads the cache written by the first one
+    reopened = DemandModel(db)
+    assert reopened.update() == 1
+    assert totals(reopened) == {'Airport': 1, 'Park': 1, 'Mall': 2}
+    assert set(reopened.open_cells) == {airport[2], airport[1], mall + 1}
+    # Nothing changed, nothing counted twice
+    assert reopened.update() == 0
+    assert totals(DemandModel(db)) == {'Airport': 1, 'Park': 1, 'Mall': 2}
@@ -0,0 +1,69 @@
+import sqlite3
+import time
+import pytest
+from database import Database
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def committed_users(path):
+    """Users visible to another connection, i.e. committed ones"""
+    conn = sqlite3.connect(path)
+    try:
+        return {row[0] for row in conn.execute('SELECT username FROM users')}
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'taxi.db')
+
+
+def test_group_commit_coalesces_writes(db_path):
+    db = Database(db_path, group_commit_ms=50)
+    try:
+        for number in range(20):
+            assert db.create_user(f'user{number}', 'pw', 'Customer', f'User {number}', '1')
+        # All twenty share the transaction the first one opened
+        assert db.conn.in_transaction
+        wait_for(lambda: not db.conn.in_transaction)
+        assert {f'user{number}' for number in range(20)} <= committed_users(db_path)
+    finally:
+        db.close()
+
+
+def test_immediate_unit_commits_pending_writes_first(db_path):
+    db = Database(db_path, group_commit_ms=60000)
+    try:
+        db.create_user('early', 'pw', 'Customer', 'Early', '1')
+        assert 'early' not in committed_users(db_path)
+        with db.transaction(immediate=True):
+            # Not nested in the pending transaction as a savepoint
+            assert 'early' in committed_users(db_path)
+    finally:
+        db.close()
+
+
+def test_failed_group_commit_rolls_back_and_stops_new_work(db_path):
+    db = Database(db_path, group_commit_ms=20)
+    try:
+        # A deferred foreign key only fails at COMMIT, on the timer thread
+        db.conn.execute('PRAGMA foreign_keys = ON')
+        db.conn.execute('CREATE TABLE parent (id INTEGER PRIMARY KEY)')
+        db.conn.execute('''CREATE TABLE child (parent_id INTEGER
+                           REFERENCES parent (id) DEFERRABLE INITIALLY DEFERRED)''')
+        with db.transaction() as cur:
+            cur.execute('INSERT INTO child (parent_id) VALUES (1)')
+        wait_for(lambda: db.commit_error is not None)
+        assert not db.conn.in_transaction
+        assert db.conn.execute('SELECT COUNT(*) FROM child').fetchone()[0] == 0
+        with pytest.raises(sqlite3.OperationalError):
+            db.create_user('late', 'pw', 'Customer', 'Late', '1')
+    finally:
+        db.conn.close()
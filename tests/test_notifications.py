@@ -0,0 +1,69 @@
+"""Outbox delivery through a channel shared by several databases"""
+import json
+import os
+import pytest
+from database import Database
+from utils.notifications import Channel, FileChannel, NotificationWorker
+
+
+class RecordingChannel(Channel):
+    def __init__(self):
+        self.messages = []
+
+    def send(self, key, recipient, text):
+        self.messages.append((key, recipient))
+
+
+def assigned_booking(db_name):
+    """A database file with one assigned booking, so one queued notification"""
+    db = Database(db_name)
+    db.create_user('customer', 'pw', 'Customer', 'Customer', '0700')
+    db.create_driver('driver', 'pw', 'Driver', '1', 'V', 'L')
+    booking_id = db.book_taxi(db.get_user(username='customer')[0], 'Airport', 'Zoo', '2030-01-01', '09:00')
+    db.assign_driver(booking_id, db.get_user(username='driver')[0])
+    return db
+
+
+def test_keys_are_unique_across_databases(tmp_path):
+    channel = RecordingChannel()
+    worker = NotificationWorker({'file': channel})
+    databases = [assigned_booking(str(tmp_path / name)) for name in ('leeds.db', 'york.db')]
+    try:
+        assert [worker.deliver(db) for db in databases] == [1, 1]
+    finally:
+        for db in databases:
+            db.close()
+        worker.close()
+    assert channel.messages == [('leeds-notification-1', '0700'), ('york-notification-1', '0700')]
+
+
+def test_channels_must_implement_send():
+    class Silent(Channel):
+        pass
+
+    with pytest.raises(TypeError):
+        Silent()
+
+
+def test_file_channel_keeps_keys_of_a_failed_flush_pending(tmp_path, monkeypatch):
+    path = str(tmp_path / 'outbox.jsonl')
+    channel = FileChannel(path)
+    channel.send('a', '0700', 'first')
+    channel.flush()
+
+    def failing_fsync(fd):
+        raise OSError('disk full')
+
+    channel.send('b', '0700', 'second')
+    with monkeypatch.context() as patch:
+        patch.setattr(os, 'fsync', failing_fsync)
+        with pytest.raises(OSError):
+            channel.flush()
+    # The retry writes the message instead of taking it as delivered
+    channel.send('b', '0700', 'second')
+    channel.send('a', '0700', 'first')
+    channel.flush()
+    channel.close()
+    with open(path) as outbox:
+        assert [json.loads(line)['key'] for line in outbox] == ['a', 'b']
+    assert FileChannel(path).keys == {'a', 'b'}
@@ -0,0 +1,40 @@
+"""The UI profiler's patches come off again"""
+import tkinter as tk
+from tkinter import messagebox
+import pytest
+from utils.profiler import UIProfiler
+
+
+class Store:
+    def lookup(self):
+        return 'row'
+
+
+class Frozen(type):
+    def __setattr__(cls, name, value):
+        raise TypeError(f"{cls.__name__} is frozen")
+
+
+class Broken(metaclass=Frozen):
+    def lookup(self):
+        return 'row'
+
+
+def test_uninstall_restores_originals(tmp_path):
+    register, show, lookup = tk.Misc._register, messagebox._show, Store.lookup
+    profiler = UIProfiler(str(tmp_path / 'profile.log')).install((Store,))
+    assert tk.Misc._register is not register and messagebox._show is not show
+    assert Store.lookup is not lookup and Store().lookup() == 'row'
+    profiler.close()
+    assert (tk.Misc._register, messagebox._show, Store.lookup) == (register, show, lookup)
+    assert not profiler.log.handlers
+
+
+def test_failed_install_undoes_its_patches(tmp_path):
+    register, show = tk.Misc._register, messagebox._show
+    profiler = UIProfiler(str(tmp_path / 'profile.log'))
+    with pytest.raises(TypeError):
+        profiler.install((Store, Broken))
+    assert (tk.Misc._register, messagebox._show) == (register, show)
+    assert Store.lookup.__qualname__ == 'Store.lookup' and not hasattr(Store.lookup, '__wrapped__')
+    profiler.close()
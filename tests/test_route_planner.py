@@ -0,0 +1,79 @@
+"""Splitting a busy day for the process pool, and reading through a replica"""
+import random
+from datetime import date
+from database import Database
+from models.route_planner import Trip, TravelTable, load_day, plan_day, plan_days, split_day
+from replica import DriverReplica
+from utils.constants import ROUTES
+from utils.timestamps import to_pickup_ts
+
+DAY = '2030-05-06'
+ZONES = [f'Zone {number}' for number in range(12)]
+
+
+def busy_day(drivers=40, trips=300):
+    rng = random.Random(3)
+    chains = {driver_id: [] for driver_id in range(1, drivers + 1)}
+    pending = []
+    for booking_id in range(1, trips + 1):
+        pickup_ts = to_pickup_ts(DAY, f'{rng.randint(6, 21):02d}:{rng.choice([0, 15, 30, 45]):02d}')
+        driver_id = rng.choice([None, None, None, rng.randint(1, drivers)])
+        trip = Trip(booking_id, rng.choice(ZONES), rng.choice(ZONES), pickup_ts, driver_id)
+        if driver_id is None:
+            pending.append(trip)
+        elif all(other.pickup_ts != pickup_ts for other in chains[driver_id]):
+            chains[driver_id].append(trip)
+    return chains, pending
+
+
+def test_split_day_keeps_every_trip_and_driver_once():
+    chains, pending = busy_day()
+    parts = split_day(chains, pending, 4)
+    assert len(parts) == 4
+    assert sorted(trip for _, part_pending in parts for trip in part_pending) == sorted(pending)
+    drivers = [driver_id for part_chains, _ in parts for driver_id in part_chains]
+    assert sorted(drivers) == sorted(chains)
+    # Every zone's pending trips land in one part
+    zones = [{trip.pickup for trip in part_pending} for _, part_pending in parts]
+    assert sum(len(part) for part in zones) == len(set().union(*zones))
+
+
+def test_a_single_busy_day_is_split_across_workers():
+    chains, pending = busy_day()
+    assert len(pending) >= ROUTES['SPLIT_MIN_TRIPS']
+    plan = plan_days([(chains, pending)], {}, workers=3)[0]
+    assert sorted(plan) == sorted(chains)
+    proposed = [trip.booking_id for chain in plan.values() for trip in chain if trip.driver_id is None]
+    assert len(proposed) == len(set(proposed))
+    table = TravelTable({})
+    for driver_id, chain in plan.items():
+        assert [trip for trip in chain if trip.driver_id is not None] == \
+            sorted(chains[driver_id], key=lambda trip: trip.pickup_ts)
+        # Proposed trips are only chained where the driver makes it in time
+        assert all(table.reaches(before, after) for before, after in zip(chain, chain[1:])
+                   if before.driver_id is None or after.driver_id is None)
+    # Small days still go through plan_day unchanged
+    small = ({1: [], 2: []}, pending[:5])
+    assert plan_days([small], {}, workers=3) == [plan_day(*small, table)]
+
+
+def test_load_day_takes_the_drivers_trips_from_the_replica(tmp_path):
+    db = Database(str(tmp_path / 'taxi.db'))
+    db.create_user('customer', 'pw', 'Customer', 'Customer', '1')
+    customer_id = db.get_user(username='customer')[0]
+    db.create_driver('driver', 'pw', 'Driver', '1', 'V', 'L')
+    driver_id = db.get_user(username='driver')[0]
+    first, second, waiting = [db.book_taxi(customer_id, 'Airport', 'Zoo', DAY, booking_time)
+                              for booking_time in ('09:00', '11:00', '13:00')]
+    db.assign_drivers([first, second], driver_id)
+    replica = DriverReplica(db, driver_id, str(tmp_path / 'replica.db'))
+    try:
+        replica.sync()
+        # Completed on the terminal, not yet synced
+        replica.complete_trips([first])
+        chains, pending = load_day(db, date.fromisoformat(DAY), replica)
+        assert [trip.booking_id for trip in chains[driver_id]] == [second]
+        assert [trip.booking_id for trip in pending] == [waiting]
+    finally:
+        replica.close()
+        db.close()
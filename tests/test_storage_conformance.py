@@ -0,0 +1,246 @@
+"""The same scenarios run against every storage backend"""
+import random
+from datetime import date, timedelta
+import pytest
+from database import Database, BOOKING_LISTS
+from memory_storage import MemoryStorage
+from storage import Storage
+from utils.constants import ASSIGN_RESULT, BOOKING_STATUS, RECURRENCE
+from utils.timestamps import to_pickup_ts
+
+BACKENDS = {
+    'sqlite-file': lambda tmp_path: Database(str(tmp_path / 'taxi.db')),
+    'sqlite-memory': lambda tmp_path: Database(':memory:'),
+    'memory': lambda tmp_path: MemoryStorage()
+}
+
+DAY = '2030-03-04'
+
+
+@pytest.fixture(params=list(BACKENDS))
+def store(request, tmp_path):
+    storage = BACKENDS[request.param](tmp_path)
+    yield storage
+    storage.close()
+
+
+def populate(store):
+    """Three customers, three drivers and eight bookings on DAY.
+
+    Returns ({name: user_id}, [booking ids in creation order]).
+    """
+    users = {}
+    for name in ('alice', 'bob', 'carol'):
+        store.create_user(name, 'pw', 'Customer', name.title(), '0700')
+        users[name] = store.get_user(username=name)[0]
+    for name in ('dan', 'erin', 'fay'):
+        store.create_driver(name, 'pw', name.title(), '0800', 'V1', 'L1')
+        users[name] = store.get_user(username=name)[0]
+    bookings = [store.book_taxi(users[customer], pickup, 'Station', DAY, booking_time)
+                for customer, pickup, booking_time in [
+                    ('alice', 'Airport', '09:00'), ('bob', 'Mall', '09:00'),
+                    ('carol', 'Airport', '10:30'), ('alice', 'Park', '08:15'),
+                    ('bob', 'Airport', '12:00'), ('carol', 'Mall', '10:30'),
+                    ('alice', 'Zoo', '07:45'), ('bob', 'Park', '12:00')]]
+    return users, bookings
+
+
+def ids(rows):
+    return [row[0] for row in rows]
+
+
+def test_backends_implement_the_whole_interface():
+    class Partial(Storage):
+        def authenticate(self, username, password):
+            return None
+
+    with pytest.raises(TypeError):
+        Partial()
+    for backend in (Database(':memory:'), MemoryStorage()):
+        assert isinstance(backend, Storage)
+        backend.close()
+
+
+def test_list_order(store):
+    users, bookings = populate(store)
+    by_date = ids(store.list_bookings('admin', None, 'Date', False))
+    # Pickup time, then id for bookings in the same slot
+    assert by_date == [bookings[i] for i in (6, 3, 0, 1, 2, 5, 4, 7)]
+    assert ids(store.list_bookings('admin', None, 'Date', True)) == by_date[::-1]
+    # Ties on the sorted column fall back to pickup time and id
+    assert ids(store.list_bookings('admin', None, 'Pickup', False)) == [bookings[i] for i in (0, 2, 4, 1, 5, 3, 7, 6)]
+    assert ids(store.list_bookings('customer', users['alice'], 'Date', False)) == [bookings[i] for i in (6, 3, 0)]
+    row = store.list_bookings('admin', None, 'Date', False, None, 1, 0)[0]
+    assert row[:8] == (bookings[6], 'Alice', 'Zoo', 'Station', DAY, '07:45', 'Not Assigned', 'Pending')
+    # Extra columns: version, pickup_ts, overdue
+    assert row[8:] == (0, to_pickup_ts(DAY, '07:45'), 0)
+
+
+def test_paging(store):
+    populate(store)
+    everything = store.list_bookings('admin', None, 'Pickup', True, None, 100, 0)
+    pages = [store.list_bookings('admin', None, 'Pickup', True, None, 3, offset) for offset in (0, 3, 6, 9)]
+    assert [len(page) for page in pages] == [3, 3, 2, 0]
+    assert [row for page in pages for row in page] == everything
+
+
+def test_filters(store):
+    users, bookings = populate(store)
+    assert ids(store.list_bookings('admin', None, 'Date', False, {'Pickup': 'A'})) == [bookings[i] for i in (0, 2, 4)]
+    assert ids(store.list_bookings('admin', None, 'Date', False, {'ID': str(bookings[5])})) == [bookings[5]]
+    assert ids(store.list_bookings('admin', None, 'Date', False, {'Time': '1'})) == [bookings[i] for i in (2, 5, 4, 7)]
+    assert len(store.list_bookings('admin', None, 'Date', False, {'Date': DAY[:7]})) == 8
+    assert store.list_bookings('admin', None, 'Date', False, {'Date': '2030-04'}) == []
+    store.assign_driver(bookings[1], users['dan'])
+    assert ids(store.list_bookings('admin', None, 'Date', False, {'Status': 'Ass'})) == [bookings[1]]
+    assert ids(store.list_bookings('driver', users['dan'])) == [bookings[1]]
+
+
+def test_assign_results(store):
+    users, bookings = populate(store)
+    dan, erin = users['dan'], users['erin']
+    assert store.assign_driver(bookings[0], dan, 0) == ASSIGN_RESULT['OK']
+    # Same driver, same slot
+    assert store.assign_driver(bookings[1], dan) == ASSIGN_RESULT['CONFLICT']
+    # The booking moved on to version 1
+    assert store.assign_driver(bookings[0], erin, 0) == ASSIGN_RESULT['STALE']
+    assert store.assign_driver(bookings[0], erin, 1) == ASSIGN_RESULT['OK']
+    assert store.cancel_booking(bookings[2])
+    assert store.assign_driver(bookings[2], dan) == ASSIGN_RESULT['CLOSED']
+    assert store.assign_driver(99999, dan) == ASSIGN_RESULT['NOT_FOUND']
+    assert store.get_booking_status(bookings[0]) == BOOKING_STATUS['ASSIGNED']
+
+    # Bulk: bookings[4] and [7] share a slot, so only the first is taken
+    updated, rejected = store.assign_drivers([bookings[4], bookings[7], bookings[2], bookings[3], 99999], dan,
+                                             {bookings[3]: 5})
+    assert updated == [bookings[4]]
+    assert rejected == {bookings[7]: ASSIGN_RESULT['CONFLICT'], bookings[2]: ASSIGN_RESULT['CLOSED'],
+                        bookings[3]: ASSIGN_RESULT['STALE'], 99999: ASSIGN_RESULT['NOT_FOUND']}
+
+    updated, rejected = store.complete_trips([bookings[4], bookings[2]])
+    assert (updated, rejected) == ([bookings[4]], {bookings[2]: ASSIGN_RESULT['CLOSED']})
+
+
+def test_assign_off_shift(store):
+    users, bookings = populate(store)
+    fay = users['fay']
+    # Fay only works afternoons, so the 09:00 trips cannot go to her
+    store.add_shifts([(fay, to_pickup_ts(DAY, '13:00'), to_pickup_ts(DAY, '18:00'))])
+    assert store.assign_driver(bookings[0], fay) == ASSIGN_RESULT['OFF_SHIFT']
+    assert store.get_booking_status(bookings[0]) == BOOKING_STATUS['PENDING']
+    updated, rejected = store.assign_drivers([bookings[0], bookings[1]], fay)
+    assert updated == []
+    assert rejected == {bookings[0]: ASSIGN_RESULT['OFF_SHIFT'], bookings[1]: ASSIGN_RESULT['OFF_SHIFT']}
+    # Drivers without shifts are always on shift
+    assert store.assign_driver(bookings[0], users['dan']) == ASSIGN_RESULT['OK']
+
+
+def test_availability(store):
+    users, bookings = populate(store)
+    drivers = [users['dan'], users['erin'], users['fay']]
+    slot = to_pickup_ts(DAY, '09:00')
+    assert store.get_free_drivers(drivers, [slot]) == drivers
+    store.assign_driver(bookings[0], users['dan'])
+    assert not store.check_driver_availability(users['dan'], DAY, '09:00')
+    assert store.check_driver_availability(users['dan'], DAY, '10:30')
+    assert store.get_free_drivers(drivers, [slot]) == [users['erin'], users['fay']]
+
+    # Fay only works afternoons from now on
+    store.add_shifts([(users['fay'], to_pickup_ts(DAY, '13:00'), to_pickup_ts(DAY, '18:00'))])
+    assert store.get_free_drivers(drivers, [slot]) == [users['erin']]
+    assert not store.check_driver_availability(users['fay'], DAY, '09:00')
+    assert store.check_driver_availability(users['fay'], DAY, '14:00')
+
+    # A driver's cancellation frees the slot again
+    store.cancel_trip(bookings[0])
+    assert store.get_free_drivers(drivers, [slot]) == [users['dan'], users['erin']]
+
+
+def run_script(store):
+    """A seeded mix of every operation; returns everything it observed"""
+    rng = random.Random(7)
+    seen = []
+    seen.append((store.authenticate('admin', 'admin123'), store.authenticate('admin', 'wrong')))
+    for number in range(6):
+        store.create_driver(f'd{number}', 'pw', f'Driver {rng.choice("ABC")}{number}', '1', 'V', 'L',
+                            rng.choice([None, 'Leeds']))
+    seen.append(store.create_user('d1', 'pw', 'Customer', 'Taken', '1'))
+    customers = []
+    for number in range(8):
+        store.create_user(f'c{number}', 'pw', 'Customer', f'Customer {number % 3}', f'07{number}')
+        customers.append(store.get_user(username=f'c{number}')[0])
+    drivers = [user_id for user_id, _ in store.get_all_drivers()]
+    seen.append((store.get_all_drivers('Leeds'), store.get_user(username='c3')))
+
+    today = date.today()
+    bookings = []
+    for _ in range(80):
+        day = (today + timedelta(days=rng.randint(-2, 4))).isoformat()
+        bookings.append(store.book_taxi(rng.choice(customers), rng.choice(['Airport', 'Station', 'Mall']),
+                                        rng.choice(['Zoo', 'Uni']), day, f'{rng.randint(6, 22):02d}:{rng.choice([0, 30]):02d}'))
+    seen.append(store.import_bookings([(customers[1], 'Airport', 'Zoo', today.isoformat(), '09:00')] * 3))
+    for _ in range(25):
+        chosen = rng.sample(bookings, rng.randint(1, 5))
+        seen.append(store.assign_drivers(chosen, rng.choice(drivers), {chosen[0]: rng.choice([0, 1])}))
+        seen.append(store.assign_driver(rng.choice(bookings), rng.choice(drivers), rng.choice([None, 0, 1, 2])))
+    seen.append((store.cancel_bookings(rng.sample(bookings, 8)), store.complete_trips(rng.sample(bookings, 8)),
+                 store.cancel_trips(rng.sample(bookings, 8))))
+    for _ in range(10):
+        booking_id = rng.choice(bookings)
+        seen.append((store.update_booking(booking_id, 'Mall', 'Uni', today.isoformat(), f'{rng.randint(6, 22):02d}:00'),
+                     store.get_booking_status(booking_id)))
+
+    for view, owner in [('admin', None), ('customer', customers[1]), ('driver', drivers[0])]:
+        for heading in BOOKING_LISTS[view]['columns']:
+            for descending in (True, False):
+                seen.append(store.list_bookings(view, owner, heading, descending, None, 7, 3))
+    seen.append((store.get_bookings_between(0, 2 ** 40), store.get_bookings_between(0, 2 ** 40, 'Assigned'),
+                 store.count_bookings_by_day(0, 2 ** 40), store.get_max_booking_id(),
+                 [row for chunk in store.iter_pickups(20, 9) for row in chunk]))
+
+    rule = store.create_recurring_booking(customers[1], 'Home', 'Work', '08:00', today.isoformat(),
+                                          RECURRENCE['EVERY_N_DAYS'], 3)
+    seen.append([(occurrence_rule.rule_id, day) for occurrence_rule, day
+                 in store.iter_occurrences(today, today + timedelta(days=14))])
+    seen.append(store.materialize_occurrence(rule, (today + timedelta(days=9)).isoformat()))
+    revision, rows = store.get_driver_changes(drivers[0])
+    seen.append(sorted(rows))
+    store.assign_drivers([bookings[1], bookings[2]], drivers[0])
+    store.assign_drivers([bookings[1]], drivers[1])
+    seen.append(sorted(store.get_driver_changes(drivers[0], revision)[1]))
+    seen.append(store.apply_driver_ops(drivers[0], [('a', bookings[1], 'Completed'), ('b', bookings[2], 'Cancelled')]))
+    seen.append(store.list_bookings('admin', None, 'Date', True, None, 1000, 0))
+    return seen
+
+
+def test_backends_agree(tmp_path):
+    results = {}
+    for name, factory in BACKENDS.items():
+        store = factory(tmp_path)
+        try:
+            results[name] = run_script(store)
+        finally:
+            store.close()
+    expected = results.pop('sqlite-file')
+    for name, seen in results.items():
+        for step, (want, got) in enumerate(zip(expected, seen)):
+            assert got == want, f"{name} differs at step {step}"
+        assert len(seen) == len(expected)
+
+
+def test_zone_pressure(store):
+    users, bookings = populate(store)
+    store.assign_driver(bookings[0], users['dan'])
+    # A reassignment takes one driver, not two
+    store.assign_driver(bookings[0], users['erin'])
+    store.assign_driver(bookings[1], users['fay'])
+    # Completed trips free their drivers at the dropoff
+    store.complete_trips([bookings[0], bookings[1]])
+    store.assign_driver(bookings[4], users['erin'])
+    store.cancel_booking(bookings[7])
+    assert store.get_zone_pressure() == [
+        ('Airport', 3, 0, 0.0, True), ('Mall', 2, 0, 0.0, False), ('Park', 1, 0, 0.0, False),
+        ('Zoo', 1, 0, 0.0, False), ('Station', 0, 1, float('inf'), False)]
+    # A cancelled rush no longer surges
+    store.cancel_bookings([bookings[2], bookings[4]])
+    assert ('Airport', 1, 0, 0.0, False) in store.get_zone_pressure()
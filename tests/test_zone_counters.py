@@ -0,0 +1,56 @@
+"""Zone counters fed from booking_events, across processes sharing a file"""
+from database import Database
+from models.zone_counters import RingCounter
+from utils.constants import BOOKING_EVENT
+
+
+def pressure(db):
+    return {zone: (demand, supply) for zone, demand, supply, _, _ in db.get_zone_pressure()}
+
+
+def test_counters_follow_other_writers(tmp_path):
+    db_name = str(tmp_path / 'taxi.db')
+    writer = Database(db_name)
+    writer.create_user('customer', 'pw', 'Customer', 'Customer', '1')
+    customer_id = writer.get_user(username='customer')[0]
+    writer.create_driver('driver', 'pw', 'Driver', '1', 'V', 'L')
+    driver_id = writer.get_user(username='driver')[0]
+    bookings = [writer.book_taxi(customer_id, 'Airport', 'Station', '2030-01-01', f'{hour:02d}:00')
+                for hour in (8, 9, 10)]
+    writer.assign_driver(bookings[1], driver_id)
+    # The first request was made before the window
+    writer.cursor.execute('UPDATE booking_events SET ts = ts - 3600 WHERE booking_id = ? AND event = ?',
+                          (bookings[0], BOOKING_EVENT['CREATED']))
+    writer.conn.commit()
+
+    reader = Database(db_name)
+    try:
+        # Seeded from the events on the first call
+        assert pressure(reader) == {'Airport': (2, 0)}
+        writer.book_taxi(customer_id, 'Mall', 'Station', '2030-01-01', '11:00')
+        writer.complete_trips([bookings[1]])
+        # Followed afterwards, without counting anything twice
+        expected = {'Airport': (2, 0), 'Mall': (1, 0), 'Station': (0, 1)}
+        assert pressure(reader) == expected
+        assert pressure(reader) == expected
+        # Cancelling a request made before the window takes nothing back
+        writer.cancel_bookings([bookings[0], bookings[2]])
+        assert pressure(reader) == dict(expected, Airport=(1, 0))
+    finally:
+        reader.close()
+        writer.close()
+
+
+def test_ring_counter_window():
+    counter = RingCounter(15)
+    counter.add(100, 2)
+    counter.add(110)
+    assert counter.total(110) == 3
+    assert counter.total(115) == 1
+    # A late count for a minute whose bucket has moved on is dropped
+    counter.add(125)
+    counter.add(110)
+    counter.remove(110)
+    assert counter.total(125) == 1
+    counter.remove(125)
+    assert counter.total(125) == 0
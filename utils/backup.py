@@ -0,0 +1,92 @@
+"""Online backups and read-only reporting snapshots"""
+import os
+import sqlite3
+import time
+from datetime import datetime
+from utils.constants import BACKUP
+
+
+class BackupManager:
+    """Copies a live database with the sqlite3 online backup API.
+
+    Pages are copied in small steps with a pause between them, so the
+    source is only read-locked briefly and dispatchers keep writing while
+    a backup runs. Copies are written to a temporary file and renamed into
+    place, so readers never see a half-written file. A relative backup_dir
+    is taken relative to the database file, not the working directory.
+    """
+
+    def __init__(self, db_name, backup_dir=BACKUP['DIR'], keep=BACKUP['KEEP']):
+        self.db_name = db_name
+        self.backup_dir = os.path.join(os.path.dirname(os.path.abspath(db_name)), backup_dir)
+        self.keep = keep
+        self.base_name = os.path.splitext(os.path.basename(db_name))[0]
+        self.prefix = self.base_name + '-'
+
+    def copy_to(self, source_conn, path):
+        """Copy the database behind source_conn to path"""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        # Per process, as the scheduler and admin_cli may refresh the same snapshot
+        partial = f'{path}.{os.getpid()}.part'
+        if os.path.exists(partial):
+            os.remove(partial)
+        target = sqlite3.connect(partial)
+        try:
+            source_conn.backup(target, pages=BACKUP['PAGES_PER_STEP'], sleep=BACKUP['STEP_SLEEP'])
+            # A standalone copy should not depend on -wal/-shm side files
+            target.execute('PRAGMA journal_mode=DELETE')
+        finally:
+            target.close()
+        os.replace(partial, path)
+        return path
+
+    def backup(self, source_conn):
+        """Write a timestamped backup, drop the oldest beyond keep, and return its path"""
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        path = self.copy_to(source_conn, os.path.join(self.backup_dir, f'{self.prefix}{stamp}.db'))
+        self.rotate()
+        return path
+
+    def list_backups(self):
+        """Backup paths, newest first"""
+        if not os.path.isdir(self.backup_dir):
+            return []
+        names = sorted((name for name in os.listdir(self.backup_dir)
+                        if name.startswith(self.prefix) and name.endswith('.db')), reverse=True)
+        return [os.path.join(self.backup_dir, name) for name in names]
+
+    def rotate(self):
+        for path in self.list_backups()[self.keep:]:
+            os.remove(path)
+
+    @property
+    def snapshot_path(self):
+        return os.path.join(self.backup_dir, f'{self.base_name}.snapshot.db')
+
+    def refresh_snapshot(self, source_conn):
+        """Replace the reporting snapshot with a fresh copy"""
+        return self.copy_to(source_conn, self.snapshot_path)
+
+
+def snapshot_path(db_name, max_age=BACKUP['SNAPSHOT_INTERVAL'], backup_dir=BACKUP['DIR']):
+    """Path of the reporting snapshot of db_name, taken first if it is
+    missing or older than max_age seconds (when the app's scheduler is not
+    running to refresh it)"""
+    manager = BackupManager(db_name, backup_dir)
+    path = manager.snapshot_path
+    if not os.path.exists(path) or time.time() - os.path.getmtime(path) > max_age:
+        source = sqlite3.connect(db_name)
+        try:
+            manager.refresh_snapshot(source)
+        finally:
+            source.close()
+    return path
+
+
+def open_snapshot(db_name, max_age=BACKUP['SNAPSHOT_INTERVAL'], backup_dir=BACKUP['DIR']):
+    """Open the reporting snapshot of db_name read-only.
+
+    Heavy reports should query this connection rather than the live
+    database, so they never hold locks dispatchers are waiting on.
+    """
+    return sqlite3.connect(f'file:{snapshot_path(db_name, max_age, backup_dir)}?mode=ro', uri=True)
@@ -21,6 +21,217 @@ BOOKING_STATUS = {
     'CANCELLED': 'Cancelled'
 }
 
+# Codes stored in booking_events.event. Each event also records the
+# driver holding the booking; DRIVER_CANCELLED records the one who let it go.
+# UPDATED marks an edit of an open booking and leaves its status alone
+BOOKING_EVENT = {
+    'CREATED': 1,
+    'ASSIGNED': 2,
+    'COMPLETED': 3,
+    'CANCELLED': 4,
+    'DRIVER_CANCELLED': 5,
+    'EXPIRED': 6,
+    'UPDATED': 7
+}
+
+# Outcomes of Database.assign_driver
+ASSIGN_RESULT = {
+    'OK': 'ok',
+    'NOT_FOUND': 'not_found',
+    'CLOSED': 'closed',
+    'CONFLICT': 'conflict',
+    'STALE': 'stale',
+    'REASSIGNED': 'reassigned',
+    'OFF_SHIFT': 'off_shift'
+}
+
+# Recurring booking frequencies and windows (in days)
+RECURRENCE = {
+    'WEEKDAYS': 'Weekdays',
+    'EVERY_N_DAYS': 'Every N days',
+    'DISPATCH_HORIZON_DAYS': 1,
+    'VISIBLE_DAYS': 14
+}
+
+# Rows per page in the booking lists
+PAGE_SIZE = 100
+
+# Background lifecycle jobs: intervals in seconds, grace periods in minutes
+SCHEDULE = {
+    'LIFECYCLE_INTERVAL': 60,
+    'MAINTENANCE_INTERVAL': 3600,
+    'PENDING_GRACE_MINUTES': 30,
+    'OVERDUE_GRACE_MINUTES': 120,
+    'ARCHIVE_AFTER_DAYS': 90,
+    'BATCH_SIZE': 200,
+    'VACUUM_PAGES': 100,
+    'CHECKPOINT_INTERVAL': 3600,
+    'CHECKPOINTS_KEEP': 168
+}
+
+# Online backups: steps copy PAGES_PER_STEP pages then pause STEP_SLEEP
+# seconds; intervals are in seconds
+BACKUP = {
+    'DIR': 'backups',
+    'KEEP': 7,
+    'PAGES_PER_STEP': 64,
+    'STEP_SLEEP': 0.01,
+    'BACKUP_INTERVAL': 6 * 3600,
+    'SNAPSHOT_INTERVAL': 900
+}
+
+# Per-city shards: city -> (database file, shard number >= 1). Users
+# always live in the main database; bookings for unlisted cities, or made
+# before a city was sharded, stay there and are listed as OTHER_CITY.
+# Empty means a single database. At most 9 shards (SQLite's ATTACH limit).
+SHARDS = {}
+OTHER_CITY = 'Other'
+
+# Opt-in UI profiling (or set TAXI_PROFILE=1): handlers slower than
+# SLOW_MS are logged, and the main loop counts as stalled when the
+# heartbeat fires STALL_MS late. F12 dumps a summary.
+PROFILE = {
+    'ENABLED': False,
+    'HEARTBEAT_MS': 100,
+    'STALL_MS': 250,
+    'SLOW_MS': 100,
+    'LOG_FILE': 'ui_profile.log',
+    'FOLDED_FILE': 'ui_profile.folded',
+    'LOG_BYTES': 1000000,
+    'LOG_BACKUPS': 3
+}
+
+# Demand forecasting: weeks of history kept and averaged, the weight
+# lost per older week, and the size of the admin heatmap
+DEMAND = {
+    'HISTORY_WEEKS': 26,
+    'FORECAST_WEEKS': 8,
+    'DECAY': 0.7,
+    'MAX_LOCATIONS': 200,
+    'CHUNK_SIZE': 5000,
+    'HEATMAP_HOURS': 24,
+    'HEATMAP_ROWS': 12,
+    'HOTSPOTS': 10
+}
+
+# Route chaining: fallbacks for location pairs missing from the travel
+# table, how late (minutes) a chained pickup may be reached, and how many
+# pending trips a day needs before it is split by zone across processes
+ROUTES = {
+    'DEFAULT_KM': 10.0,
+    'DEFAULT_MINUTES': 20.0,
+    'LATE_TOLERANCE_MINUTES': 5,
+    'LOCAL_SEARCH_PASSES': 3,
+    'SPLIT_MIN_TRIPS': 200
+}
+
+# Driver terminals: how often (ms) the local replica syncs with the
+# central database, and the replica file name next to it
+SYNC = {
+    'INTERVAL_MS': 30000,
+    'REPLICA_FILE': '{base}.driver{driver_id}.db'
+}
+
+# Monthly driver reports: busiest routes listed per driver, and the
+# cache of finished months kept next to the database
+REPORTS = {
+    'TOP_ROUTES': 3,
+    'CACHE_FILE': '{base}.reports.json'
+}
+
+# Driver timeline: lane and margin sizes in pixels, and the zoom limits
+TIMELINE = {
+    'LANE_HEIGHT': 22,
+    'LABEL_WIDTH': 150,
+    'AXIS_HEIGHT': 24,
+    'SPAN_HOURS': 6,
+    'MIN_SPAN_MINUTES': 30,
+    'ZOOM_STEP': 1.5
+}
+
+# Login sessions on shared terminals: token lifetime (seconds), the
+# in-memory cache of recently validated sessions and how long (seconds)
+# a cached session is trusted before the database is asked again, and
+# how many recent users the login window offers for a quick switch
+SESSIONS = {
+    'TTL': 12 * 3600,
+    'CACHE_SIZE': 256,
+    'CACHE_MAX_AGE': 60,
+    'RECENT_USERS': 6
+}
+
+# Zone supply/demand: counters cover the last WINDOW_MINUTES; a zone with
+# at least MIN_DEMAND requests surges below SURGE_RATIO drivers per
+# request. The admin panel refreshes every REFRESH_MS
+SURGE = {
+    'WINDOW_MINUTES': 15,
+    'MIN_DEMAND': 3,
+    'SURGE_RATIO': 0.8,
+    'REFRESH_MS': 5000
+}
+
+# Driver shifts: how far back (days) the in-memory calendar reaches, and
+# the times the shift editor starts with
+SHIFTS = {
+    'LOOKBACK_DAYS': 1,
+    'DEFAULT_START': '08:00',
+    'DEFAULT_END': '16:00'
+}
+
+# Customer notifications: booking events that notify the customer, the
+# delivery channels each one goes out on, and the outbox worker's pace
+# (seconds). A failed delivery is retried after RETRY_BASE seconds,
+# doubling up to RETRY_MAX, and given up after MAX_ATTEMPTS. Claimed rows
+# are left alone for LEASE seconds
+NOTIFY = {
+    'EVENTS': [BOOKING_EVENT['ASSIGNED'], BOOKING_EVENT['COMPLETED'], BOOKING_EVENT['CANCELLED'],
+               BOOKING_EVENT['DRIVER_CANCELLED'], BOOKING_EVENT['EXPIRED']],
+    'CHANNELS': ['file'],
+    'FILE': '{base}.notifications.jsonl',
+    'SOCKET_ADDRESS': ('127.0.0.1', 8765),
+    'INTERVAL': 5,
+    'BATCH_SIZE': 50,
+    'MAX_ATTEMPTS': 8,
+    'RETRY_BASE': 30,
+    'RETRY_MAX': 3600,
+    'LEASE': 60
+}
+
+# Delivery state of a notification row
+NOTIFICATION_STATUS = {
+    'PENDING': 'pending',
+    'SENT': 'sent',
+    'FAILED': 'failed'
+}
+
+# SQLite settings the storage tuner tries and Database applies
+STORAGE_PRAGMAS = ('page_size', 'cache_size', 'mmap_size', 'temp_store')
+
+# Storage tuner: candidate values (cache_size in pages, or KiB when
+# negative; mmap_size in bytes; temp_store 0 default, 2 memory), the
+# timed operations per candidate after WARMUP untimed ones, and the
+# default operation mix by weight
+TUNER = {
+    'PAGE_SIZES': [4096, 8192, 16384],
+    'CACHE_SIZES': [-2000, -16000, -65536],
+    'MMAP_SIZES': [0, 256 * 1024 * 1024],
+    'TEMP_STORES': [0, 2],
+    'OPERATIONS': 1000,
+    'WARMUP': 100,
+    'SEED': 1,
+    'MIX': {
+        'admin_list': 20,
+        'customer_list': 15,
+        'driver_list': 15,
+        'upcoming': 10,
+        'day_counts': 5,
+        'free_drivers': 10,
+        'book': 10,
+        'assign': 10,
+        'complete': 5
+    }
+}
+
 # User roles
 USER_ROLES = {
     'ADMIN': 'Admin',
@@ -0,0 +1,31 @@
+"""Helpers for building user-facing messages"""
+from utils.constants import ASSIGN_RESULT, BOOKING_EVENT
+
+REJECT_REASONS = {
+    ASSIGN_RESULT['NOT_FOUND']: 'not found',
+    ASSIGN_RESULT['CLOSED']: 'already completed or cancelled',
+    ASSIGN_RESULT['CONFLICT']: 'driver has an overlapping booking',
+    ASSIGN_RESULT['STALE']: 'changed by another dispatcher, refresh and retry',
+    ASSIGN_RESULT['REASSIGNED']: 'no longer assigned to you',
+    ASSIGN_RESULT['OFF_SHIFT']: 'driver is not on shift at pickup time'
+}
+
+# Customer notifications per booking event; fields come from
+# Database.claim_notifications
+NOTIFY_MESSAGES = {
+    BOOKING_EVENT['ASSIGNED']: 'Booking #{booking_id}: {driver} will pick you up at {pickup} on {date} at {time}.',
+    BOOKING_EVENT['COMPLETED']: 'Booking #{booking_id}: your trip to {dropoff} is complete. Thank you!',
+    BOOKING_EVENT['CANCELLED']: 'Booking #{booking_id} from {pickup} on {date} at {time} was cancelled.',
+    BOOKING_EVENT['DRIVER_CANCELLED']: 'Booking #{booking_id}: your driver had to cancel the trip from {pickup} on {date} at {time}.',
+    BOOKING_EVENT['EXPIRED']: 'Booking #{booking_id} from {pickup} expired before a driver could be assigned.'
+}
+
+
+def bulk_summary(action, updated, rejected):
+    """Combine the outcome of a bulk action into one message"""
+    lines = [f"{action} {len(updated)} booking(s)."]
+    if rejected:
+        lines.append(f"Skipped {len(rejected)}:")
+        for booking_id, reason in rejected.items():
+            lines.append(f"  #{booking_id}: {REJECT_REASONS.get(reason, reason)}")
+    return "\n".join(lines)
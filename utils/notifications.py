@@ -0,0 +1,193 @@
+"""Delivery of queued customer notifications"""
+import json
+import logging
+import os
+import socket
+import time
+from abc import ABC, abstractmethod
+from utils.constants import NOTIFY
+from utils.messages import NOTIFY_MESSAGES
+
+logger = logging.getLogger(__name__)
+
+
+class Channel(ABC):
+    """A way of reaching customers.
+
+    send() may buffer; flush() must only return once every message sent
+    since the last flush is delivered, and raise otherwise. Each message
+    carries a key unique to its notification across every database, so a
+    message repeated after a crash can be recognised and dropped by the
+    receiving end.
+    """
+
+    @abstractmethod
+    def send(self, key, recipient, text):
+        """Queue text for recipient under key"""
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FileChannel(Channel):
+    """Appends messages as JSON lines to a local file, a stand-in for SMS or email.
+
+    Messages are held until flush(), which appends them in one write and
+    fsyncs; only then do their keys count as delivered. A failed flush
+    cuts the file back to where the batch started, so the retry writes
+    the batch again. Keys already in the file are skipped, so a batch
+    delivered again after a crash is written only once.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.keys = set()
+        if os.path.exists(path):
+            with open(path) as outbox:
+                for line in outbox:
+                    try:
+                        self.keys.add(json.loads(line)['key'])
+                    except ValueError:
+                        # A line torn by a crash mid-write was never delivered
+                        continue
+        self.lines = []
+        self.pending = set()
+        self.fd = None
+
+    def send(self, key, recipient, text):
+        if key in self.keys or key in self.pending:
+            return
+        self.lines.append(json.dumps({'key': key, 'to': recipient, 'text': text, 'ts': int(time.time())}) + '\n')
+        self.pending.add(key)
+
+    def flush(self):
+        lines, pending = self.lines, self.pending
+        self.lines, self.pending = [], set()
+        if not lines:
+            return
+        if self.fd is None:
+            self.fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        start = os.lseek(self.fd, 0, os.SEEK_END)
+        try:
+            data = ''.join(lines).encode()
+            while data:
+                data = data[os.write(self.fd, data):]
+            os.fsync(self.fd)
+        except OSError:
+            try:
+                os.ftruncate(self.fd, start)
+            except OSError:
+                pass
+            raise
+        self.keys |= pending
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+class SocketChannel(Channel):
+    """Sends messages as JSON lines over TCP to a local gateway.
+
+    One connection per batch; the gateway is expected to drop keys it has
+    seen. Connection errors fail the whole batch, which is then retried.
+    """
+
+    def __init__(self, address):
+        self.address = tuple(address)
+        self.lines = []
+
+    def send(self, key, recipient, text):
+        self.lines.append(json.dumps({'key': key, 'to': recipient, 'text': text}) + '\n')
+
+    def flush(self):
+        lines, self.lines = self.lines, []
+        if not lines:
+            return
+        with socket.create_connection(self.address, timeout=5) as gateway:
+            gateway.sendall(''.join(lines).encode())
+
+
+def create_channels(db_name, names=NOTIFY['CHANNELS']):
+    """{name: Channel} for the configured channel names"""
+    base = os.path.splitext(db_name)[0]
+    factories = {
+        'file': lambda: FileChannel(NOTIFY['FILE'].format(base=base)),
+        'socket': lambda: SocketChannel(NOTIFY['SOCKET_ADDRESS'])
+    }
+    return {name: factories[name]() for name in names}
+
+
+class NotificationWorker:
+    """Drains the notifications outbox of a database in batches.
+
+    Runs as a scheduler job on the background thread, so status changes
+    only pay for an INSERT. Each batch is claimed, handed to the channels,
+    flushed, and recorded: rows whose channel flushed are marked sent,
+    the rest retried with exponential backoff until MAX_ATTEMPTS. A row is
+    marked sent only after its channel confirmed delivery, and channels
+    drop repeated keys, so each notification reaches the customer once.
+    """
+
+    def __init__(self, channels):
+        self.channels = channels
+
+    def deliver(self, db):
+        """Deliver every due notification; returns how many were sent"""
+        # Notification ids are per file, so keys also name the database
+        source = os.path.splitext(os.path.basename(db.db_name))[0]
+        total = 0
+        while True:
+            batch = db.claim_notifications(NOTIFY['BATCH_SIZE'], NOTIFY['LEASE'])
+            if not batch:
+                return total
+            sent, failed = self.deliver_batch(batch, source)
+            db.finish_notifications(sent, failed)
+            total += len(sent)
+            if len(batch) < NOTIFY['BATCH_SIZE']:
+                return total
+
+    def deliver_batch(self, batch, source):
+        """Send one claimed batch from the database named source; returns
+        (sent ids, {id: (error, retry_ts)})"""
+        by_channel = {}
+        failed = {}
+        for notification_id, channel, event, attempts, booking_id, name, phone, *booking in batch:
+            pickup, dropoff, booking_date, booking_time, driver = booking
+            try:
+                text = NOTIFY_MESSAGES[event].format(
+                    booking_id=booking_id, name=name, pickup=pickup, dropoff=dropoff,
+                    date=booking_date, time=booking_time, driver=driver or 'your driver')
+                self.channels[channel].send(f"{source}-notification-{notification_id}", phone, text)
+            except Exception as error:
+                failed[notification_id] = self.retry(attempts, error)
+                continue
+            by_channel.setdefault(channel, []).append((notification_id, attempts))
+
+        sent = []
+        for channel, notifications in by_channel.items():
+            try:
+                self.channels[channel].flush()
+            except Exception as error:
+                logger.warning("Notification channel %s failed: %s", channel, error)
+                for notification_id, attempts in notifications:
+                    failed[notification_id] = self.retry(attempts, error)
+            else:
+                sent += [notification_id for notification_id, _ in notifications]
+        return sent, failed
+
+    @staticmethod
+    def retry(attempts, error):
+        """(error text, next attempt timestamp or None to give up)"""
+        if attempts >= NOTIFY['MAX_ATTEMPTS']:
+            return str(error), None
+        delay = min(NOTIFY['RETRY_BASE'] * 2 ** (attempts - 1), NOTIFY['RETRY_MAX'])
+        return str(error), int(time.time()) + delay
+
+    def close(self):
+        for channel in self.channels.values():
+            channel.close()
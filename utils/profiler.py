@@ -0,0 +1,194 @@
+"""Opt-in profiler for Tk callbacks and main-loop stalls"""
+import functools
+import inspect
+import logging
+import threading
+import time
+import tkinter as tk
+from collections import defaultdict
+from logging.handlers import RotatingFileHandler
+from tkinter import messagebox
+from utils.constants import PROFILE
+
+
+class UIProfiler:
+    """Times every callback the views hand to Tk.
+
+    install() wraps each command= callback and bound event registered from
+    a views module, and the public methods of the given database classes.
+    A handler's wall time is split into database time (per method), time
+    spent waiting on message boxes, and the rest, which is widget work
+    such as Treeview inserts. Slow handlers go to a rolling log.
+
+    attach() starts a heartbeat after() timer on a Tk root. When the
+    heartbeat fires more than STALL_MS late the main loop was blocked, and
+    the stall is logged against the handler that was running.
+
+    Totals are kept as folded stacks ("handler;db;Database.method"), which
+    summary() prints and flamegraph tools read directly.
+
+    uninstall() puts back everything install() replaced, and close() also
+    detaches the log file. Callbacks registered while installed stay
+    wrapped, but only add to the totals.
+    """
+
+    def __init__(self, log_file=PROFILE['LOG_FILE']):
+        self.totals = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.stalls = 0
+        self.last_handler = None
+        self._stack = []
+        self._in_db = False
+        self._main_thread = threading.main_thread()
+        # (owner, attribute, original) for everything install() replaced
+        self._patched = []
+
+        self.log = logging.getLogger('taxi.ui_profile')
+        self.log.setLevel(logging.INFO)
+        self.log.propagate = False
+        handler = RotatingFileHandler(log_file, maxBytes=PROFILE['LOG_BYTES'],
+                                      backupCount=PROFILE['LOG_BACKUPS'])
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+        self.log.addHandler(handler)
+        self._handler = handler
+
+    def install(self, profiled_classes=()):
+        """Start wrapping view callbacks and the given classes' public methods.
+
+        If any patch fails, the ones already made are undone before the
+        error propagates.
+        """
+        if self._patched:
+            return self
+        profiler = self
+        register = tk.Misc._register
+
+        def _register(widget, func, subst=None, needcleanup=1):
+            if getattr(func, '__module__', '').startswith('views.'):
+                func = profiler.wrap_handler(func)
+            return register(widget, func, subst, needcleanup)
+
+        try:
+            self._patch(tk.Misc, '_register', _register)
+            self._patch(messagebox, '_show', self.wrap_dialog(messagebox._show))
+            for cls in profiled_classes:
+                for name, method in list(vars(cls).items()):
+                    # Generators only do their work once iterated, so timing the
+                    # call would say nothing
+                    if (not name.startswith('_') and inspect.isfunction(method)
+                            and not inspect.isgeneratorfunction(method)):
+                        self._patch(cls, name, self.wrap_db(f'{cls.__name__}.{name}', method))
+        except Exception:
+            self.uninstall()
+            raise
+        self.log.info('profiling enabled')
+        return self
+
+    def _patch(self, owner, name, replacement):
+        original = vars(owner)[name]
+        setattr(owner, name, replacement)
+        self._patched.append((owner, name, original))
+
+    def uninstall(self):
+        """Put back every attribute install() replaced, newest first"""
+        while self._patched:
+            owner, name, original = self._patched.pop()
+            setattr(owner, name, original)
+
+    def close(self):
+        """Uninstall and detach the log file"""
+        try:
+            self.uninstall()
+        finally:
+            self.log.removeHandler(self._handler)
+            self._handler.close()
+
+    def attach(self, root):
+        """Watch root's main loop for stalls and dump a summary on F12"""
+        interval = PROFILE['HEARTBEAT_MS'] / 1000
+        expected = [time.perf_counter() + interval]
+
+        def heartbeat():
+            now = time.perf_counter()
+            lag_ms = (now - expected[0]) * 1000
+            if lag_ms >= PROFILE['STALL_MS']:
+                self.stalls += 1
+                culprit = self._stack[-1]['name'] if self._stack else self.last_handler
+                self.log.warning('main loop stalled %.0fms (handler: %s)', lag_ms, culprit or 'none')
+            expected[0] = now + interval
+            root.after(PROFILE['HEARTBEAT_MS'], heartbeat)
+
+        root.after(PROFILE['HEARTBEAT_MS'], heartbeat)
+        root.bind_all('<F12>', lambda e: self.dump_summary(), add='+')
+
+    def wrap_handler(self, func):
+        name = getattr(func, '__qualname__', repr(func))
+
+        @functools.wraps(func)
+        def handler(*args):
+            record = {'name': name, 'db': defaultdict(float), 'dialog': 0.0}
+            self._stack.append(record)
+            start = time.perf_counter()
+            try:
+                return func(*args)
+            finally:
+                self._stack.pop()
+                self._finish(record, time.perf_counter() - start)
+        return handler
+
+    def wrap_db(self, name, method):
+        @functools.wraps(method)
+        def timed(*args, **kwargs):
+            # Only the outermost call made by a UI handler is charged; jobs
+            # on the scheduler threads do not block the main loop
+            if (self._in_db or not self._stack
+                    or threading.current_thread() is not self._main_thread):
+                return method(*args, **kwargs)
+            self._in_db = True
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self._in_db = False
+                self._stack[-1]['db'][name] += time.perf_counter() - start
+        return timed
+
+    def wrap_dialog(self, show):
+        @functools.wraps(show)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return show(*args, **kwargs)
+            finally:
+                if self._stack:
+                    self._stack[-1]['dialog'] += time.perf_counter() - start
+        return timed
+
+    def _finish(self, record, elapsed):
+        name = record['name']
+        db = sum(record['db'].values())
+        widget = max(0.0, elapsed - db - record['dialog'])
+        self.calls[name] += 1
+        self.totals[f'{name};widget'] += widget
+        for method, seconds in record['db'].items():
+            self.totals[f'{name};db;{method}'] += seconds
+        if record['dialog']:
+            self.totals[f'{name};dialog'] += record['dialog']
+        self.last_handler = name
+        if (elapsed - record['dialog']) * 1000 >= PROFILE['SLOW_MS']:
+            self.log.info('slow handler %s: %.1fms (db %.1fms, widget %.1fms, dialog %.1fms)',
+                          name, elapsed * 1000, db * 1000, widget * 1000, record['dialog'] * 1000)
+
+    def summary(self, limit=30):
+        """Folded stacks with total milliseconds, slowest first"""
+        lines = [f'{self.stalls} stall(s), {sum(self.calls.values())} handler call(s)']
+        for stack, seconds in sorted(self.totals.items(), key=lambda item: -item[1])[:limit]:
+            lines.append(f'{stack} {seconds * 1000:.1f}')
+        return '\n'.join(lines)
+
+    def dump_summary(self):
+        """Write the summary to the log and full folded stacks (in microseconds) to FOLDED_FILE"""
+        self.log.info('summary\n%s', self.summary())
+        with open(PROFILE['FOLDED_FILE'], 'w') as folded:
+            for stack, seconds in self.totals.items():
+                folded.write(f'{stack} {int(seconds * 1e6)}\n')
@@ -0,0 +1,133 @@
+"""Background job scheduler"""
+import heapq
+import itertools
+import logging
+import threading
+import time
+from database import Database
+from utils.backup import BackupManager
+from utils.constants import SCHEDULE, BACKUP, NOTIFY
+from utils.notifications import NotificationWorker, create_channels
+
+logger = logging.getLogger(__name__)
+
+
+class Scheduler:
+    """Runs recurring jobs on one background thread, off the Tk main loop.
+
+    Due times are kept in a heap, so the thread sleeps until the earliest
+    job instead of polling. The context factory is called once on the
+    worker thread and its result is passed to every job; this lets jobs
+    share a database connection that the UI thread never touches.
+    """
+
+    def __init__(self, context_factory=None):
+        self.context_factory = context_factory
+        self._heap = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._running = False
+        self._thread = None
+
+    def every(self, interval, job, delay=None):
+        """Run job(context) every interval seconds, first after delay (default interval)"""
+        due = time.monotonic() + (interval if delay is None else delay)
+        with self._condition:
+            heapq.heappush(self._heap, (due, next(self._sequence), interval, job))
+            self._condition.notify()
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        context = self.context_factory() if self.context_factory else None
+        try:
+            while True:
+                with self._condition:
+                    while self._running and (not self._heap or self._heap[0][0] > time.monotonic()):
+                        timeout = self._heap[0][0] - time.monotonic() if self._heap else None
+                        self._condition.wait(timeout)
+                    if not self._running:
+                        return
+                    _, _, interval, job = heapq.heappop(self._heap)
+
+                try:
+                    job(context)
+                except Exception:
+                    logger.exception("Scheduled job %s failed", getattr(job, '__name__', job))
+
+                with self._condition:
+                    heapq.heappush(self._heap, (time.monotonic() + interval,
+                                                next(self._sequence), interval, job))
+        finally:
+            close = getattr(context, 'close', None)
+            if close:
+                close()
+
+
+def expire_stale_bookings(db):
+    db.expire_stale_bookings(SCHEDULE['PENDING_GRACE_MINUTES'], SCHEDULE['BATCH_SIZE'])
+
+
+def flag_overdue_trips(db):
+    db.flag_overdue_trips(SCHEDULE['OVERDUE_GRACE_MINUTES'], SCHEDULE['BATCH_SIZE'])
+
+
+def materialize_due_occurrences(db):
+    db.materialize_due_occurrences()
+
+
+def archive_closed_bookings(db):
+    db.archive_closed_bookings(SCHEDULE['ARCHIVE_AFTER_DAYS'], SCHEDULE['BATCH_SIZE'])
+
+
+def checkpoint_booking_events(db):
+    db.checkpoint_events(SCHEDULE['CHECKPOINTS_KEEP'])
+
+
+def run_maintenance(db):
+    db.run_maintenance(SCHEDULE['VACUUM_PAGES'])
+
+
+def purge_sessions(db):
+    db.purge_sessions()
+
+
+def backup_database(db):
+    BackupManager(db.db_name).backup(db.conn)
+
+
+def refresh_reporting_snapshot(db):
+    BackupManager(db.db_name).refresh_snapshot(db.conn)
+
+
+def create_lifecycle_scheduler(db_name, notifier=None):
+    """Scheduler for the booking lifecycle jobs, with its own connection to db_name.
+
+    notifier is the NotificationWorker draining the outbox; pass one in
+    to close its channels after the scheduler stops.
+    """
+    notifier = notifier or NotificationWorker(create_channels(db_name))
+    scheduler = Scheduler(lambda: Database(db_name))
+    for job in (expire_stale_bookings, flag_overdue_trips, materialize_due_occurrences):
+        scheduler.every(SCHEDULE['LIFECYCLE_INTERVAL'], job, delay=0)
+    for job in (archive_closed_bookings, run_maintenance, purge_sessions):
+        scheduler.every(SCHEDULE['MAINTENANCE_INTERVAL'], job)
+    scheduler.every(SCHEDULE['CHECKPOINT_INTERVAL'], checkpoint_booking_events)
+    scheduler.every(BACKUP['BACKUP_INTERVAL'], backup_database)
+    scheduler.every(BACKUP['SNAPSHOT_INTERVAL'], refresh_reporting_snapshot, delay=0)
+    # Customer notifications queued by status changes
+    scheduler.every(NOTIFY['INTERVAL'], notifier.deliver, delay=0)
+    return scheduler
@@ -0,0 +1,225 @@
+"""Benchmarks SQLite settings against copies of a live database"""
+import itertools
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+from database import Database
+from utils.backup import BackupManager
+from utils.constants import TUNER, BOOKING_STATUS, PAGE_SIZE
+from utils.timestamps import from_pickup_ts
+
+# Database methods the UI profiler times, and the operations standing in for them
+PROFILED_OPERATIONS = {
+    'Database.list_bookings': ['admin_list', 'customer_list', 'driver_list'],
+    'Database.get_bookings_between': ['upcoming'],
+    'Database.get_upcoming_bookings': ['upcoming'],
+    'Database.count_bookings_by_day': ['day_counts'],
+    'Database.get_free_drivers': ['free_drivers'],
+    'Database.book_taxi': ['book'],
+    'Database.assign_driver': ['assign'],
+    'Database.assign_drivers': ['assign'],
+    'Database.complete_trips': ['complete'],
+    'Database.complete_trip': ['complete']
+}
+
+
+def mix_from_profile(path):
+    """Operation weights from a UI profiler folded file (ui_profile.folded).
+
+    Each Database method's recorded time is shared among the operations
+    that stand in for it, so the replay spends its time where the
+    dashboards did. Returns None if the file records none of them.
+    """
+    mix = {}
+    with open(path) as folded:
+        for line in folded:
+            stack, _, millis = line.rstrip().rpartition(' ')
+            operations = PROFILED_OPERATIONS.get(stack.split(';')[-1])
+            if not operations:
+                continue
+            for operation in operations:
+                mix[operation] = mix.get(operation, 0.0) + float(millis) / len(operations)
+    return mix or None
+
+
+class Workload:
+    """A seeded sequence of dashboard operations replayed against one database.
+
+    Arguments are drawn from the database's own customers, drivers,
+    locations and pickup times, so every copy of the same file replays
+    exactly the same calls.
+    """
+
+    def __init__(self, db, mix, seed=TUNER['SEED']):
+        self.mix = mix
+        self.seed = seed
+        db.cursor.execute("SELECT user_id FROM users WHERE role = 'Customer' ORDER BY user_id")
+        self.customers = [row[0] for row in db.cursor.fetchall()]
+        db.cursor.execute("SELECT user_id FROM users WHERE role = 'Driver' ORDER BY user_id")
+        self.drivers = [row[0] for row in db.cursor.fetchall()]
+        db.cursor.execute('SELECT DISTINCT pickup_location FROM bookings ORDER BY 1 LIMIT 100')
+        self.locations = [row[0] for row in db.cursor.fetchall()]
+        db.cursor.execute('SELECT MIN(pickup_ts), MAX(pickup_ts) FROM bookings')
+        self.first_ts, self.last_ts = db.cursor.fetchone()
+
+    def usable(self):
+        return bool(self.customers and self.drivers and self.locations)
+
+    def run(self, db, warmup, operations):
+        """Replay warmup untimed and then operations timed calls;
+        returns {operation: [seconds per call]}"""
+        rng = random.Random(self.seed)
+        names, weights = list(self.mix), list(self.mix.values())
+        timings = {name: [] for name in names}
+        for number in range(warmup + operations):
+            name = rng.choices(names, weights)[0]
+            call = getattr(self, name)(db, rng)
+            if call is None:
+                continue
+            start = time.perf_counter()
+            call()
+            elapsed = time.perf_counter() - start
+            if number >= warmup:
+                timings[name].append(elapsed)
+        return timings
+
+    def pickup_ts(self, rng):
+        return rng.randint(self.first_ts, self.last_ts) // 60 * 60
+
+    def pick_booking(self, db, rng, status):
+        """A booking id with the given status, chosen before timing starts"""
+        db.cursor.execute('SELECT COUNT(*) FROM bookings WHERE status = ?', (status,))
+        count = db.cursor.fetchone()[0]
+        if not count:
+            return None
+        db.cursor.execute('SELECT booking_id FROM bookings WHERE status = ? LIMIT 1 OFFSET ?',
+                          (status, rng.randrange(count)))
+        return db.cursor.fetchone()[0]
+
+    # Each operation returns the call to time, or None if it cannot run
+
+    def admin_list(self, db, rng):
+        offset = rng.randrange(5) * PAGE_SIZE
+        return lambda: db.list_bookings('admin', None, 'Date', True, None, PAGE_SIZE, offset)
+
+    def customer_list(self, db, rng):
+        customer_id = rng.choice(self.customers)
+        return lambda: db.list_bookings('customer', customer_id)
+
+    def driver_list(self, db, rng):
+        driver_id = rng.choice(self.drivers)
+        return lambda: db.list_bookings('driver', driver_id)
+
+    def upcoming(self, db, rng):
+        start_ts = self.pickup_ts(rng)
+        return lambda: db.get_bookings_between(start_ts, start_ts + 2 * 3600)
+
+    def day_counts(self, db, rng):
+        start_ts = self.pickup_ts(rng)
+        return lambda: db.count_bookings_by_day(start_ts, start_ts + 7 * 86400)
+
+    def free_drivers(self, db, rng):
+        pickup_ts = self.pickup_ts(rng)
+
+        def call():
+            # Measure the bitmap load, not the warm cache
+            db.availability.clear()
+            db.get_free_drivers(self.drivers, [pickup_ts])
+        return call
+
+    def book(self, db, rng):
+        customer_id = rng.choice(self.customers)
+        pickup, dropoff = rng.choice(self.locations), rng.choice(self.locations)
+        booking_date, booking_time = from_pickup_ts(self.pickup_ts(rng))
+        return lambda: db.book_taxi(customer_id, pickup, dropoff, booking_date, booking_time)
+
+    def assign(self, db, rng):
+        booking_id = self.pick_booking(db, rng, BOOKING_STATUS['PENDING'])
+        driver_id = rng.choice(self.drivers)
+        return None if booking_id is None else lambda: db.assign_driver(booking_id, driver_id)
+
+    def complete(self, db, rng):
+        booking_id = self.pick_booking(db, rng, BOOKING_STATUS['ASSIGNED'])
+        return None if booking_id is None else lambda: db.complete_trips([booking_id])
+
+
+def candidates(page_sizes=TUNER['PAGE_SIZES'], cache_sizes=TUNER['CACHE_SIZES'],
+               mmap_sizes=TUNER['MMAP_SIZES'], temp_stores=TUNER['TEMP_STORES']):
+    """Every combination of the candidate values, grouped by page size"""
+    return [{'page_size': page_size, 'cache_size': cache_size, 'mmap_size': mmap_size,
+             'temp_store': temp_store}
+            for page_size, cache_size, mmap_size, temp_store
+            in itertools.product(page_sizes, cache_sizes, mmap_sizes, temp_stores)]
+
+
+class StorageTuner:
+    """Replays a workload under each candidate setting and measures it.
+
+    The source database is copied with the online backup API once per
+    page size, since changing it means rewriting the file; every candidate
+    then runs on a fresh file copy of that, so writes made by one
+    candidate never reach the next. The copies live in a temporary
+    directory next to the source and are removed afterwards.
+    """
+
+    def __init__(self, db, mix=None, operations=TUNER['OPERATIONS'], warmup=TUNER['WARMUP']):
+        self.db = db
+        self.workload = Workload(db, mix or TUNER['MIX'])
+        self.operations = operations
+        self.warmup = warmup
+
+    def run(self, settings_list):
+        """Measure every settings dict; returns result dicts, best first.
+
+        Each result holds the settings plus ops_per_sec over the timed
+        calls and p50_ms / p95_ms call latency.
+        """
+        results = []
+        work_dir = tempfile.mkdtemp(prefix='tuner-', dir=os.path.dirname(os.path.abspath(self.db.db_name)))
+        try:
+            base_copies = {}
+            for settings in settings_list:
+                page_size = settings['page_size']
+                if page_size not in base_copies:
+                    base_copies[page_size] = self.base_copy(work_dir, page_size)
+                results.append(dict(settings, **self.measure(base_copies[page_size], work_dir, settings)))
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        results.sort(key=lambda result: (-result['ops_per_sec'], result['p95_ms']))
+        return results
+
+    def base_copy(self, work_dir, page_size):
+        path = os.path.join(work_dir, f'base-{page_size}.db')
+        BackupManager(self.db.db_name).copy_to(self.db.conn, path)
+        conn = sqlite3.connect(path)
+        try:
+            conn.execute(f'PRAGMA page_size = {int(page_size)}')
+            conn.execute('VACUUM')
+            conn.execute('PRAGMA journal_mode=WAL')
+        finally:
+            conn.close()
+        return path
+
+    def measure(self, base_path, work_dir, settings):
+        path = os.path.join(work_dir, 'candidate.db')
+        shutil.copyfile(base_path, path)
+        db = Database(path)
+        try:
+            db.apply_storage_settings(settings)
+            timings = self.workload.run(db, self.warmup, self.operations)
+        finally:
+            db.close()
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+        calls = sorted(seconds for per_operation in timings.values() for seconds in per_operation)
+        timed = sum(calls)
+        return {
+            'ops_per_sec': len(calls) / timed if timed else 0.0,
+            'p50_ms': calls[len(calls) // 2] * 1000 if calls else 0.0,
+            'p95_ms': calls[int(len(calls) * 0.95)] * 1000 if calls else 0.0
+        }
+
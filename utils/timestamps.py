@@ -0,0 +1,51 @@
+"""Conversions between booking date/time text and pickup timestamps"""
+from datetime import datetime, date, time
+
+DATE_FORMAT = "%Y-%m-%d"
+TIME_FORMAT = "%H:%M"
+
+
+def to_pickup_ts(booking_date, booking_time):
+    """Local 'YYYY-MM-DD' and 'HH:MM' to an epoch timestamp in seconds"""
+    return int(datetime.strptime(f"{booking_date} {booking_time}",
+                                 f"{DATE_FORMAT} {TIME_FORMAT}").timestamp())
+
+
+def from_pickup_ts(pickup_ts):
+    """Epoch timestamp back to the (booking_date, booking_time) text pair"""
+    moment = datetime.fromtimestamp(pickup_ts)
+    return moment.strftime(DATE_FORMAT), moment.strftime(TIME_FORMAT)
+
+
+def day_bounds(day):
+    """Timestamps of the start of day and of the following day"""
+    start = datetime.combine(day, time.min)
+    return int(start.timestamp()), int(datetime.combine(date.fromordinal(day.toordinal() + 1),
+                                                         time.min).timestamp())
+
+
+def prefix_range(prefix):
+    """Timestamp range [start, end) covered by a 'YYYY', 'YYYY-MM' or 'YYYY-MM-DD' prefix.
+
+    Returns None if the prefix is not one of those forms.
+    """
+    parts = prefix.split('-')
+    if len(parts) > 3 or any(len(part) != width for part, width in zip(parts, (4, 2, 2))):
+        return None
+    try:
+        numbers = [int(part) for part in parts]
+    except ValueError:
+        return None
+    try:
+        if len(numbers) == 1:
+            start, end = date(numbers[0], 1, 1), date(numbers[0] + 1, 1, 1)
+        elif len(numbers) == 2:
+            year, month = numbers
+            start = date(year, month, 1)
+            end = date(year + month // 12, month % 12 + 1, 1)
+        else:
+            return day_bounds(date(*numbers))
+    except ValueError:
+        return None
+    return (int(datetime.combine(start, time.min).timestamp()),
+            int(datetime.combine(end, time.min).timestamp()))
@@ -1,15 +1,22 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-from utils.constants import COLORS, FONTS, BOOKING_STATUS
+from utils.constants import COLORS, FONTS, ASSIGN_RESULT, OTHER_CITY, SURGE
+from views.booking_table import BookingTable, show_bulk_result
 
 class AdminDashboard:
     """Admin dashboard for managing bookings and drivers"""
     
-    def __init__(self, root, db, user_data, logout_callback, fullscreen=False, geometry=None):
+    def __init__(self, root, db, user_data, logout_callback, fullscreen=False, geometry=None, shards=None):
         self.root = root
         self.db = db
+        # With per-city shards, self.db is the selected city's database and
+        # the list is read across all of them; city None means all cities
+        self.shards = shards
+        self.directory = db
+        self.city = None
         self.user_id, self.username, self.role, self.name = user_data
         self.logout_callback = logout_callback
+        self.pressure_job = None
         
         self.root.title(f"Admin Dashboard - {self.name}")
         # Set window state BEFORE setting up UI - fullscreen takes priority
@@ -23,8 +30,9 @@ class AdminDashboard:
             self.root.geometry("1000x650")
         
         self.setup_ui()
-        self.load_bookings()
         self.load_drivers()
+        self.load_bookings()
+        self.refresh_zone_pressure()
     
     def setup_ui(self):
         """Setup admin UI"""
@@ -65,11 +73,11 @@ class AdminDashboard:
         
         tk.Label(
             assign_frame,
-            text="Select Booking ID:",
+            text="Select Booking ID(s):",
             font=FONTS['normal']
         ).pack(side=tk.LEFT, padx=5)
         
-        self.booking_id_entry = tk.Entry(assign_frame, font=FONTS['normal'], width=10)
+        self.booking_id_entry = tk.Entry(assign_frame, font=FONTS['normal'], width=16)
         self.booking_id_entry.pack(side=tk.LEFT, padx=5)
         
         tk.Label(
@@ -96,6 +104,16 @@ class AdminDashboard:
             command=self.assign_driver
         ).pack(side=tk.LEFT, padx=10)
         
+        tk.Button(
+            assign_frame,
+            text="Cancel Selected",
+            bg=COLORS['danger'],
+            fg=COLORS['white'],
+            font=FONTS['button'],
+            cursor="hand2",
+            command=self.cancel_bookings
+        ).pack(side=tk.LEFT, padx=5)
+        
         tk.Button(
             assign_frame,
             text="Refresh",
@@ -115,6 +133,67 @@ class AdminDashboard:
             command=self.open_driver_registration
         ).pack(side=tk.LEFT, padx=10)
         
+        tk.Button(
+            header,
+            text="Demand Forecast",
+            bg=COLORS['info'],
+            fg="white",
+            font=FONTS["button"],
+            command=self.open_demand_forecast
+        ).pack(side=tk.LEFT, padx=10)
+        
+        tk.Button(
+            header,
+            text="Driver Timeline",
+            bg=COLORS['info'],
+            fg="white",
+            font=FONTS["button"],
+            command=self.open_timeline
+        ).pack(side=tk.LEFT, padx=10)
+        
+        tk.Button(
+            header,
+            text="Shifts",
+            bg=COLORS['info'],
+            fg="white",
+            font=FONTS["button"],
+            command=self.open_shifts
+        ).pack(side=tk.LEFT, padx=10)
+        
+        if self.shards:
+            self.city_combo = ttk.Combobox(
+                header,
+                font=FONTS['normal'],
+                width=15,
+                state='readonly',
+                values=["All Cities"] + self.shards.cities
+            )
+            self.city_combo.set("All Cities")
+            self.city_combo.pack(side=tk.LEFT, padx=10)
+            self.city_combo.bind('<<ComboboxSelected>>', self.on_city_change)
+        
+        # Supply and demand per pickup zone, from the in-memory counters
+        pressure_frame = tk.LabelFrame(
+            container,
+            text=f"Zone Supply / Demand (last {SURGE['WINDOW_MINUTES']} min)",
+            font=FONTS['subheader'],
+            padx=10,
+            pady=10
+        )
+        pressure_frame.pack(fill=tk.X, pady=(0, 20))
+        
+        self.pressure_tree = ttk.Treeview(
+            pressure_frame,
+            columns=("Zone", "Demand", "Supply", "Ratio", "Surge"),
+            show='headings',
+            height=4
+        )
+        for column in ("Zone", "Demand", "Supply", "Ratio", "Surge"):
+            self.pressure_tree.heading(column, text=column)
+            self.pressure_tree.column(column, width=200 if column == "Zone" else 90)
+        self.pressure_tree.tag_configure('surge', foreground=COLORS['danger'])
+        self.pressure_tree.pack(fill=tk.X)
+        
         # Bookings list
         list_frame = tk.LabelFrame(
             container,
@@ -127,100 +206,165 @@ class AdminDashboard:
         
         # Treeview
         columns = ("ID", "Customer", "Pickup", "Dropoff", "Date", "Time", "Driver", "Status")
-        self.tree = ttk.Treeview(list_frame, columns=columns, show="headings", height=20)
-        
-        for col in columns:
-            self.tree.heading(col, text=col)
-            width = 60 if col == "ID" else 120
-            self.tree.column(col, width=width)
-        
-        scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.tree.yview)
-        self.tree.configure(yscrollcommand=scrollbar.set)
-        
-        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        if self.shards:
+            columns += ("City",)
+        self.table = BookingTable(
+            list_frame,
+            columns,
+            fetch=self.fetch_bookings,
+            reload=self.load_bookings,
+            widths={'ID': 60, 'default': 120}
+        )
+        self.tree = self.table.tree
+        # Assigned trips flagged overdue by the background scheduler
+        self.tree.tag_configure('overdue', foreground=COLORS['danger'])
         
         self.tree.bind('<ButtonRelease-1>', self.on_booking_select)
     
+    def on_city_change(self, event):
+        """Switch assignments and the booking list to the chosen city"""
+        city = self.city_combo.get()
+        self.city = None if city == "All Cities" else city
+        self.db = self.shards.for_city(self.city) if self.city else self.directory
+        self.table.go_to_page(0)
+        self.load_drivers()
+        self.refresh_zone_pressure()
+    
+    def fetch_bookings(self, *page):
+        if self.shards:
+            cities = [self.city] if self.city else None
+            return self.shards.list_bookings('admin', None, *page, cities=cities)
+        return self.db.list_bookings('admin', None, *page)
+    
     def load_drivers(self):
         """Load available drivers"""
-        drivers = self.db.get_all_drivers()
+        city = self.city if self.city != OTHER_CITY else None
+        drivers = self.directory.get_all_drivers(city)
         self.drivers = {name: user_id for user_id, name in drivers}
         self.driver_combo['values'] = list(self.drivers.keys())
     
     def load_bookings(self):
         """Load all bookings"""
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        
-        self.db.cursor.execute('''
-            SELECT b.booking_id, c.name as customer_name, 
-                   b.pickup_location, b.dropoff_location, 
-                   b.booking_date, b.booking_time, 
-                   COALESCE(d.name, 'Not Assigned') as driver_name, b.status
-            FROM bookings b
-            JOIN users c ON b.customer_id = c.user_id
-            LEFT JOIN users d ON b.driver_id = d.user_id
-            ORDER BY b.booking_date DESC, b.booking_time DESC
-        ''')
-        
-        for row in self.db.cursor.fetchall():
-            self.tree.insert('', tk.END, values=row)
+        # Recurring occurrences entering the dispatch window are copied into
+        # bookings by the lifecycle scheduler (utils/scheduler.py)
+        rows = self.table.refresh()
+        # Remember each booking's version so assignments made from this view
+        # are rejected if another dispatcher changed the booking meanwhile
+        self.booking_versions = {}
+        self.booking_slots = {}
+        for item, (booking_id, *_, version, pickup_ts, overdue) in zip(self.tree.get_children(), rows):
+            self.booking_versions[booking_id] = version
+            self.booking_slots[booking_id] = pickup_ts
+            if overdue:
+                self.tree.item(item, tags=('overdue',))
+        
+        # Rebuild the availability bitmaps for the listed days in one query,
+        # so selecting a booking can filter the driver list without querying
+        self.db.availability.clear()
+        self.db.load_availability(self.booking_slots.values())
+        self.driver_combo['values'] = list(self.drivers.keys())
+    
+    def refresh_zone_pressure(self):
+        """Redraw the zone panel from the counters and schedule the next refresh"""
+        if self.pressure_job:
+            self.root.after_cancel(self.pressure_job)
+        rows = []
+        for db in (self.shards.all() if self.shards and not self.city else [self.db]):
+            rows.extend(db.get_zone_pressure())
+        rows.sort(key=lambda row: (row[3], -row[1], row[0]))
+        
+        self.pressure_tree.delete(*self.pressure_tree.get_children())
+        for zone, demand, supply, ratio, surge in rows:
+            self.pressure_tree.insert('', tk.END, tags=('surge',) if surge else (), values=(
+                zone, demand, supply, f"{ratio:.2f}" if demand else "-", "SURGE" if surge else ""))
+        self.pressure_job = self.root.after(SURGE['REFRESH_MS'], self.refresh_zone_pressure)
+    
+    def get_booking_ids(self):
+        """Parse the comma-separated booking IDs from the entry"""
+        text = self.booking_id_entry.get().replace(' ', '')
+        try:
+            return [int(part) for part in text.split(',') if part]
+        except ValueError:
+            messagebox.showerror("Error", "Invalid booking ID")
+            return None
     
     def assign_driver(self):
-        """Assign driver to booking"""
-        booking_id = self.booking_id_entry.get().strip()
+        """Assign (or reassign) driver to the selected bookings"""
+        booking_ids = self.get_booking_ids()
         driver_name = self.driver_combo.get()
+        if booking_ids is None:
+            return
         
-        if not booking_id or not driver_name:
+        if not booking_ids or not driver_name:
             messagebox.showerror("Error", "Please select booking ID and driver")
             return
         
         driver_id = self.drivers[driver_name]
+        if self.shards:
+            if not self.city:
+                messagebox.showerror("Error", "Please choose a city to assign drivers")
+                return
+            # Assignments join the driver row inside the city's database
+            self.shards.for_user(driver_id, self.city)
+        if len(booking_ids) == 1:
+            booking_id = booking_ids[0]
+            result = self.db.assign_driver(booking_id, driver_id,
+                                           self.booking_versions.get(booking_id))
+            updated = [booking_id] if result == ASSIGN_RESULT['OK'] else []
+            rejected = {} if updated else {booking_id: result}
+        else:
+            versions = {booking_id: self.booking_versions[booking_id]
+                        for booking_id in booking_ids if booking_id in self.booking_versions}
+            updated, rejected = self.db.assign_drivers(booking_ids, driver_id, versions)
+        show_bulk_result(f"Assigned {driver_name} to", updated, rejected)
         
-        # Get booking details
-        self.db.cursor.execute('''
-            SELECT booking_date, booking_time, status 
-            FROM bookings WHERE booking_id = ?
-        ''', (booking_id,))
-        
-        result = self.db.cursor.fetchone()
-        if not result:
-            messagebox.showerror("Error", "Invalid booking ID")
-            return
-        
-        booking_date, booking_time, status = result
-        
-        if status in [BOOKING_STATUS['CANCELLED'], BOOKING_STATUS['COMPLETED']]:
-            messagebox.showerror("Error", f"Cannot assign driver to {status.lower()} booking")
+        self.booking_id_entry.delete(0, tk.END)
+        self.driver_combo.set('')
+        self.load_bookings()
+    
+    def cancel_bookings(self):
+        """Cancel the selected bookings"""
+        booking_ids = self.get_booking_ids()
+        if booking_ids is None:
             return
         
-        # Check for overlapping bookings
-        if not self.db.check_driver_availability(driver_id, booking_date, booking_time):
-            messagebox.showerror("Error", 
-                               "Driver has overlapping booking at this time!")
+        if not booking_ids:
+            messagebox.showerror("Error", "Please select booking ID")
             return
         
-        # Assign driver
-        self.db.cursor.execute('''
-            UPDATE bookings 
-            SET driver_id = ?, status = ?
-            WHERE booking_id = ?
-        ''', (driver_id, BOOKING_STATUS['ASSIGNED'], booking_id))
-        self.db.conn.commit()
-        
-        messagebox.showinfo("Success", "Driver assigned successfully!")
-        self.booking_id_entry.delete(0, tk.END)
-        self.driver_combo.set('')
-        self.load_bookings()
+        if messagebox.askyesno("Confirm", f"Cancel {len(booking_ids)} booking(s)?"):
+            if self.shards:
+                updated, rejected = [], {}
+                for db, ids in self.shards.group_by_shard(booking_ids).items():
+                    shard_updated, shard_rejected = db.cancel_bookings(ids)
+                    updated += shard_updated
+                    rejected.update(shard_rejected)
+            else:
+                updated, rejected = self.db.cancel_bookings(booking_ids)
+            show_bulk_result("Cancelled", updated, rejected)
+            self.booking_id_entry.delete(0, tk.END)
+            self.load_bookings()
     
     def on_booking_select(self, event):
         """Handle booking selection"""
         selected = self.tree.selection()
         if selected:
-            booking_id = self.tree.item(selected[0])['values'][0]
+            booking_ids = [self.tree.item(item)['values'][0] for item in selected]
             self.booking_id_entry.delete(0, tk.END)
-            self.booking_id_entry.insert(0, str(booking_id))
+            self.booking_id_entry.insert(0, ', '.join(str(booking_id) for booking_id in booking_ids))
+            self.filter_free_drivers(booking_ids)
+    
+    def filter_free_drivers(self, booking_ids):
+        """Offer only drivers free at every selected booking's pickup time"""
+        if self.shards and not self.city:
+            return
+        slots = [self.booking_slots[booking_id] for booking_id in booking_ids
+                 if booking_id in self.booking_slots]
+        free = set(self.db.get_free_drivers(self.drivers.values(), slots))
+        names = [name for name, driver_id in self.drivers.items() if driver_id in free]
+        self.driver_combo['values'] = names
+        if self.driver_combo.get() not in names:
+            self.driver_combo.set('')
     
     def logout(self):
         """Logout user"""
@@ -231,6 +375,8 @@ class AdminDashboard:
                 geometry = None
             else:
                 geometry = self.root.geometry()
+            if self.pressure_job:
+                self.root.after_cancel(self.pressure_job)
             self.root.quit()
             self.logout_callback(fullscreen=is_fullscreen, geometry=geometry)
 
@@ -256,5 +402,29 @@ class AdminDashboard:
         
         from views.register_driver_window import RegisterDriverWindow
         # Pass load_drivers as the callback to refresh the driver list
-        RegisterDriverWindow(win, self.db, self.load_drivers)
+        RegisterDriverWindow(win, self.directory, self.load_drivers, self.shards)
+    
+    def open_demand_forecast(self):
+        """Open the demand forecast for the selected city"""
+        try:
+            from views.demand_window import DemandWindow
+        except ImportError:
+            messagebox.showerror("Error", "Demand forecasting needs NumPy (pip install -r requirements.txt)")
+            return
+        DemandWindow(tk.Toplevel(self.root), self.db)
+    
+    def open_timeline(self):
+        """Open the driver timeline for the selected city, or all of them"""
+        from views.timeline_window import TimelineWindow
+        dbs = self.shards.all() if self.shards and not self.city else [self.db]
+        TimelineWindow(tk.Toplevel(self.root), dbs, self.drivers)
+    
+    def open_shifts(self):
+        """Open the shift editor for the drivers of the selected city"""
+        from views.shift_window import ShiftWindow
+        ShiftWindow(tk.Toplevel(self.root), self.drivers, self.shift_storage)
+    
+    def shift_storage(self, driver_id):
+        """Database holding a driver's shifts: the one their trips are assigned in"""
+        return self.shards.for_user(driver_id, self.city) if self.shards else self.db
 
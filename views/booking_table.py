@@ -0,0 +1,148 @@
+import tkinter as tk
+from tkinter import ttk, messagebox
+from utils.constants import COLORS, FONTS, PAGE_SIZE
+from utils.messages import bulk_summary
+
+
+def show_bulk_result(action, updated, rejected):
+    """Show one combined summary for a bulk action"""
+    summary = bulk_summary(action, updated, rejected)
+    if updated:
+        messagebox.showinfo("Success", summary)
+    else:
+        messagebox.showerror("Error", summary)
+
+
+class BookingTable:
+    """Booking Treeview with sortable headings, a filter bar and paging.
+
+    Sorting, filtering and paging are all pushed down to the database: the
+    fetch callback receives (sort_by, descending, filters, limit, offset)
+    and returns rows, so only one page is ever held by the widget. The
+    owning dashboard's reload callback is used whenever the sort, filters
+    or page change, so it can post-process the rows refresh() returns.
+    """
+
+    def __init__(self, parent, columns, fetch, reload, widths, height=20, sort_by='Date', descending=True):
+        self.columns = columns
+        self.fetch = fetch
+        self.reload = reload
+        self.sort_by = sort_by
+        self.descending = descending
+        self.filters = {}
+        self.page = 0
+
+        # Filter bar
+        filter_frame = tk.Frame(parent)
+        filter_frame.pack(fill=tk.X, pady=(0, 5))
+
+        tk.Label(filter_frame, text="Filter:", font=FONTS['normal']).pack(side=tk.LEFT, padx=5)
+        self.filter_column = ttk.Combobox(filter_frame, font=FONTS['normal'], width=12,
+                                          state='readonly', values=list(columns))
+        self.filter_column.set(columns[0])
+        self.filter_column.pack(side=tk.LEFT, padx=5)
+
+        tk.Label(filter_frame, text="starts with", font=FONTS['normal']).pack(side=tk.LEFT)
+        self.filter_entry = tk.Entry(filter_frame, font=FONTS['normal'], width=18)
+        self.filter_entry.pack(side=tk.LEFT, padx=5)
+        self.filter_entry.bind('<Return>', lambda e: self.apply_filter())
+
+        tk.Button(filter_frame, text="Apply", bg=COLORS['info'], fg=COLORS['white'],
+                  font=FONTS['button'], cursor="hand2", command=self.apply_filter).pack(side=tk.LEFT, padx=5)
+        tk.Button(filter_frame, text="Clear", bg=COLORS['warning'], fg=COLORS['white'],
+                  font=FONTS['button'], cursor="hand2", command=self.clear_filters).pack(side=tk.LEFT, padx=5)
+
+        self.filter_label = tk.Label(filter_frame, text="", font=FONTS['small'])
+        self.filter_label.pack(side=tk.LEFT, padx=10)
+
+        # Paging bar
+        page_frame = tk.Frame(parent)
+        page_frame.pack(side=tk.BOTTOM, fill=tk.X, pady=(5, 0))
+
+        self.next_button = tk.Button(page_frame, text="Next ▶", font=FONTS['button'],
+                                     command=lambda: self.go_to_page(self.page + 1))
+        self.next_button.pack(side=tk.RIGHT, padx=5)
+        self.page_label = tk.Label(page_frame, text="", font=FONTS['normal'])
+        self.page_label.pack(side=tk.RIGHT, padx=5)
+        self.prev_button = tk.Button(page_frame, text="◀ Prev", font=FONTS['button'],
+                                     command=lambda: self.go_to_page(self.page - 1))
+        self.prev_button.pack(side=tk.RIGHT, padx=5)
+
+        # Treeview
+        self.tree = ttk.Treeview(parent, columns=columns, show="headings", height=height,
+                                 selectmode='extended')
+        for col in columns:
+            self.tree.heading(col, text=col, command=lambda c=col: self.sort(c))
+            self.tree.column(col, width=widths.get(col, widths['default']))
+
+        scrollbar = ttk.Scrollbar(parent, orient=tk.VERTICAL, command=self.tree.yview)
+        self.tree.configure(yscrollcommand=scrollbar.set)
+
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.update_headings()
+
+    def refresh(self):
+        """Reload the current page and return its rows (including extra columns)"""
+        for item in self.tree.get_children():
+            self.tree.delete(item)
+
+        # Ask for one extra row to know whether there is a next page
+        rows = self.fetch(self.sort_by, self.descending, dict(self.filters),
+                          PAGE_SIZE + 1, self.page * PAGE_SIZE)
+        has_next = len(rows) > PAGE_SIZE
+        rows = rows[:PAGE_SIZE]
+        for row in rows:
+            self.tree.insert('', tk.END, values=row[:len(self.columns)])
+
+        self.page_label.config(text=f"Page {self.page + 1}")
+        self.prev_button.config(state=tk.NORMAL if self.page > 0 else tk.DISABLED)
+        self.next_button.config(state=tk.NORMAL if has_next else tk.DISABLED)
+        return rows
+
+    def is_default_view(self):
+        """True on the first page with no filters applied"""
+        return self.page == 0 and not self.filters
+
+    def sort(self, column):
+        """Sort by a heading, toggling the direction if it is already active"""
+        if column == self.sort_by:
+            self.descending = not self.descending
+        else:
+            self.sort_by = column
+            self.descending = False
+        self.page = 0
+        self.update_headings()
+        self.reload()
+
+    def update_headings(self):
+        for col in self.columns:
+            arrow = (' ▼' if self.descending else ' ▲') if col == self.sort_by else ''
+            self.tree.heading(col, text=col + arrow)
+
+    def apply_filter(self):
+        """Add or replace the filter for the chosen column"""
+        column = self.filter_column.get()
+        value = self.filter_entry.get().strip()
+        if not value:
+            self.filters.pop(column, None)
+        elif column == 'ID' and not value.isdigit():
+            messagebox.showerror("Error", "ID filter must be a number")
+            return
+        else:
+            self.filters[column] = value
+        self.filter_entry.delete(0, tk.END)
+        self.update_filter_label()
+        self.go_to_page(0)
+
+    def clear_filters(self):
+        self.filters.clear()
+        self.update_filter_label()
+        self.go_to_page(0)
+
+    def update_filter_label(self):
+        self.filter_label.config(text=', '.join(f"{col}: {value}" for col, value in self.filters.items()))
+
+    def go_to_page(self, page):
+        self.page = max(0, page)
+        self.reload()
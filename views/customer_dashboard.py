@@ -1,14 +1,18 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-from datetime import datetime
-from utils.constants import COLORS, FONTS, BOOKING_STATUS
+from datetime import datetime, date, timedelta
+from utils.constants import COLORS, FONTS, BOOKING_STATUS, RECURRENCE, OTHER_CITY
+from views.booking_table import BookingTable, show_bulk_result
 
 class CustomerDashboard:
     """Customer dashboard for booking management"""
     
-    def __init__(self, root, db, user_data, logout_callback, fullscreen=False, geometry=None):
+    def __init__(self, root, db, user_data, logout_callback, fullscreen=False, geometry=None, shards=None):
         self.root = root
         self.db = db
+        # With per-city shards, self.db is the database of the city chosen
+        # in the header and everything on this screen goes to it
+        self.shards = shards
         self.user_id, self.username, self.role, self.name = user_data
         self.logout_callback = logout_callback
         self.root.title(f"Customer Dashboard - {self.name}")
@@ -32,6 +36,17 @@ class CustomerDashboard:
                 bg=COLORS['customer_header'], fg=COLORS['white']).pack(side=tk.LEFT, padx=20, pady=15)
         tk.Button(header, text="Logout", bg=COLORS['danger'], fg=COLORS['white'],
                  font=FONTS['button'], command=self.logout).pack(side=tk.RIGHT, padx=20, pady=15)
+        tk.Button(header, text="Switch User", bg=COLORS['info'], fg=COLORS['white'],
+                 font=FONTS['button'], command=self.switch_user).pack(side=tk.RIGHT, pady=15)
+        if self.shards:
+            self.city_combo = ttk.Combobox(header, font=FONTS['normal'], width=15, state='readonly',
+                                           values=self.shards.cities)
+            city = self.shards.directory.get_user(self.user_id)[6]
+            self.city_combo.set(city if city in self.shards.cities else OTHER_CITY)
+            self.city_combo.pack(side=tk.RIGHT, padx=10, pady=15)
+            self.city_combo.bind('<<ComboboxSelected>>', self.on_city_change)
+            tk.Label(header, text="City:", font=FONTS['normal'], bg=COLORS['customer_header'],
+                    fg=COLORS['white']).pack(side=tk.RIGHT)
         
         container = tk.Frame(self.root)
         container.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
@@ -59,11 +74,24 @@ class CustomerDashboard:
         self.time_entry.insert(0, datetime.now().strftime("%H:%M"))
         self.time_entry.grid(row=1, column=3, padx=10, pady=5)
         
+        tk.Label(fields_frame, text="Repeat:", font=FONTS['normal']).grid(row=2, column=0, sticky=tk.W, pady=5)
+        self.repeat_combo = ttk.Combobox(fields_frame, font=FONTS['normal'], width=23, state='readonly',
+                                         values=["Once", RECURRENCE['WEEKDAYS'], RECURRENCE['EVERY_N_DAYS']])
+        self.repeat_combo.set("Once")
+        self.repeat_combo.grid(row=2, column=1, padx=10, pady=5)
+        tk.Label(fields_frame, text="Every N days:", font=FONTS['normal']).grid(row=2, column=2, sticky=tk.W, pady=5)
+        self.interval_spin = tk.Spinbox(fields_frame, font=FONTS['normal'], width=23, from_=1, to=30)
+        self.interval_spin.grid(row=2, column=3, padx=10, pady=5)
+        tk.Label(fields_frame, text="Until (optional):", font=FONTS['normal']).grid(row=3, column=0, sticky=tk.W, pady=5)
+        self.until_entry = tk.Entry(fields_frame, font=FONTS['normal'], width=25)
+        self.until_entry.grid(row=3, column=1, padx=10, pady=5)
+        
         btn_frame = tk.Frame(form_frame)
         btn_frame.pack(pady=10)
         for text, cmd, color in [("Book Taxi", self.book_taxi, COLORS['success']),
                                  ("Update Booking", self.update_booking, COLORS['warning']),
-                                 ("Cancel Booking", self.cancel_booking, COLORS['danger'])]:
+                                 ("Cancel Booking", self.cancel_booking, COLORS['danger']),
+                                 ("Stop Repeating", self.stop_repeating, COLORS['info'])]:
             tk.Button(btn_frame, text=text, bg=color, fg=COLORS['white'], font=FONTS['button'],
                      width=15, cursor="hand2", command=cmd).pack(side=tk.LEFT, padx=5)
         
@@ -71,15 +99,10 @@ class CustomerDashboard:
         list_frame.pack(fill=tk.BOTH, expand=True)
         
         columns = ("ID", "Pickup", "Dropoff", "Date", "Time", "Driver", "Status")
-        self.tree = ttk.Treeview(list_frame, columns=columns, show="headings", height=15)
-        for col in columns:
-            self.tree.heading(col, text=col)
-            self.tree.column(col, width=100 if col == "ID" else 120)
-        
-        scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.tree.yview)
-        self.tree.configure(yscrollcommand=scrollbar.set)
-        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.table = BookingTable(list_frame, columns,
+                                  fetch=lambda *page: self.db.list_bookings('customer', self.user_id, *page),
+                                  reload=self.load_bookings, widths={'ID': 100, 'default': 120}, height=15)
+        self.tree = self.table.tree
         self.tree.bind('<ButtonRelease-1>', self.on_booking_select)
     
     def get_form_data(self):
@@ -96,64 +119,113 @@ class CustomerDashboard:
             return None
         return data
     
+    def get_repeat_data(self):
+        """Get and validate the recurrence fields, or None if booking once"""
+        frequency = self.repeat_combo.get()
+        if frequency == "Once":
+            return None
+        until = self.until_entry.get().strip() or None
+        try:
+            interval = int(self.interval_spin.get())
+            if until:
+                datetime.strptime(until, "%Y-%m-%d")
+        except ValueError:
+            messagebox.showerror("Error", "Invalid repeat interval or end date")
+            return False
+        return frequency, max(1, interval), until
+    
     def book_taxi(self):
-        """Book a new taxi"""
+        """Book a new taxi, or a recurring series starting on the given date"""
         data = self.get_form_data()
         if not data: return
-        self.db.cursor.execute('''INSERT INTO bookings (customer_id, pickup_location, dropoff_location, 
-                                booking_date, booking_time, status) VALUES (?, ?, ?, ?, ?, ?)''',
-                              (self.user_id, *data, BOOKING_STATUS['PENDING']))
-        self.db.conn.commit()
-        messagebox.showinfo("Success", "Taxi booked successfully!")
+        repeat = self.get_repeat_data()
+        if repeat is False: return
+        if repeat:
+            pickup, dropoff, booking_date, booking_time = data
+            self.db.create_recurring_booking(self.user_id, pickup, dropoff, booking_time,
+                                             booking_date, *repeat)
+            messagebox.showinfo("Success", "Recurring booking created successfully!")
+        else:
+            self.db.book_taxi(self.user_id, *data)
+            messagebox.showinfo("Success", "Taxi booked successfully!")
         self.clear_form()
         self.load_bookings()
     
+    def resolve_booking_id(self, item):
+        """Return the booking id for a tree row.
+        
+        Upcoming occurrences of a recurring booking are only listed, not
+        stored; they get a real booking row the first time they are edited.
+        """
+        if item.startswith('rule:'):
+            _, rule_id, occurrence_date = item.split(':')
+            return self.db.materialize_occurrence(int(rule_id), occurrence_date)
+        return self.tree.item(item)['values'][0]
+    
     def update_booking(self):
         """Update selected booking"""
         selected = self.tree.selection()
         if not selected:
             messagebox.showerror("Error", "Please select a booking to update")
             return
-        booking_id = self.tree.item(selected[0])['values'][0]
-        self.db.cursor.execute('SELECT status FROM bookings WHERE booking_id = ?', (booking_id,))
-        status = self.db.cursor.fetchone()[0]
+        booking_id = self.resolve_booking_id(selected[0])
+        status = self.db.get_booking_status(booking_id)
         if status in [BOOKING_STATUS['COMPLETED'], BOOKING_STATUS['CANCELLED']]:
             messagebox.showerror("Error", f"Cannot update {status.lower()} booking")
             return
         data = self.get_form_data()
         if not data: return
-        self.db.cursor.execute('''UPDATE bookings SET pickup_location = ?, dropoff_location = ?, 
-                                booking_date = ?, booking_time = ? WHERE booking_id = ?''',
-                              (*data, booking_id))
-        self.db.conn.commit()
+        if not self.db.update_booking(booking_id, *data):
+            messagebox.showerror("Error", "Booking could not be updated: the assigned driver is busy at that time")
+            return
         messagebox.showinfo("Success", "Booking updated successfully!")
         self.load_bookings()
     
     def cancel_booking(self):
-        """Cancel selected booking"""
+        """Cancel selected bookings"""
         selected = self.tree.selection()
         if not selected:
             messagebox.showerror("Error", "Please select a booking to cancel")
             return
-        booking_id = self.tree.item(selected[0])['values'][0]
-        if messagebox.askyesno("Confirm", "Are you sure you want to cancel this booking?"):
-            self.db.cursor.execute('UPDATE bookings SET status = ? WHERE booking_id = ?',
-                                  (BOOKING_STATUS['CANCELLED'], booking_id))
-            self.db.conn.commit()
-            messagebox.showinfo("Success", "Booking cancelled successfully!")
+        prompt = ("Are you sure you want to cancel this booking?" if len(selected) == 1
+                  else f"Are you sure you want to cancel {len(selected)} bookings?")
+        if messagebox.askyesno("Confirm", prompt):
+            booking_ids = [self.resolve_booking_id(item) for item in selected]
+            updated, rejected = self.db.cancel_bookings(booking_ids)
+            show_bulk_result("Cancelled", updated, rejected)
+            self.load_bookings()
+    
+    def stop_repeating(self):
+        """Stop the recurring bookings behind the selected upcoming trips"""
+        rule_ids = {int(item.split(':')[1]) for item in self.tree.selection() if item.startswith('rule:')}
+        if not rule_ids:
+            messagebox.showerror("Error", "Please select an upcoming recurring trip")
+            return
+        if messagebox.askyesno("Confirm", "Stop repeating the selected booking(s)? Trips already scheduled are kept."):
+            for rule_id in rule_ids:
+                self.db.stop_recurring_booking(rule_id)
+            messagebox.showinfo("Success", "Recurring booking stopped")
             self.load_bookings()
     
     def load_bookings(self):
         """Load customer bookings"""
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        self.db.cursor.execute('''SELECT b.booking_id, b.pickup_location, b.dropoff_location, 
-                                 b.booking_date, b.booking_time, COALESCE(u.name, 'Not Assigned') as driver_name, b.status
-                                 FROM bookings b LEFT JOIN users u ON b.driver_id = u.user_id
-                                 WHERE b.customer_id = ? ORDER BY b.booking_date DESC, b.booking_time DESC''',
-                              (self.user_id,))
-        for row in self.db.cursor.fetchall():
-            self.tree.insert('', tk.END, values=row)
+        self.table.refresh()
+        if not self.table.is_default_view():
+            return
+        # Upcoming occurrences of recurring bookings, generated for the visible window only
+        today = date.today()
+        upcoming = sorted(self.db.iter_occurrences(today, today + timedelta(days=RECURRENCE['VISIBLE_DAYS']),
+                                                   self.user_id),
+                          key=lambda occurrence: (occurrence[1], occurrence[0].booking_time))
+        for rule, day in upcoming:
+            self.tree.insert('', 0, iid=f"rule:{rule.rule_id}:{day.isoformat()}",
+                             values=(f"R{rule.rule_id}", rule.pickup, rule.dropoff, day.isoformat(),
+                                     rule.booking_time, 'Not Assigned', 'Scheduled'))
+    
+    def on_city_change(self, event):
+        """Book and list trips in the chosen city"""
+        self.db = self.shards.for_user(self.user_id, self.city_combo.get())
+        self.table.go_to_page(0)
     
     def on_booking_select(self, event):
         """Handle booking selection"""
@@ -173,16 +245,25 @@ class CustomerDashboard:
         self.date_entry.insert(0, datetime.now().strftime("%Y-%m-%d"))
         self.time_entry.delete(0, tk.END)
         self.time_entry.insert(0, datetime.now().strftime("%H:%M"))
+        self.repeat_combo.set("Once")
+        self.until_entry.delete(0, tk.END)
     
     def logout(self):
-        """Logout user"""
+        """Logout user, ending the session"""
         if messagebox.askyesno("Confirm", "Are you sure you want to logout?"):
-            self.root.update_idletasks()  # Ensure window state is current
-            is_fullscreen = bool(self.root.attributes('-fullscreen'))
-            if is_fullscreen:
-                geometry = None
-            else:
-                geometry = self.root.geometry()
-            self.root.quit()
-            self.logout_callback(fullscreen=is_fullscreen, geometry=geometry)
+            self.leave(keep_session=False)
+    
+    def switch_user(self):
+        """Back to the login window, keeping the session for the quick switch"""
+        self.leave(keep_session=True)
+    
+    def leave(self, keep_session):
+        self.root.update_idletasks()  # Ensure window state is current
+        is_fullscreen = bool(self.root.attributes('-fullscreen'))
+        if is_fullscreen:
+            geometry = None
+        else:
+            geometry = self.root.geometry()
+        self.root.quit()
+        self.logout_callback(fullscreen=is_fullscreen, geometry=geometry, keep_session=keep_session)
 
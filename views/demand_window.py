@@ -0,0 +1,80 @@
+import tkinter as tk
+from datetime import datetime, timedelta
+from models.demand import DemandModel
+from utils.constants import COLORS, FONTS
+
+class DemandWindow:
+    """Forecast heatmap of upcoming pickups, for staging drivers ahead of demand"""
+
+    CELL_WIDTH = 28
+    CELL_HEIGHT = 22
+    LABEL_WIDTH = 150
+
+    def __init__(self, root, db):
+        self.root = root
+        self.model = DemandModel(db)
+
+        self.root.title("Demand Forecast")
+        self.setup_ui()
+        self.refresh()
+
+    def setup_ui(self):
+        frame = tk.Frame(self.root, padx=10, pady=10)
+        frame.pack(fill=tk.BOTH, expand=True)
+
+        tk.Label(frame, text="Expected pickups, next 24 hours", font=FONTS['subheader']).pack(anchor="w")
+        self.canvas = tk.Canvas(frame, bg=COLORS['white'], highlightthickness=0)
+        self.canvas.pack(fill=tk.BOTH, expand=True, pady=5)
+
+        tk.Label(frame, text="Hotspots to stage drivers for", font=FONTS['subheader']).pack(anchor="w")
+        self.hotspot_list = tk.Listbox(frame, font=FONTS['normal'], height=8)
+        self.hotspot_list.pack(fill=tk.X, pady=5)
+
+        bottom = tk.Frame(frame)
+        bottom.pack(fill=tk.X)
+        self.status_label = tk.Label(bottom, text="", font=FONTS['small'])
+        self.status_label.pack(side=tk.LEFT)
+        tk.Button(bottom, text="Refresh", bg=COLORS['info'], fg=COLORS['white'],
+                  font=FONTS['button'], command=self.refresh).pack(side=tk.RIGHT)
+
+    def refresh(self):
+        """Count new bookings into the model and redraw"""
+        added = self.model.update()
+        self.status_label.config(text=f"{added} new booking(s) counted")
+        self.draw_heatmap()
+
+        self.hotspot_list.delete(0, tk.END)
+        now = datetime.now().replace(minute=0, second=0, microsecond=0)
+        for hours, location, expected in self.model.hotspots():
+            start = now + timedelta(hours=hours)
+            self.hotspot_list.insert(tk.END, f"{start:%a %H:00}  {location}  ~{expected:.1f}")
+
+    def draw_heatmap(self):
+        self.canvas.delete("all")
+        locations, matrix = self.model.heatmap()
+        if not locations:
+            self.canvas.create_text(10, 10, anchor="nw", font=FONTS['normal'],
+                                    text="Not enough booking history yet")
+            return
+        peak = matrix.max() or 1
+        hour = datetime.now().hour
+        for col in range(matrix.shape[1]):
+            x = self.LABEL_WIDTH + col * self.CELL_WIDTH
+            self.canvas.create_text(x + self.CELL_WIDTH / 2, 8, font=FONTS['small'],
+                                    text=f"{(hour + col) % 24:02d}")
+        for row, location in enumerate(locations):
+            y = 18 + row * self.CELL_HEIGHT
+            self.canvas.create_text(self.LABEL_WIDTH - 5, y + self.CELL_HEIGHT / 2, anchor="e",
+                                    font=FONTS['small'], text=location[:22])
+            for col, expected in enumerate(matrix[row]):
+                x = self.LABEL_WIDTH + col * self.CELL_WIDTH
+                self.canvas.create_rectangle(x, y, x + self.CELL_WIDTH, y + self.CELL_HEIGHT,
+                                             fill=self.shade(expected / peak), outline=COLORS['light_gray'])
+        self.canvas.config(width=self.LABEL_WIDTH + matrix.shape[1] * self.CELL_WIDTH + 10,
+                           height=18 + len(locations) * self.CELL_HEIGHT + 10)
+
+    @staticmethod
+    def shade(level):
+        """White for no demand through to red at the peak"""
+        fade = int(255 * (1 - level))
+        return f"#ff{fade:02x}{fade:02x}"
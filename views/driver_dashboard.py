@@ -1,6 +1,9 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-from utils.constants import COLORS, FONTS, BOOKING_STATUS
+from replica import DriverReplica
+from utils.constants import COLORS, FONTS, BOOKING_STATUS, SYNC
+from utils.messages import bulk_summary
+from views.booking_table import BookingTable, show_bulk_result
 
 class DriverDashboard:
     """Driver dashboard for viewing assigned trips"""
@@ -10,6 +13,10 @@ class DriverDashboard:
         self.db = db
         self.user_id, self.username, self.role, self.name = user_data
         self.logout_callback = logout_callback
+        # Trips are read from and changed in a local replica, which syncs
+        # with db whenever the link allows
+        self.replica = DriverReplica(db, self.user_id)
+        self.sync_job = None
         
         self.root.title(f"Driver Dashboard - {self.name}")
         # Set window state BEFORE setting up UI - fullscreen takes priority
@@ -23,7 +30,7 @@ class DriverDashboard:
             self.root.geometry("900x600")
         
         self.setup_ui()
-        self.load_trips()
+        self.sync_trips()
     
     def setup_ui(self):
         """Setup driver UI"""
@@ -48,6 +55,24 @@ class DriverDashboard:
             command=self.logout
         ).pack(side=tk.RIGHT, padx=20, pady=15)
         
+        tk.Button(
+            header,
+            text="Switch User",
+            bg=COLORS['info'],
+            fg=COLORS['white'],
+            font=FONTS['button'],
+            command=self.switch_user
+        ).pack(side=tk.RIGHT, pady=15)
+        
+        self.sync_label = tk.Label(
+            header,
+            text="",
+            font=FONTS['normal'],
+            bg=COLORS['driver_header'],
+            fg=COLORS['white']
+        )
+        self.sync_label.pack(side=tk.RIGHT, padx=10)
+        
         # Main container
         container = tk.Frame(self.root)
         container.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
@@ -64,7 +89,7 @@ class DriverDashboard:
             font=FONTS['button'],
             width=15,
             cursor="hand2",
-            command=self.load_trips
+            command=self.sync_trips
         ).pack(side=tk.LEFT, padx=5)
         
         tk.Button(
@@ -89,6 +114,28 @@ class DriverDashboard:
             command=self.cancel_trip
         ).pack(side=tk.LEFT, padx=5)
         
+        tk.Button(
+            control_frame,
+            text="My Route",
+            bg=COLORS['info'],
+            fg=COLORS['white'],
+            font=FONTS['button'],
+            width=15,
+            cursor="hand2",
+            command=self.open_route
+        ).pack(side=tk.LEFT, padx=5)
+        
+        tk.Button(
+            control_frame,
+            text="My Shifts",
+            bg=COLORS['info'],
+            fg=COLORS['white'],
+            font=FONTS['button'],
+            width=15,
+            cursor="hand2",
+            command=self.open_shifts
+        ).pack(side=tk.LEFT, padx=5)
+        
         # Trips list
         list_frame = tk.LabelFrame(
             container,
@@ -101,96 +148,113 @@ class DriverDashboard:
         
         # Treeview
         columns = ("ID", "Customer", "Phone", "Pickup", "Dropoff", "Date", "Time", "Status")
-        self.tree = ttk.Treeview(list_frame, columns=columns, show="headings", height=20)
-        
-        for col in columns:
-            self.tree.heading(col, text=col)
-            width = 60 if col == "ID" else 110
-            self.tree.column(col, width=width)
-        
-        scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.tree.yview)
-        self.tree.configure(yscrollcommand=scrollbar.set)
-        
-        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.table = BookingTable(
+            list_frame,
+            columns,
+            fetch=lambda *page: self.replica.list_bookings('driver', self.user_id, *page),
+            reload=self.load_trips,
+            widths={'ID': 60, 'default': 110}
+        )
+        self.tree = self.table.tree
     
     def load_trips(self):
         """Load assigned trips"""
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        
-        self.db.cursor.execute('''
-            SELECT b.booking_id, u.name, u.phone,
-                   b.pickup_location, b.dropoff_location, 
-                   b.booking_date, b.booking_time, b.status
-            FROM bookings b
-            JOIN users u ON b.customer_id = u.user_id
-            WHERE b.driver_id = ?
-            ORDER BY b.booking_date DESC, b.booking_time DESC
-        ''', (self.user_id,))
-        
-        for row in self.db.cursor.fetchall():
-            self.tree.insert('', tk.END, values=row)
+        self.table.refresh()
+    
+    def sync_trips(self):
+        """Sync the replica with the central database and reload, then again every INTERVAL_MS"""
+        if self.sync_job:
+            self.root.after_cancel(self.sync_job)
+        result = self.replica.sync()
+        pending = self.replica.pending_count()
+        if result is None:
+            self.sync_label.config(text=f"Offline - {pending} change(s) waiting")
+        else:
+            self.sync_label.config(text="Online")
+            updated, rejected = result
+            if rejected:
+                messagebox.showwarning("Sync", bulk_summary("Synced", updated, rejected))
+        self.load_trips()
+        self.sync_job = self.root.after(SYNC['INTERVAL_MS'], self.sync_trips)
+    
+    def get_selected_trips(self):
+        """Return (booking_id, status) for every selected trip"""
+        return [(values[0], values[7]) for values in
+                (self.tree.item(item)['values'] for item in self.tree.selection())]
     
     def complete_trip(self):
-        """Mark trip as completed"""
-        selected = self.tree.selection()
-        if not selected:
+        """Mark selected trips as completed"""
+        trips = self.get_selected_trips()
+        if not trips:
             messagebox.showerror("Error", "Please select a trip")
             return
         
-        booking_id = self.tree.item(selected[0])['values'][0]
-        status = self.tree.item(selected[0])['values'][7]
-        
-        if status == BOOKING_STATUS['COMPLETED']:
-            messagebox.showinfo("Info", "Trip is already completed")
-            return
-        
-        if status == BOOKING_STATUS['CANCELLED']:
-            messagebox.showerror("Error", "Cannot complete cancelled trip")
-            return
-        
-        if messagebox.askyesno("Confirm", "Mark this trip as completed?"):
-            self.db.cursor.execute('''
-                UPDATE bookings SET status = ? WHERE booking_id = ?
-            ''', (BOOKING_STATUS['COMPLETED'], booking_id))
-            self.db.conn.commit()
+        if len(trips) == 1:
+            status = trips[0][1]
+            if status == BOOKING_STATUS['COMPLETED']:
+                messagebox.showinfo("Info", "Trip is already completed")
+                return
             
-            messagebox.showinfo("Success", "Trip completed successfully!")
-            self.load_trips()
+            if status == BOOKING_STATUS['CANCELLED']:
+                messagebox.showerror("Error", "Cannot complete cancelled trip")
+                return
+        
+        prompt = ("Mark this trip as completed?" if len(trips) == 1
+                  else f"Mark {len(trips)} trips as completed?")
+        if messagebox.askyesno("Confirm", prompt):
+            updated, rejected = self.replica.complete_trips([booking_id for booking_id, _ in trips])
+            show_bulk_result("Completed", updated, rejected)
+            self.sync_trips()
     
     def cancel_trip(self):
-        """Cancel trip"""
-        selected = self.tree.selection()
-        if not selected:
+        """Cancel selected trips"""
+        trips = self.get_selected_trips()
+        if not trips:
             messagebox.showerror("Error", "Please select a trip")
             return
         
-        booking_id = self.tree.item(selected[0])['values'][0]
-        status = self.tree.item(selected[0])['values'][7]
-        
-        if status in [BOOKING_STATUS['COMPLETED'], BOOKING_STATUS['CANCELLED']]:
-            messagebox.showerror("Error", f"Cannot cancel {status.lower()} trip")
-            return
+        if len(trips) == 1:
+            status = trips[0][1]
+            if status in [BOOKING_STATUS['COMPLETED'], BOOKING_STATUS['CANCELLED']]:
+                messagebox.showerror("Error", f"Cannot cancel {status.lower()} trip")
+                return
         
-        if messagebox.askyesno("Confirm", "Are you sure you want to cancel this trip?"):
-            self.db.cursor.execute('''
-                UPDATE bookings SET status = ?, driver_id = NULL 
-                WHERE booking_id = ?
-            ''', (BOOKING_STATUS['CANCELLED'], booking_id))
-            self.db.conn.commit()
-            
-            messagebox.showinfo("Success", "Trip cancelled successfully!")
-            self.load_trips()
+        prompt = ("Are you sure you want to cancel this trip?" if len(trips) == 1
+                  else f"Are you sure you want to cancel {len(trips)} trips?")
+        if messagebox.askyesno("Confirm", prompt):
+            updated, rejected = self.replica.cancel_trips([booking_id for booking_id, _ in trips])
+            show_bulk_result("Cancelled", updated, rejected)
+            self.sync_trips()
+    
+    def open_route(self):
+        """Show the day's trips as a chain, with proposed additions"""
+        from views.route_window import RouteWindow
+        RouteWindow(tk.Toplevel(self.root), self.db, self.user_id, self.replica)
+    
+    def open_shifts(self):
+        """Let the driver set their own shifts"""
+        from views.shift_window import ShiftWindow
+        ShiftWindow(tk.Toplevel(self.root), {self.name: self.user_id}, lambda driver_id: self.db)
     
     def logout(self):
-        """Logout user"""
+        """Logout user, ending the session"""
         if messagebox.askyesno("Confirm", "Are you sure you want to logout?"):
-            self.root.update_idletasks()  # Ensure window state is current
-            is_fullscreen = bool(self.root.attributes('-fullscreen'))
-            if is_fullscreen:
-                geometry = None
-            else:
-                geometry = self.root.geometry()
-            self.root.quit()
-            self.logout_callback(fullscreen=is_fullscreen, geometry=geometry)
+            self.leave(keep_session=False)
+    
+    def switch_user(self):
+        """Back to the login window, keeping the session for the quick switch"""
+        self.leave(keep_session=True)
+    
+    def leave(self, keep_session):
+        self.root.update_idletasks()  # Ensure window state is current
+        is_fullscreen = bool(self.root.attributes('-fullscreen'))
+        if is_fullscreen:
+            geometry = None
+        else:
+            geometry = self.root.geometry()
+        if self.sync_job:
+            self.root.after_cancel(self.sync_job)
+        self.replica.sync()
+        self.replica.close()
+        self.root.quit()
+        self.logout_callback(fullscreen=is_fullscreen, geometry=geometry, keep_session=keep_session)
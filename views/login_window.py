@@ -8,14 +8,22 @@ parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if parent_dir not in sys.path:
     sys.path.insert(0, parent_dir)
 
-from utils.constants import COLORS, FONTS
+from utils.constants import COLORS, FONTS, SESSIONS, USER_ROLES
 
 class LoginWindow:
-    """Login window for user authentication"""    
-    def __init__(self, root, db, on_login_success, fullscreen=False, geometry=None):
+    """Login window for user authentication
+    
+    recent_sessions is the terminal's list of (token, user) pairs for the
+    users who logged in here, most recent first. It outlives the window:
+    a password login adds to it, and the quick switch panel resumes one
+    of its sessions by token instead of checking a password again. Admin
+    sessions are never added, so the admin always needs the password.
+    """    
+    def __init__(self, root, db, on_login_success, fullscreen=False, geometry=None, recent_sessions=None):
         self.root = root
         self.db = db
         self.on_login_success = on_login_success
+        self.recent_sessions = recent_sessions if recent_sessions is not None else []
         
         self.root.title("Taxi Booking System - Login")
         self.root.resizable(True, True)
@@ -130,6 +138,11 @@ class LoginWindow:
             command=self.open_register
         )
         register_btn.pack(pady=(0, 15))
+        
+        # ---------- Quick switch between recent users ----------
+        self.recent_frame = tk.Frame(container, bg=COLORS['login_bg'])
+        self.recent_frame.pack(pady=(15, 0))
+        self.show_recent_sessions()
 
         # ENTER key triggers login
         self.password_entry.bind("<Return>", lambda e: self.login())
@@ -139,6 +152,67 @@ class LoginWindow:
         self.root.bind("<Escape>", lambda e: self.root.attributes('-fullscreen', False))
 
     
+    def show_recent_sessions(self):
+        """Rebuild the quick switch buttons from recent_sessions"""
+        for widget in self.recent_frame.winfo_children():
+            widget.destroy()
+        if not self.recent_sessions:
+            return
+        
+        tk.Label(
+            self.recent_frame,
+            text="Quick switch:",
+            font=('Arial', 12, 'bold'),
+            bg=COLORS['login_bg'],
+            fg=COLORS['white']
+        ).pack(pady=(0, 5))
+        for token, user in self.recent_sessions:
+            row = tk.Frame(self.recent_frame, bg=COLORS['login_bg'])
+            row.pack(fill=tk.X, pady=2)
+            tk.Button(
+                row,
+                text=f"{user[3]} ({user[2]})",
+                bg=COLORS['white'],
+                font=('Arial', 11),
+                width=26,
+                cursor="hand2",
+                command=lambda token=token: self.quick_switch(token)
+            ).pack(side=tk.LEFT)
+            tk.Button(
+                row,
+                text="✕",
+                bg=COLORS['danger'],
+                fg=COLORS['white'],
+                font=('Arial', 11, 'bold'),
+                cursor="hand2",
+                command=lambda token=token: self.forget_session(token)
+            ).pack(side=tk.LEFT, padx=(4, 0))
+    
+    def remember_session(self, token, user):
+        """Put a session at the front of recent_sessions, dropping the user's older one"""
+        if user[2] == USER_ROLES['ADMIN']:
+            return
+        self.recent_sessions[:] = [(token, user)] + [
+            (other, other_user) for other, other_user in self.recent_sessions
+            if other_user[0] != user[0]][:SESSIONS['RECENT_USERS'] - 1]
+    
+    def quick_switch(self, token):
+        """Resume a recent user's session without asking for the password"""
+        user = self.db.resume_session(token)
+        if not user:
+            self.recent_sessions[:] = [entry for entry in self.recent_sessions if entry[0] != token]
+            self.show_recent_sessions()
+            messagebox.showerror("Error", "That session has expired, please login again")
+            return
+        self.remember_session(token, user)
+        self.enter(user, token)
+    
+    def forget_session(self, token):
+        """Revoke a recent session and remove it from the quick switch"""
+        self.db.revoke_session(token)
+        self.recent_sessions[:] = [entry for entry in self.recent_sessions if entry[0] != token]
+        self.show_recent_sessions()
+    
     def open_register(self):
         """Open registration window without closing login window"""
         top = tk.Toplevel(self.root)
@@ -180,13 +254,19 @@ class LoginWindow:
         user = self.db.authenticate(username, password)
         
         if user:
-            # Preserve window state - ensure we get accurate state
-            self.root.update_idletasks()  # Ensure window state is current
-            is_fullscreen = bool(self.root.attributes('-fullscreen'))
-            if is_fullscreen:
-                geometry = None
-            else:
-                geometry = self.root.geometry()
-            self.on_login_success(user, fullscreen=is_fullscreen, geometry=geometry)
+            token = self.db.create_session(user[0])
+            self.remember_session(token, user)
+            self.enter(user, token)
         else:
             messagebox.showerror("Error", "Invalid username or password")
+    
+    def enter(self, user, token):
+        """Hand over to the user's dashboard, along with the session token"""
+        # Preserve window state - ensure we get accurate state
+        self.root.update_idletasks()  # Ensure window state is current
+        is_fullscreen = bool(self.root.attributes('-fullscreen'))
+        if is_fullscreen:
+            geometry = None
+        else:
+            geometry = self.root.geometry()
+        self.on_login_success(user, fullscreen=is_fullscreen, geometry=geometry, session=token)
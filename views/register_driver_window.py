@@ -1,14 +1,15 @@
 import tkinter as tk
-from tkinter import messagebox
-from utils.constants import COLORS, FONTS
+from tkinter import ttk, messagebox
+from utils.constants import COLORS, FONTS, OTHER_CITY
 
 class RegisterDriverWindow:
     """Driver Registration for Admin"""
 
-    def __init__(self, root, db, refresh_callback):
+    def __init__(self, root, db, refresh_callback, shards=None):
         self.root = root
         self.db = db
         self.refresh_callback = refresh_callback
+        self.shards = shards
 
         self.root.title("Register Driver")
         self.root.resizable(False, False)
@@ -28,6 +29,12 @@ class RegisterDriverWindow:
         self.entry_vehicle = self.create_input(frame, "Vehicle Number")
         self.entry_license = self.create_input(frame, "License Number")
         self.entry_password = self.create_input(frame, "Password", show="*")
+        if self.shards:
+            tk.Label(frame, text="City", font=FONTS["normal"], bg=COLORS["white"]).pack(anchor="w")
+            self.city_combo = ttk.Combobox(frame, font=FONTS["normal"], state="readonly",
+                                           values=self.shards.cities)
+            self.city_combo.set(OTHER_CITY)
+            self.city_combo.pack(fill=tk.X, pady=5)
 
         btn_frame = tk.Frame(frame, bg=COLORS["white"])
         btn_frame.pack(pady=20)
@@ -74,9 +81,15 @@ class RegisterDriverWindow:
             messagebox.showerror("Error", "Invalid phone number!")
             return      
 
-        success = self.db.create_driver(username, password, name, phone, vehicle, license_no)
+        city = self.city_combo.get() if self.shards else None
+        if city == OTHER_CITY:
+            city = None
+        success = self.db.create_driver(username, password, name, phone, vehicle, license_no, city)
 
         if success:
+            if city:
+                # The driver's trips live in the city's database
+                self.shards.for_user(self.db.get_user(username=username)[0])
             messagebox.showinfo("Success", "Driver Registered Successfully!")
             self.refresh_callback()
             self.root.destroy()
@@ -0,0 +1,109 @@
+import sqlite3
+import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
+from tkinter import ttk, messagebox
+from datetime import date, datetime
+from models.route_planner import TravelTable, load_day, plan_days, empty_km
+from utils.constants import COLORS, FONTS
+from utils.timestamps import from_pickup_ts
+
+class RouteWindow:
+    """A driver's day as a chain of trips, with pending trips the planner proposes adding.
+
+    The driver's own trips come from their replica when one is given. The
+    day is read on the Tk thread, and planned on a background thread
+    (which may use a process pool, see plan_days) that is polled with
+    after(), so a large fleet never blocks the window.
+    """
+
+    POLL_MS = 100
+
+    def __init__(self, root, db, driver_id, replica=None):
+        self.root = root
+        self.db = db
+        self.driver_id = driver_id
+        self.replica = replica
+        self.planner = ThreadPoolExecutor(max_workers=1)
+        self.plan = None
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
+
+        self.root.title("My Route")
+        self.root.geometry("760x420")
+        self.setup_ui()
+        self.load_route()
+
+    def setup_ui(self):
+        frame = tk.Frame(self.root, padx=10, pady=10)
+        frame.pack(fill=tk.BOTH, expand=True)
+
+        controls = tk.Frame(frame)
+        controls.pack(fill=tk.X, pady=(0, 10))
+        tk.Label(controls, text="Date (YYYY-MM-DD):", font=FONTS['normal']).pack(side=tk.LEFT)
+        self.date_entry = tk.Entry(controls, font=FONTS['normal'], width=12)
+        self.date_entry.insert(0, date.today().isoformat())
+        self.date_entry.pack(side=tk.LEFT, padx=5)
+        tk.Button(controls, text="Plan", bg=COLORS['info'], fg=COLORS['white'],
+                  font=FONTS['button'], command=self.load_route).pack(side=tk.LEFT, padx=5)
+        self.summary_label = tk.Label(controls, text="", font=FONTS['normal'])
+        self.summary_label.pack(side=tk.LEFT, padx=10)
+
+        columns = ("#", "ID", "Time", "Pickup", "Dropoff", "Empty km", "Trip")
+        self.tree = ttk.Treeview(frame, columns=columns, show="headings")
+        for col, width in zip(columns, (30, 80, 60, 170, 170, 80, 90)):
+            self.tree.heading(col, text=col)
+            self.tree.column(col, width=width)
+        self.tree.tag_configure('proposed', foreground=COLORS['info'])
+        self.tree.pack(fill=tk.BOTH, expand=True)
+
+    def load_route(self):
+        """Plan the chosen day for the whole fleet and show this driver's chain"""
+        try:
+            day = datetime.strptime(self.date_entry.get().strip(), "%Y-%m-%d").date()
+        except ValueError:
+            messagebox.showerror("Error", "Invalid date format")
+            return
+        try:
+            times = self.db.get_travel_times()
+            chains, pending = load_day(self.db, day, self.replica)
+        except sqlite3.Error as error:
+            messagebox.showerror("Error", f"Could not read the day's trips: {error}")
+            return
+        chains.setdefault(self.driver_id, [])
+        self.summary_label.config(text="Planning...")
+        # A newer plan replaces one still running; its result is ignored
+        self.plan = self.planner.submit(plan_days, [(chains, pending)], times)
+        self.root.after(self.POLL_MS, self.show_route, self.plan, TravelTable(times))
+
+    def show_route(self, plan, table):
+        """Show the driver's chain once the background plan is done"""
+        if plan is not self.plan:
+            return
+        if not plan.done():
+            self.root.after(self.POLL_MS, self.show_route, plan, table)
+            return
+        try:
+            chain = plan.result()[0][self.driver_id]
+        except Exception as error:
+            self.summary_label.config(text="")
+            messagebox.showerror("Error", f"Planning failed: {error}")
+            return
+
+        for item in self.tree.get_children():
+            self.tree.delete(item)
+        previous = None
+        for number, trip in enumerate(chain, start=1):
+            empty = table.leg(previous.dropoff, trip.pickup)[0] if previous else 0.0
+            proposed = trip.driver_id is None
+            self.tree.insert('', tk.END, tags=('proposed',) if proposed else (),
+                             values=(number, trip.booking_id, from_pickup_ts(trip.pickup_ts)[1],
+                                     trip.pickup, trip.dropoff, f"{empty:.1f}",
+                                     "Proposed" if proposed else "Assigned"))
+            previous = trip
+        proposals = sum(1 for trip in chain if trip.driver_id is None)
+        self.summary_label.config(text=f"{len(chain)} trip(s), {proposals} proposed, "
+                                       f"{empty_km(chain, table):.1f} empty km")
+
+    def close(self):
+        self.plan = None
+        self.planner.shutdown(wait=False, cancel_futures=True)
+        self.root.destroy()
@@ -0,0 +1,163 @@
+import tkinter as tk
+from tkinter import ttk, messagebox
+from datetime import date, datetime, timedelta
+from utils.constants import COLORS, FONTS, SHIFTS
+from utils.timestamps import to_pickup_ts, day_bounds
+
+class ShiftWindow:
+    """Shift editor: the same daily hours for several drivers over a range of days.
+
+    drivers maps names to driver ids; storage_for(driver_id) gives the
+    database holding that driver's shifts. Drivers get a window with just
+    themselves, admins one with every driver in the selected city.
+    """
+
+    def __init__(self, root, drivers, storage_for):
+        self.root = root
+        self.drivers = drivers
+        self.storage_for = storage_for
+        self.names = {driver_id: name for name, driver_id in drivers.items()}
+
+        self.root.title("Shifts")
+        self.root.geometry("760x460")
+        self.setup_ui()
+        self.load_shifts()
+
+    def setup_ui(self):
+        frame = tk.Frame(self.root, padx=10, pady=10)
+        frame.pack(fill=tk.BOTH, expand=True)
+
+        controls = tk.Frame(frame)
+        controls.pack(fill=tk.X, pady=(0, 10))
+        today = date.today().isoformat()
+        self.entries = {}
+        for label, key, value, width in (("From (YYYY-MM-DD):", 'from', today, 12),
+                                         ("To:", 'to', today, 12),
+                                         ("Start (HH:MM):", 'start', SHIFTS['DEFAULT_START'], 6),
+                                         ("End:", 'end', SHIFTS['DEFAULT_END'], 6)):
+            tk.Label(controls, text=label, font=FONTS['normal']).pack(side=tk.LEFT)
+            entry = tk.Entry(controls, font=FONTS['normal'], width=width)
+            entry.insert(0, value)
+            entry.pack(side=tk.LEFT, padx=(2, 8))
+            self.entries[key] = entry
+
+        body = tk.Frame(frame)
+        body.pack(fill=tk.BOTH, expand=True)
+        self.driver_list = tk.Listbox(body, font=FONTS['normal'], selectmode=tk.EXTENDED,
+                                      exportselection=False, width=22)
+        for name in self.drivers:
+            self.driver_list.insert(tk.END, name)
+        if len(self.drivers) == 1:
+            self.driver_list.selection_set(0)
+        self.driver_list.pack(side=tk.LEFT, fill=tk.Y)
+        self.driver_list.bind('<<ListboxSelect>>', lambda e: self.load_shifts())
+
+        columns = ("Driver", "Start", "End")
+        self.tree = ttk.Treeview(body, columns=columns, show="headings")
+        for col in columns:
+            self.tree.heading(col, text=col)
+            self.tree.column(col, width=160)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=(10, 0))
+
+        buttons = tk.Frame(frame)
+        buttons.pack(fill=tk.X, pady=(10, 0))
+        for text, color, command in (("Add Shifts", 'success', self.add_shifts),
+                                     ("Clear Days", 'danger', self.clear_shifts),
+                                     ("Delete Selected", 'danger', self.delete_shifts),
+                                     ("Show", 'info', self.load_shifts)):
+            tk.Button(buttons, text=text, bg=COLORS[color], fg=COLORS['white'],
+                      font=FONTS['button'], command=command).pack(side=tk.LEFT, padx=5)
+
+    def selected_drivers(self):
+        return [self.drivers[self.driver_list.get(index)] for index in self.driver_list.curselection()]
+
+    def by_storage(self, driver_ids):
+        """Group driver ids by the database holding their shifts"""
+        groups = {}
+        for driver_id in driver_ids:
+            groups.setdefault(self.storage_for(driver_id), []).append(driver_id)
+        return groups
+
+    def read_days(self):
+        """The chosen days as a list of dates, or None after showing an error"""
+        try:
+            first = datetime.strptime(self.entries['from'].get().strip(), "%Y-%m-%d").date()
+            last = datetime.strptime(self.entries['to'].get().strip(), "%Y-%m-%d").date()
+        except ValueError:
+            messagebox.showerror("Error", "Invalid date format")
+            return None
+        if last < first:
+            messagebox.showerror("Error", "The last day is before the first")
+            return None
+        return [first + timedelta(days=offset) for offset in range((last - first).days + 1)]
+
+    def add_shifts(self):
+        """Add one shift per selected driver per chosen day; an end at or
+        before the start runs into the next day"""
+        driver_ids = self.selected_drivers()
+        days = self.read_days()
+        if days is None:
+            return
+        if not driver_ids:
+            messagebox.showerror("Error", "Please select at least one driver")
+            return
+        start, end = self.entries['start'].get().strip(), self.entries['end'].get().strip()
+        try:
+            spans = []
+            for day in days:
+                start_ts = to_pickup_ts(day.isoformat(), start)
+                end_day = day if end > start else day + timedelta(days=1)
+                spans.append((start_ts, to_pickup_ts(end_day.isoformat(), end)))
+        except ValueError:
+            messagebox.showerror("Error", "Invalid time format")
+            return
+        added = 0
+        for storage, ids in self.by_storage(driver_ids).items():
+            added += storage.add_shifts([(driver_id, start_ts, end_ts)
+                                         for driver_id in ids for start_ts, end_ts in spans])
+        messagebox.showinfo("Success", f"Added {added} shift(s)")
+        self.load_shifts()
+
+    def clear_shifts(self):
+        """Remove the selected drivers' shifts starting on the chosen days"""
+        driver_ids = self.selected_drivers()
+        days = self.read_days()
+        if days is None:
+            return
+        if not driver_ids:
+            messagebox.showerror("Error", "Please select at least one driver")
+            return
+        if not messagebox.askyesno("Confirm", f"Clear shifts of {len(driver_ids)} driver(s)?"):
+            return
+        start_ts, end_ts = day_bounds(days[0])[0], day_bounds(days[-1])[1]
+        for storage, ids in self.by_storage(driver_ids).items():
+            storage.clear_shifts(ids, start_ts, end_ts)
+        self.load_shifts()
+
+    def delete_shifts(self):
+        selected = self.tree.selection()
+        if not selected:
+            messagebox.showerror("Error", "Please select shifts to delete")
+            return
+        # Item ids are "<driver_id>:<shift_id>"
+        groups = {}
+        for item in selected:
+            driver_id, shift_id = (int(part) for part in item.split(':'))
+            groups.setdefault(self.storage_for(driver_id), []).append(shift_id)
+        for storage, shift_ids in groups.items():
+            storage.delete_shifts(shift_ids)
+        self.load_shifts()
+
+    def load_shifts(self):
+        """List the selected drivers' shifts overlapping the chosen days"""
+        self.tree.delete(*self.tree.get_children())
+        days = self.read_days()
+        if days is None:
+            return
+        start_ts, end_ts = day_bounds(days[0])[0], day_bounds(days[-1])[1]
+        for storage, ids in self.by_storage(self.selected_drivers()).items():
+            for shift_id, driver_id, shift_start, shift_end in storage.get_shifts(ids, start_ts, end_ts):
+                self.tree.insert('', tk.END, iid=f"{driver_id}:{shift_id}", values=(
+                    self.names[driver_id],
+                    datetime.fromtimestamp(shift_start).strftime("%Y-%m-%d %H:%M"),
+                    datetime.fromtimestamp(shift_end).strftime("%Y-%m-%d %H:%M")))
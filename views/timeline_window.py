@@ -0,0 +1,281 @@
+import tkinter as tk
+from tkinter import messagebox
+import time
+from bisect import bisect_left
+from datetime import date, datetime
+from models.route_planner import Trip, TravelTable
+from utils.constants import COLORS, FONTS, BOOKING_STATUS, TIMELINE
+from utils.timestamps import day_bounds
+
+# Tick spacings to choose from, in minutes
+TICK_MINUTES = (5, 10, 15, 30, 60, 120, 180, 360)
+TICK_PIXELS = 70
+
+
+class ItemPool:
+    """Canvas items of one kind, reused from redraw to redraw.
+
+    Each redraw takes the items it needs and hides the rest, so panning
+    and zooming move and relabel existing items instead of deleting and
+    creating them.
+    """
+
+    def __init__(self, canvas, create):
+        self.canvas = canvas
+        self.create = create
+        self.items = []
+        self.used = 0
+        self.shown = 0
+
+    def take(self):
+        if self.used == len(self.items):
+            self.items.append(self.create())
+        item = self.items[self.used]
+        if self.used >= self.shown:
+            self.canvas.itemconfigure(item, state='normal')
+        self.used += 1
+        return item
+
+    def finish(self):
+        for item in self.items[self.used:self.shown]:
+            self.canvas.itemconfigure(item, state='hidden')
+        self.shown = self.used
+        self.used = 0
+
+
+class TimelineWindow:
+    """Which drivers are busy when: one lane per driver, one bar per trip.
+
+    Only the lanes and the part of the day in view are drawn. Bars run
+    from pickup to the estimated dropoff from the travel time table.
+    Drag to pan, use the mouse wheel to scroll lanes and Ctrl+wheel or
+    the +/- buttons to zoom.
+    """
+
+    STATUS_COLORS = {
+        BOOKING_STATUS['ASSIGNED']: COLORS['info'],
+        BOOKING_STATUS['COMPLETED']: COLORS['success'],
+    }
+
+    def __init__(self, root, dbs, drivers):
+        self.root = root
+        self.dbs = dbs
+        self.drivers = drivers
+        self.lanes = []
+        self.start_ts = 0
+        self.span = TIMELINE['SPAN_HOURS'] * 3600
+        self.top_lane = 0
+        self.redraw_pending = None
+        self.drag = None
+        self.bar_trips = {}
+
+        self.root.title("Driver Timeline")
+        self.root.geometry("1000x600")
+        self.setup_ui()
+        self.load_day()
+
+    def setup_ui(self):
+        frame = tk.Frame(self.root, padx=10, pady=10)
+        frame.pack(fill=tk.BOTH, expand=True)
+
+        controls = tk.Frame(frame)
+        controls.pack(fill=tk.X, pady=(0, 10))
+        tk.Label(controls, text="Date (YYYY-MM-DD):", font=FONTS['normal']).pack(side=tk.LEFT)
+        self.date_entry = tk.Entry(controls, font=FONTS['normal'], width=12)
+        self.date_entry.insert(0, date.today().isoformat())
+        self.date_entry.pack(side=tk.LEFT, padx=5)
+        tk.Button(controls, text="Load", bg=COLORS['info'], fg=COLORS['white'],
+                  font=FONTS['button'], command=self.load_day).pack(side=tk.LEFT, padx=5)
+        tk.Button(controls, text="+", font=FONTS['button'], width=2,
+                  command=lambda: self.zoom(1 / TIMELINE['ZOOM_STEP'])).pack(side=tk.LEFT, padx=(10, 2))
+        tk.Button(controls, text="-", font=FONTS['button'], width=2,
+                  command=lambda: self.zoom(TIMELINE['ZOOM_STEP'])).pack(side=tk.LEFT)
+        self.status_label = tk.Label(controls, text="", font=FONTS['normal'], anchor="w")
+        self.status_label.pack(side=tk.LEFT, padx=10, fill=tk.X, expand=True)
+
+        self.canvas = tk.Canvas(frame, bg=COLORS['white'], highlightthickness=0)
+        self.canvas.pack(fill=tk.BOTH, expand=True)
+
+        canvas = self.canvas
+        self.stripes = ItemPool(canvas, lambda: canvas.create_rectangle(0, 0, 0, 0, width=0, tags=('stripe',)))
+        self.grid_lines = ItemPool(canvas, lambda: canvas.create_line(0, 0, 0, 0, fill=COLORS['light_gray']))
+        self.tick_labels = ItemPool(canvas, lambda: canvas.create_text(0, 0, anchor="n", font=FONTS['small']))
+        self.lane_labels = ItemPool(canvas, lambda: canvas.create_text(0, 0, anchor="w", font=FONTS['small']))
+        self.bars = ItemPool(canvas, lambda: canvas.create_rectangle(0, 0, 0, 0, outline=COLORS['white'],
+                                                                      tags=('bar',)))
+        self.bar_labels = ItemPool(canvas, lambda: canvas.create_text(0, 0, anchor="w", font=FONTS['small'],
+                                                                       fill=COLORS['white'], tags=('bar_label',)))
+
+        canvas.bind('<Configure>', lambda event: self.schedule_redraw())
+        canvas.bind('<ButtonPress-1>', self.on_press)
+        canvas.bind('<B1-Motion>', self.on_drag)
+        canvas.bind('<ButtonRelease-1>', self.on_release)
+        canvas.bind('<MouseWheel>', lambda event: self.on_wheel(event, -event.delta))
+        canvas.bind('<Button-4>', lambda event: self.on_wheel(event, -1))
+        canvas.bind('<Button-5>', lambda event: self.on_wheel(event, 1))
+
+    def load_day(self):
+        """Read the chosen day's assigned and completed trips into lanes"""
+        try:
+            day = datetime.strptime(self.date_entry.get().strip(), "%Y-%m-%d").date()
+        except ValueError:
+            messagebox.showerror("Error", "Invalid date format")
+            return
+        self.day_start, self.day_end = day_bounds(day)
+
+        trips = {driver_id: [] for driver_id in self.drivers.values()}
+        for db in self.dbs:
+            table = TravelTable(db.get_travel_times())
+            for booking_id, _, driver_id, pickup, dropoff, pickup_ts, status in \
+                    db.get_bookings_between(self.day_start, self.day_end):
+                if driver_id is None or status not in self.STATUS_COLORS:
+                    continue
+                trip = Trip(booking_id, pickup, dropoff, pickup_ts, driver_id)
+                trips.setdefault(driver_id, []).append((trip, table.free_at(trip), status))
+
+        names = self.names = {driver_id: name for name, driver_id in self.drivers.items()}
+        # Per lane the trips sorted by pickup, with their pickup times kept
+        # apart so the visible ones are found by bisection
+        self.lanes = []
+        self.longest = 0
+        for driver_id in sorted(trips, key=lambda driver_id: names.get(driver_id, '').lower()):
+            lane = sorted(trips[driver_id], key=lambda entry: entry[0].pickup_ts)
+            names.setdefault(driver_id, f"Driver {driver_id}")
+            self.lanes.append((names[driver_id],
+                               [entry[0].pickup_ts for entry in lane], lane))
+            self.longest = max([self.longest] + [end - trip.pickup_ts for trip, end, _ in lane])
+
+        count = sum(len(lane[2]) for lane in self.lanes)
+        first = min((lane[1][0] for lane in self.lanes if lane[1]), default=self.day_start)
+        self.start_ts = first - first % 3600
+        self.top_lane = 0
+        self.clamp()
+        self.status_label.config(text=f"{count} trip(s) across {len(self.lanes)} driver(s)")
+        self.schedule_redraw()
+
+    def visible_lanes(self):
+        return max(1, (self.canvas.winfo_height() - TIMELINE['AXIS_HEIGHT']) // TIMELINE['LANE_HEIGHT'])
+
+    def clamp(self):
+        self.span = min(max(self.span, TIMELINE['MIN_SPAN_MINUTES'] * 60), self.day_end - self.day_start)
+        self.start_ts = min(max(self.start_ts, self.day_start), self.day_end - self.span)
+        self.top_lane = min(max(self.top_lane, 0), max(0, len(self.lanes) - self.visible_lanes()))
+
+    def scale(self):
+        """Pixels per second in the plot area"""
+        return max(1, self.canvas.winfo_width() - TIMELINE['LABEL_WIDTH']) / self.span
+
+    def zoom(self, factor, x=None):
+        """Change the visible time span, keeping the time under x in place"""
+        if x is None:
+            x = (self.canvas.winfo_width() + TIMELINE['LABEL_WIDTH']) / 2
+        anchor = self.start_ts + max(0, x - TIMELINE['LABEL_WIDTH']) / self.scale()
+        self.span *= factor
+        self.clamp()
+        self.start_ts = anchor - max(0, x - TIMELINE['LABEL_WIDTH']) / self.scale()
+        self.clamp()
+        self.schedule_redraw()
+
+    def on_press(self, event):
+        self.drag = (event.x, event.y, self.start_ts, self.top_lane, False)
+
+    def on_drag(self, event):
+        if not self.drag:
+            return
+        x, y, start_ts, top_lane, _ = self.drag
+        self.drag = (x, y, start_ts, top_lane, True)
+        self.start_ts = start_ts - (event.x - x) / self.scale()
+        self.top_lane = top_lane - round((event.y - y) / TIMELINE['LANE_HEIGHT'])
+        self.clamp()
+        self.schedule_redraw()
+
+    def on_release(self, event):
+        moved = self.drag and self.drag[4]
+        self.drag = None
+        if moved:
+            return
+        # A click rather than a drag: describe the trip under the pointer
+        for item in self.canvas.find_withtag('current'):
+            if item in self.bar_trips:
+                trip, end, status = self.bar_trips[item]
+                self.status_label.config(
+                    text=f"#{trip.booking_id}  {self.names[trip.driver_id]}  "
+                         f"{datetime.fromtimestamp(trip.pickup_ts):%H:%M}-{datetime.fromtimestamp(end):%H:%M}  "
+                         f"{trip.pickup} -> {trip.dropoff}  ({status})")
+
+    def on_wheel(self, event, direction):
+        if event.state & 0x4:
+            self.zoom(TIMELINE['ZOOM_STEP'] if direction > 0 else 1 / TIMELINE['ZOOM_STEP'], event.x)
+            return
+        self.top_lane += 3 if direction > 0 else -3
+        self.clamp()
+        self.schedule_redraw()
+
+    def schedule_redraw(self):
+        """Coalesce bursts of pan and zoom events into one redraw"""
+        if self.redraw_pending is None:
+            self.redraw_pending = self.root.after_idle(self.redraw)
+
+    def redraw(self):
+        self.redraw_pending = None
+        self.clamp()
+        width = self.canvas.winfo_width()
+        height = self.canvas.winfo_height()
+        left, top = TIMELINE['LABEL_WIDTH'], TIMELINE['AXIS_HEIGHT']
+        lane_height = TIMELINE['LANE_HEIGHT']
+        scale = self.scale()
+        end_ts = self.start_ts + self.span
+
+        # Time axis and grid
+        step = next((minutes * 60 for minutes in TICK_MINUTES if minutes * 60 * scale >= TICK_PIXELS),
+                    TICK_MINUTES[-1] * 60)
+        # Ticks fall on round local times
+        offset = time.localtime(self.start_ts).tm_gmtoff
+        tick = int(self.start_ts) - (int(self.start_ts) + offset) % step + step
+        while tick < end_ts:
+            x = left + (tick - self.start_ts) * scale
+            self.canvas.coords(self.grid_lines.take(), x, top - 4, x, height)
+            label = self.tick_labels.take()
+            self.canvas.coords(label, x, 4)
+            self.canvas.itemconfigure(label, text=f"{datetime.fromtimestamp(tick):%H:%M}")
+            tick += step
+
+        # Lanes in view, and in each the trips overlapping the time window
+        self.bar_trips = {}
+        first = self.top_lane
+        last = min(len(self.lanes), first + height // lane_height + 1)
+        for lane in range(first, last):
+            name, starts, trips = self.lanes[lane]
+            y = top + (lane - first) * lane_height
+            stripe = self.stripes.take()
+            self.canvas.coords(stripe, 0, y, width, y + lane_height)
+            self.canvas.itemconfigure(stripe, fill=COLORS['light_gray'] if lane % 2 else COLORS['white'])
+            label = self.lane_labels.take()
+            self.canvas.coords(label, 5, y + lane_height / 2)
+            self.canvas.itemconfigure(label, text=name[:24])
+
+            low = bisect_left(starts, self.start_ts - self.longest)
+            high = bisect_left(starts, end_ts)
+            for entry in trips[low:high]:
+                trip, trip_end, status = entry
+                if trip_end <= self.start_ts:
+                    continue
+                x0 = max(left, left + (trip.pickup_ts - self.start_ts) * scale)
+                x1 = min(width, left + (trip_end - self.start_ts) * scale)
+                bar = self.bars.take()
+                self.canvas.coords(bar, x0, y + 3, max(x1, x0 + 2), y + lane_height - 3)
+                self.canvas.itemconfigure(bar, fill=self.STATUS_COLORS[status])
+                self.bar_trips[bar] = entry
+                if x1 - x0 > 40:
+                    text = self.bar_labels.take()
+                    self.canvas.coords(text, x0 + 3, y + lane_height / 2)
+                    self.canvas.itemconfigure(text, text=str(trip.booking_id))
+                    self.bar_trips[text] = entry
+
+        for pool in (self.stripes, self.grid_lines, self.tick_labels, self.lane_labels,
+                     self.bars, self.bar_labels):
+            pool.finish()
+        # Pools grow as more lanes come into view, so restore the stacking
+        self.canvas.tag_lower('stripe')
+        self.canvas.tag_raise('bar')
+        self.canvas.tag_raise('bar_label')